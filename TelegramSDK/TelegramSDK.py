@@ -1,14 +1,15 @@
 # -*-coding:utf8;-*-
-from .util import util
+from .bot import Bot
+from .file_cache import FileInfoCache
+from .ratelimit import RateLimiter
 import os
-import json
-import requests
 
 
 class TelegramSDK:
     """
     Python Telegram bot SDK that can be run on every Python 3.
     this is class low level, for high level section see telegram.py
+    One process can also run many bots with instances of bot.Bot.
     author: guangrei
     """
 
@@ -17,35 +18,44 @@ class TelegramSDK:
     data = None
     method = "webhook"
     worker = 1
-    headers = {
-        "accept": "application/json",
-        "User-Agent": "Telegram Bot SDK - (https://github.com/cirebon-dev/TelegramSDK",
-    }
+    rate_limiter = RateLimiter()
+    max_retries = 3
+    upload_cache = None
+    headers = Bot.headers
+    api_url = Bot.api_url
+    metrics = None
+    file_info_cache = FileInfoCache()
+    download_cache = None
+    outbox = None
 
-    def set_webhook(url, certificate=None):
+    def set_webhook(
+        url,
+        certificate=None,
+        secret_token=None,
+        max_connections=None,
+        allowed_updates=None,
+        drop_pending_updates=False,
+    ):
         """
         Use this method to specify a url and receive incoming updates via an outgoing webhook.
         Args:
             - url (str): HTTPS url to send updates to. Use an empty string to remove webhook integration.
             - certificate (str, optional): Path to certificate file. Default to None.
+            - secret_token (str, optional): Sent back in the X-Telegram-Bot-Api-Secret-Token header of every webhook request, 1-256 characters A-Z, a-z, 0-9, _ and -. Default to None.
+            - max_connections (int, optional): Maximum simultaneous HTTPS connections Telegram opens to deliver updates, 1-100. Default to None (40).
+            - allowed_updates (list, optional): Update types to receive, for example ["message"]. Default to None (all except some types).
+            - drop_pending_updates (bool, optional): Drop all pending updates. Default to False.
         Returns:
             - dict: dict that can be accessed like an object.
         """
-        api = TelegramSDK.get_endpoints() + "setWebHook"
-        data = {"url": url}
-        if certificate is not None:
-            files = {"certificate": (os.path.basename(certificate), open(certificate))}
-            ret = requests.post(
-                api, data=data, files=files, verify=TelegramSDK.ssl_verify
-            ).json()
-        else:
-            ret = requests.post(
-                api,
-                data=data,
-                headers=TelegramSDK.headers,
-                verify=TelegramSDK.ssl_verify,
-            ).json()
-        return util.parse_response(ret)
+        return TelegramSDK.default().set_webhook(
+            url,
+            certificate=certificate,
+            secret_token=secret_token,
+            max_connections=max_connections,
+            allowed_updates=allowed_updates,
+            drop_pending_updates=drop_pending_updates,
+        )
 
     def remove_webhook():
         """
@@ -53,35 +63,22 @@ class TelegramSDK:
         Returns:
             - dict: dict that can be accessed like an object.
         """
-        api = TelegramSDK.get_endpoints() + "setWebhook?remove"
-        data = {"url": "Empty"}
-        ret = requests.post(
-            api,
-            data=data,
-            headers=TelegramSDK.headers,
-            verify=TelegramSDK.ssl_verify,
-        ).json()
-        return util.parse_response(ret)
+        return TelegramSDK.default().remove_webhook()
 
-    def get_updates(offset=None, limit=100, timeout=0):
+    def get_updates(offset=None, limit=100, timeout=0, allowed_updates=None):
         """
         Use this method to receive incoming updates using long polling.
         Args:
             - offset (int, optional): Identifier of the first update to be returned. Must be greater by one than the highest among the identifiers of previously received updates. By default, updates starting with the earliest unconfirmed update are returned. An update is considered confirmed as soon as getUpdates is called with an offset higher than its update_id. The negative offset can be specified to retrieve updates starting from -offset update from the end of the updates queue. All previous updates will forgotten. Defaults to None.
             - limit (int, optional): Limits the number of updates to be retrieved. Values between 1—100 are accepted. Defaults to 100.
             - timeout (int, optional): Timeout in seconds for long polling. Defaults to 0.
+            - allowed_updates (list, optional): Update types to receive, for example ["message", "callback_query"]. Defaults to None (previous setting).
         Returns:
             - dict: dict that can be accessed like an object.
         """
-        data = {"offset": offset, "limit": limit, "timeout": timeout}
-        api = TelegramSDK.get_endpoints() + "getUpdates"
-        ret = requests.post(
-            api,
-            data=data,
-            headers=TelegramSDK.headers,
-            verify=TelegramSDK.ssl_verify,
-        ).json()
-        return ret
+        return TelegramSDK.default().get_updates(
+            offset=offset, limit=limit, timeout=timeout, allowed_updates=allowed_updates
+        )
 
     def send_message(
         text,
@@ -105,26 +102,15 @@ class TelegramSDK:
         Returns:
             - dict: dict that can be accessed like an object.
         """
-        api = TelegramSDK.get_endpoints() + "sendMessage"
-        data = {
-            "chat_id": chat_id,
-            "text": text,
-            "disable_web_page_preview": disable_web_page_preview,
-            "disable_notification": disable_notification,
-        }
-        if parse_mode:
-            data["parse_mode"] = parse_mode
-        if reply_to_message_id:
-            data["reply_to_message_id"] = reply_to_message_id
-        if reply_markup:
-            data["reply_markup"] = reply_markup
-        ret = requests.post(
-            api,
-            data=data,
-            headers=TelegramSDK.headers,
-            verify=TelegramSDK.ssl_verify,
-        ).json()
-        return util.parse_response(ret)
+        return TelegramSDK.default().send_message(
+            text,
+            chat_id,
+            parse_mode=parse_mode,
+            disable_web_page_preview=disable_web_page_preview,
+            disable_notification=disable_notification,
+            reply_to_message_id=reply_to_message_id,
+            reply_markup=reply_markup,
+        )
 
     def send_document(
         chat_id,
@@ -144,28 +130,13 @@ class TelegramSDK:
         Returns:
             - dict: dict that can be accessed like an object.
         """
-
-        api = TelegramSDK.get_endpoints() + "sendDocument"
-        try:
-            data = {
-                "chat_id": chat_id,
-                "reply_to_message_id": reply_to_message_id,
-                "caption": caption,
-                "disable_notification": disable_notification,
-            }
-            files = {"document": (os.path.basename(document), open(document, 'rb'))}
-            ret = requests.post(
-                api, data=data, files=files, verify=TelegramSDK.ssl_verify
-                ).json()
-        except BaseException as e:
-            data["document"] = document
-            ret = requests.post(
-                api,
-                data=data,
-                headers=TelegramSDK.headers,
-                verify=TelegramSDK.ssl_verify,
-            ).json()
-        return util.parse_response(ret)
+        return TelegramSDK.default().send_document(
+            chat_id,
+            document,
+            caption=caption,
+            disable_notification=disable_notification,
+            reply_to_message_id=reply_to_message_id,
+        )
 
     def send_chat_action(chat_id, action="typing"):
         """
@@ -175,15 +146,7 @@ class TelegramSDK:
         Returns:
             - dict: dict that can be accessed like an object.
         """
-        api = TelegramSDK.get_endpoints() + "sendChatAction"
-        data = {"action": action}
-        ret = requests.post(
-            api,
-            data=data,
-            headers=TelegramSDK.headers,
-            verify=TelegramSDK.ssl_verify,
-        )
-        return util.parse_response(ret)
+        return TelegramSDK.default().send_chat_action(chat_id, action=action)
 
     def get_endpoints():
         """
@@ -191,8 +154,17 @@ class TelegramSDK:
         Returns:
             - str: telegram bot endpoints.
         """
-        token = os.environ.get("TELEGRAM_BOT_TOKEN", TelegramSDK.token)
-        return "https://api.telegram.org/bot" + token + "/"
+        return TelegramSDK.default().endpoint
+
+    def file_url(file_path):
+        """
+        Function to get the download url of a file.
+        Args:
+            - file_path (str): file_path returned by get_file().
+        Returns:
+            - str: download url.
+        """
+        return TelegramSDK.default().file_url(file_path)
 
     def get_file(file_id):
         """
@@ -202,7 +174,83 @@ class TelegramSDK:
         Returns:
             - dict: dict that can be accessed like an object.
         """
+        return TelegramSDK.default().get_file(file_id)
+
+    def default():
+        """
+        Function to get the Bot behind the class methods, its settings follow the class attributes.
+        Returns:
+            - Bot: default bot.
+        """
+        return _default
+
+
+class _DefaultBot(Bot):
+    """
+    This is private class, the Bot of TelegramSDK class methods.
+    Token (TELEGRAM_BOT_TOKEN or TelegramSDK.token) and settings are read from TelegramSDK on every call,
+    the endpoint is only rebuilt when the token or api url changes.
+    """
+
+    session = None
+    session_store = None
+    cacheobject = None
+
+    def __init__(self):
+        self._token = None
+        self._api_url = None
+        self._endpoint = None
+        self.router = None
+
+    @property
+    def token(self):
+        return os.environ.get("TELEGRAM_BOT_TOKEN", TelegramSDK.token)
+
+    @property
+    def api_url(self):
+        return os.environ.get("TELEGRAM_API_URL", TelegramSDK.api_url).rstrip("/")
+
+    @property
+    def endpoint(self):
+        token = self.token
+        api_url = self.api_url
+        if token != self._token or api_url != self._api_url:
+            self._endpoint = api_url + "/bot" + token + "/"
+            self._token = token
+            self._api_url = api_url
+        return self._endpoint
+
+    @property
+    def ssl_verify(self):
+        return TelegramSDK.ssl_verify
+
+    @property
+    def rate_limiter(self):
+        return TelegramSDK.rate_limiter
+
+    @property
+    def max_retries(self):
+        return TelegramSDK.max_retries
+
+    @property
+    def upload_cache(self):
+        return TelegramSDK.upload_cache
+
+    @property
+    def metrics(self):
+        return TelegramSDK.metrics
+
+    @property
+    def file_info_cache(self):
+        return TelegramSDK.file_info_cache
+
+    @property
+    def download_cache(self):
+        return TelegramSDK.download_cache
+
+    @property
+    def outbox(self):
+        return TelegramSDK.outbox
+
 
-        api = TelegramSDK.get_endpoints() + "getFile?file_id=" + file_id
-        ret = requests.get(api, verify=TelegramSDK.ssl_verify).json()
-        return util.parse_response(ret)
+_default = _DefaultBot()
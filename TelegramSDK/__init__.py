@@ -1,3 +1,6 @@
 # -*-coding:utf8;-*-
 from .telegram import telegram
 from .util import util
+from .transport import transport
+from .aio import AsyncTelegram
+from .bot import Bot
@@ -0,0 +1,440 @@
+# -*-coding:utf8;-*-
+from .TelegramSDK import TelegramSDK
+from .context import Context
+from .models import Update
+from .ratelimit import RateLimiter
+from .util import util
+import asyncio
+import json
+import logging
+import os
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncTelegram:
+    """
+    Asyncio counterpart of TelegramSDK/telegram, every API method is a coroutine.
+    One aiohttp connection pool is kept per client and poll() runs async handlers concurrently in one process.
+    Requires aiohttp (pip install TelSDK[async]).
+    author: guangrei
+    """
+
+    def __init__(
+        self,
+        token=None,
+        ssl_verify=None,
+        pool_size=100,
+        timeout=60,
+        rate_limiter=None,
+        max_retries=3,
+        api_url=None,
+        metrics=None,
+    ):
+        """
+        Args:
+            - token (str, optional): Telegram bot Api token. Defaults to None (TELEGRAM_BOT_TOKEN or telegram.token).
+            - ssl_verify (bool, optional): Verify ssl certificate. Defaults to None (same as telegram.ssl_verify).
+            - pool_size (int, optional): Maximum number of pooled keep-alive connections. Defaults to 100.
+            - timeout (int, optional): Read timeout in seconds for non polling requests. Defaults to 60.
+            - rate_limiter (RateLimiter, optional): Limiter every send goes through. Defaults to None (a new RateLimiter with Telegram limits), set False to disable.
+            - max_retries (int, optional): Retries after a 429 response. Defaults to 3.
+            - api_url (str, optional): Bot API server. Defaults to None (TELEGRAM_API_URL or telegram.api_url).
+            - metrics (Metrics, optional): Instrumentation of API calls and handlers, see metrics.Metrics. Defaults to None (telegram.metrics).
+        """
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncTelegram requires aiohttp, install it with: pip install TelSDK[async]"
+            )
+        if token is None:
+            token = os.environ.get("TELEGRAM_BOT_TOKEN", TelegramSDK.token)
+        if ssl_verify is None:
+            ssl_verify = TelegramSDK.ssl_verify
+        self.token = token
+        self.ssl_verify = ssl_verify
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter() if rate_limiter is None else rate_limiter
+        self.max_retries = max_retries
+        self.metrics = TelegramSDK.metrics if metrics is None else metrics
+        if api_url is None:
+            api_url = os.environ.get("TELEGRAM_API_URL", TelegramSDK.api_url)
+        self.api_url = api_url.rstrip("/")
+        self.endpoint = self.api_url + "/bot" + token + "/"
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def session(self):
+        """
+        Function to get the pooled aiohttp session, it is created on first use.
+        Returns:
+            - aiohttp.ClientSession: pooled session.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size, ssl=None if self.ssl_verify else False
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=TelegramSDK.headers,
+                timeout=aiohttp.ClientTimeout(sock_connect=10, sock_read=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        """
+        Use this method to close pooled connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _form(data, files=None):
+        """
+        This is private function, to encode request data like requests does.
+        """
+        form = aiohttp.FormData()
+        for key, value in data.items():
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = "true" if value else "false"
+            form.add_field(key, str(value))
+        if files is not None:
+            for key, (name, fp) in files.items():
+                form.add_field(key, fp, filename=name)
+        return form
+
+    async def _request(self, method, data=None, files=None, timeout=None, chat_id=None):
+        """
+        This is private function, to call a Bot API method and decode the json response.
+        Sends to chat_id wait for the rate limiter and 429 responses are retried after parameters.retry_after.
+        """
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(
+                sock_connect=10, sock_read=timeout
+            )
+        attempt = 0
+        while True:
+            if data is not None or files is not None:
+                kwargs["data"] = AsyncTelegram._form(data or {}, files)
+            if self.rate_limiter and chat_id is not None:
+                await self.rate_limiter.wait(chat_id)
+            metrics = self.metrics
+            if metrics is not None:
+                started = time.perf_counter()
+            async with self.session().post(self.endpoint + method, **kwargs) as r:
+                body = await r.read()
+            if metrics is None:
+                ret = util.loads(body)
+            else:
+                received = time.perf_counter()
+                ret = util.loads(body)
+                metrics.timing("api_request_seconds", received - started, method=method)
+                metrics.timing(
+                    "api_parse_seconds", time.perf_counter() - received, method=method
+                )
+                metrics.count("bytes_received_total", len(body), method=method)
+                if not ret.get("ok", True):
+                    metrics.count(
+                        "api_errors_total", method=method, code=ret.get("error_code")
+                    )
+            if ret.get("error_code") != 429 or attempt >= self.max_retries:
+                return ret
+            attempt += 1
+            if metrics is not None:
+                metrics.count("api_retries_total", method=method)
+            retry_after = ret.get("parameters", {}).get("retry_after", 1)
+            logging.warning(
+                "flood control: retry %d after %s seconds.", attempt, retry_after
+            )
+            if (
+                not self.rate_limiter
+                or chat_id is None
+                or not self.rate_limiter.pause(retry_after, chat_id)
+            ):
+                await asyncio.sleep(retry_after)
+
+    async def set_webhook(
+        self,
+        url,
+        certificate=None,
+        secret_token=None,
+        max_connections=None,
+        allowed_updates=None,
+        drop_pending_updates=False,
+    ):
+        """
+        Use this method to specify a url and receive incoming updates via an outgoing webhook, see TelegramSDK.set_webhook().
+        Returns:
+            - dict: dict that can be accessed like an object.
+        """
+        data = {
+            "url": url,
+            "secret_token": secret_token,
+            "max_connections": max_connections,
+            "drop_pending_updates": drop_pending_updates or None,
+        }
+        if allowed_updates is not None:
+            data["allowed_updates"] = json.dumps(list(allowed_updates))
+        if certificate is not None:
+            with open(certificate, "rb") as f:
+                files = {"certificate": (os.path.basename(certificate), f.read())}
+            ret = await self._request("setWebhook", data, files)
+        else:
+            ret = await self._request("setWebhook", data)
+        return util.parse_response(ret)
+
+    async def remove_webhook(self):
+        """
+        Use this method to remove a previously set outgoing webhook.
+        Returns:
+            - dict: dict that can be accessed like an object.
+        """
+        ret = await self._request("deleteWebhook", {})
+        return util.parse_response(ret)
+
+    async def get_updates(
+        self, offset=None, limit=100, timeout=0, allowed_updates=None
+    ):
+        """
+        Use this method to receive incoming updates using long polling.
+        Args:
+            - offset (int, optional): Identifier of the first update to be returned. Defaults to None.
+            - limit (int, optional): Limits the number of updates to be retrieved. Values between 1—100 are accepted. Defaults to 100.
+            - timeout (int, optional): Timeout in seconds for long polling. Defaults to 0.
+            - allowed_updates (list, optional): Update types to receive, for example ["message", "callback_query"]. Defaults to None (previous setting).
+        Returns:
+            - dict: raw json decoded response.
+        """
+        data = {"offset": offset, "limit": limit, "timeout": timeout}
+        if allowed_updates is not None:
+            data["allowed_updates"] = json.dumps(list(allowed_updates))
+        return await self._request("getUpdates", data, timeout=timeout + 15)
+
+    async def send_message(
+        self,
+        text,
+        chat_id,
+        parse_mode=None,
+        disable_web_page_preview=False,
+        disable_notification=False,
+        reply_to_message_id=None,
+        reply_markup=None,
+    ):
+        """
+        Use this method to send text messages, see TelegramSDK.send_message().
+        Returns:
+            - dict: dict that can be accessed like an object.
+        """
+        data = {
+            "chat_id": chat_id,
+            "text": text,
+            "disable_web_page_preview": disable_web_page_preview,
+            "disable_notification": disable_notification,
+            "parse_mode": parse_mode,
+            "reply_to_message_id": reply_to_message_id,
+            "reply_markup": reply_markup,
+        }
+        ret = await self._request("sendMessage", data, chat_id=chat_id)
+        return util.parse_response(ret)
+
+    async def send_document(
+        self,
+        chat_id,
+        document,
+        caption=None,
+        disable_notification=False,
+        reply_to_message_id=None,
+    ):
+        """
+        Use this method to send general files, see TelegramSDK.send_document().
+        Returns:
+            - dict: dict that can be accessed like an object.
+        """
+        data = {
+            "chat_id": chat_id,
+            "reply_to_message_id": reply_to_message_id,
+            "caption": caption,
+            "disable_notification": disable_notification,
+        }
+        if os.path.isfile(document):
+            with open(document, "rb") as f:
+                files = {"document": (os.path.basename(document), f.read())}
+            ret = await self._request("sendDocument", data, files, chat_id=chat_id)
+        else:
+            data["document"] = document
+            ret = await self._request("sendDocument", data, chat_id=chat_id)
+        return util.parse_response(ret)
+
+    async def send_chat_action(self, chat_id, action="typing"):
+        """
+        Use this method to tell the user that something is happening on the bot's side, see TelegramSDK.send_chat_action().
+        Returns:
+            - dict: dict that can be accessed like an object.
+        """
+        ret = await self._request(
+            "sendChatAction", {"chat_id": chat_id, "action": action}, chat_id=chat_id
+        )
+        return util.parse_response(ret)
+
+    async def get_file(self, file_id):
+        """
+        Use this method to get basic info about a file and prepare it for downloading.
+        Args:
+            - file_id (str): File identifier to get info about
+        Returns:
+            - dict: dict that can be accessed like an object.
+        """
+        ret = await self._request("getFile", {"file_id": file_id})
+        return util.parse_response(ret)
+
+    def file_url(self, file_path):
+        """
+        Function to get the download url of a file.
+        Args:
+            - file_path (str): file_path returned by get_file().
+        Returns:
+            - str: download url.
+        """
+        return self.api_url + "/file/bot" + self.token + "/" + file_path
+
+    def context(self):
+        """
+        Use this method to get the context of the update handled by the current task.
+        Returns:
+            - Context: per-update context, its reply helpers return coroutines.
+        """
+        return Context.current()
+
+    def reply_message(self, *args, **kwargs):
+        """
+        Use this method to quick reply with text message, await the result.
+        """
+        return Context.current().reply_message(*args, **kwargs)
+
+    def reply_file(self, path, **kwargs):
+        """
+        Use this method to quick reply with file, await the result.
+        """
+        return Context.current().reply_file(path, **kwargs)
+
+    async def _handle(self, handler, update, semaphore, typed=False):
+        """
+        This is private function, to run one handler and release its concurrency slot.
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            started = time.perf_counter()
+        status = "ok"
+        try:
+            if typed:
+                update = Update.from_dict(update)
+            else:
+                update = util.parse_response(update)
+            ctx = Context(update, self).activate()
+            await handler(ctx.data)
+        except Exception:
+            status = "error"
+            logging.exception("Exception occurred!")
+        finally:
+            semaphore.release()
+            if metrics is not None:
+                metrics.timing(
+                    "handler_seconds", time.perf_counter() - started, status=status
+                )
+
+    async def poll(
+        self,
+        handler,
+        timeout=30,
+        concurrency=100,
+        allowed_updates=("message",),
+        typed=False,
+    ):
+        """
+        Use this method to poll the bot with asyncio.
+        Every update is handled in its own task, at most concurrency handlers run at the same time
+        and fetching pauses while all slots are busy.
+        When the poll is cancelled (Ctrl-C in run()) running handlers are awaited and the offset of the started updates is confirmed.
+        Args:
+            - handler (coroutine function): async def handler(data) to handle user data.
+            - timeout (int, optional): Long polling timeout in seconds. Defaults to 30.
+            - concurrency (int, optional): Maximum number of handlers running concurrently. Defaults to 100.
+            - allowed_updates (tuple, optional): Update types to fetch and forward to handler. Defaults to ("message",).
+            - typed (bool, optional): Pass updates to handler as compact __slots__ models (models.Update) instead of dicts. Defaults to False.
+        """
+        await self.remove_webhook()
+        logging.warning(
+            "Running AsyncTelegram.poll() with %d long polling timeout and %d concurrency.",
+            timeout,
+            concurrency,
+        )
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = set()
+        offset = None
+        try:
+            while True:
+                try:
+                    data = await self.get_updates(
+                        offset=offset, timeout=timeout, allowed_updates=allowed_updates
+                    )
+                except asyncio.TimeoutError:
+                    continue
+                except aiohttp.ClientError as e:
+                    logging.warning("get_updates: %s, retrying in 1 second.", str(e))
+                    await asyncio.sleep(1)
+                    continue
+                if data.get("error_code") == 429:
+                    await asyncio.sleep(
+                        data.get("parameters", {}).get("retry_after", 1)
+                    )
+                    continue
+                if not data["ok"]:
+                    raise ValueError(data)
+                for i in data["result"]:
+                    if any(k in i for k in allowed_updates):
+                        await semaphore.acquire()
+                        task = asyncio.ensure_future(
+                            self._handle(handler, i, semaphore, typed)
+                        )
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    # only updates whose task started are confirmed on shutdown
+                    offset = max(offset or 0, i["update_id"] + 1)
+        finally:
+            if tasks:
+                logging.warning(
+                    "AsyncTelegram.poll() stopping, waiting for %d handlers.",
+                    len(tasks),
+                )
+                await asyncio.gather(*tasks, return_exceptions=True)
+            if offset is not None:
+                try:
+                    await self.get_updates(offset=offset, limit=1)
+                except Exception as e:
+                    logging.error("confirm offset failed: %s", e)
+
+    def run(self, handler, **kwargs):
+        """
+        Use this method to run AsyncTelegram.poll() from synchronous code.
+        Args:
+            - handler (coroutine function): async def handler(data) to handle user data.
+            - **kwargs: AsyncTelegram.poll() keyword arguments.
+        """
+
+        async def main():
+            async with self:
+                await self.poll(handler, **kwargs)
+
+        asyncio.run(main())
@@ -0,0 +1,587 @@
+# -*-coding:utf8;-*-
+from .context import Context
+from .file_cache import FileInfoCache
+from .models import Model
+from .outbox import Outbox
+from .ratelimit import RateLimiter
+from .router import Router
+from .transport import transport
+from .util import util
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+import requests
+
+
+class Bot:
+    """
+    Instance based Telegram bot client, every bot has its own token, precomputed endpoint,
+    rate limiter, router and settings, so one process can serve many bots.
+    The TelegramSDK/telegram class methods are backed by a default Bot configured with class attributes.
+    author: guangrei
+    """
+
+    headers = {
+        "accept": "application/json",
+        "User-Agent": "Telegram Bot SDK - (https://github.com/cirebon-dev/TelegramSDK",
+    }
+    api_url = "https://api.telegram.org"
+
+    def __init__(
+        self,
+        token,
+        ssl_verify=True,
+        session=None,
+        rate_limiter=None,
+        max_retries=3,
+        upload_cache=None,
+        session_store=None,
+        api_url=None,
+        metrics=None,
+        file_info_cache=None,
+        download_cache=None,
+        outbox=None,
+    ):
+        """
+        Args:
+            - token (str): Telegram bot Api token.
+            - ssl_verify (bool, optional): Verify ssl certificate. Defaults to True.
+            - session (requests.Session, optional): Dedicated connection pool. Defaults to None (the pooled transport shared by every bot of the process).
+            - rate_limiter (RateLimiter, optional): Limiter every send goes through. Defaults to None (a new RateLimiter with Telegram limits), set False to disable.
+            - max_retries (int, optional): Retries after a 429 response. Defaults to 3.
+            - upload_cache (UploadCache, optional): Reuse file_id of uploaded files. Defaults to None.
+            - session_store (SessionStore, optional): Backend of set_session()/get_session(). Defaults to None (zcache database.json).
+            - api_url (str, optional): Bot API server, for example a local telegram-bot-api server or testing.FakeBotAPI. Defaults to None (TELEGRAM_API_URL or https://api.telegram.org).
+            - metrics (Metrics, optional): Instrumentation of API calls, handlers and sessions, see metrics.Metrics. Defaults to None (disabled).
+            - file_info_cache (FileInfoCache, optional): Reuse getFile results. Defaults to None (a new FileInfoCache), set False to disable.
+            - download_cache (DownloadCache, optional): Copy repeat downloads of the same file_unique_id from disk. Defaults to None.
+            - outbox (Outbox, optional): Queue sends in the background, send methods then return a Future. Defaults to None (sends block).
+        """
+        if api_url is None:
+            api_url = os.environ.get("TELEGRAM_API_URL", Bot.api_url)
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.endpoint = self.api_url + "/bot" + token + "/"
+        self.ssl_verify = ssl_verify
+        self.session = session
+        self.rate_limiter = (
+            RateLimiter() if rate_limiter is None else rate_limiter or None
+        )
+        self.max_retries = max_retries
+        self.upload_cache = upload_cache
+        self.session_store = session_store
+        self.metrics = metrics
+        self.file_info_cache = (
+            FileInfoCache() if file_info_cache is None else file_info_cache or None
+        )
+        self.download_cache = download_cache
+        self.outbox = outbox
+        self.cacheobject = None
+        self.router = Router()
+
+    def file_url(self, file_path):
+        """
+        Function to get the download url of a file.
+        Args:
+            - file_path (str): file_path returned by get_file().
+        Returns:
+            - str: download url.
+        """
+        return self.api_url + "/file/bot" + self.token + "/" + file_path
+
+    def __repr__(self):
+        return "Bot(%s)" % self.token.split(":")[0]
+
+    def _request(self, api, chat_id=None, method="POST", **kwargs):
+        """
+        This is private function, every API method goes through it.
+        Sends to chat_id wait for the rate limiter (the per chat limit only in concurrent senders,
+        see RateLimiter.per_chat()), and 429 responses are retried after parameters.retry_after
+        up to max_retries times instead of failing.
+        Args:
+            - api (str): Bot API method name, for example "sendMessage".
+            - chat_id (int or str, optional): Target chat for rate limiting. Defaults to None.
+            - method (str, optional): Http method. Defaults to "POST".
+            - **kwargs: transport.request() keyword arguments.
+        Returns:
+            - dict: json decoded response.
+        """
+        url = self.endpoint + api
+        kwargs.setdefault("verify", self.ssl_verify)
+        if "files" not in kwargs:
+            kwargs.setdefault("headers", Bot.headers)
+        limiter = self.rate_limiter
+        metrics = self.metrics
+        scope = chat_id if RateLimiter.per_chat() else None
+        attempt = 0
+        while True:
+            if limiter is not None and chat_id is not None:
+                limiter.acquire(scope)
+            if metrics is not None:
+                started = time.perf_counter()
+            if self.session is None:
+                r = transport.request(method, url, **kwargs)
+            else:
+                kwargs.setdefault("timeout", transport.timeout)
+                r = self.session.request(method, url, **kwargs)
+            if metrics is None:
+                ret = util.loads(r.content)
+            else:
+                ret = Bot._observe(metrics, api, r, started)
+            if ret.get("error_code") != 429 or attempt >= self.max_retries:
+                return ret
+            attempt += 1
+            if metrics is not None:
+                metrics.count("api_retries_total", method=api.split("?", 1)[0])
+            retry_after = ret.get("parameters", {}).get("retry_after", 1)
+            logging.warning(
+                "flood control: retry %d after %s seconds.", attempt, retry_after
+            )
+            if (
+                limiter is None
+                or scope is None
+                or not limiter.pause(retry_after, scope)
+            ):
+                time.sleep(retry_after)
+            for name, value in kwargs.get("files", {}).items():
+                if hasattr(value[1], "seek"):
+                    value[1].seek(0)
+
+    def _observe(metrics, api, r, started):
+        """
+        This is private function, to decode a response and record its round-trip, decoding time and size.
+        """
+        method = api.split("?", 1)[0]
+        received = time.perf_counter()
+        ret = util.loads(r.content)
+        metrics.timing("api_request_seconds", received - started, method=method)
+        metrics.timing(
+            "api_parse_seconds", time.perf_counter() - received, method=method
+        )
+        body = getattr(getattr(r, "request", None), "body", None)
+        if isinstance(body, (bytes, str)):
+            metrics.count("bytes_sent_total", len(body), method=method)
+        metrics.count("bytes_received_total", len(r.content), method=method)
+        if not ret.get("ok", True):
+            metrics.count("api_errors_total", method=method, code=ret.get("error_code"))
+        return ret
+
+    def set_webhook(
+        self,
+        url,
+        certificate=None,
+        secret_token=None,
+        max_connections=None,
+        allowed_updates=None,
+        drop_pending_updates=False,
+    ):
+        """
+        Use this method to specify a url and receive incoming updates via an outgoing webhook.
+        Args:
+            - url (str): HTTPS url to send updates to. Use an empty string to remove webhook integration.
+            - certificate (str, optional): Path to certificate file. Default to None.
+            - secret_token (str, optional): Sent back in the X-Telegram-Bot-Api-Secret-Token header of every webhook request, 1-256 characters A-Z, a-z, 0-9, _ and -. Default to None.
+            - max_connections (int, optional): Maximum simultaneous HTTPS connections Telegram opens to deliver updates, 1-100. Default to None (40).
+            - allowed_updates (list, optional): Update types to receive, for example ["message"]. Default to None (all except some types).
+            - drop_pending_updates (bool, optional): Drop all pending updates. Default to False.
+        Returns:
+            - dict: dict that can be accessed like an object.
+        """
+        data = {"url": url}
+        if secret_token is not None:
+            data["secret_token"] = secret_token
+        if max_connections is not None:
+            data["max_connections"] = max_connections
+        if allowed_updates is not None:
+            data["allowed_updates"] = json.dumps(list(allowed_updates))
+        if drop_pending_updates:
+            data["drop_pending_updates"] = True
+        if certificate is not None:
+            with open(certificate, "rb") as f:
+                files = {"certificate": (os.path.basename(certificate), f)}
+                ret = self._request("setWebHook", data=data, files=files)
+        else:
+            ret = self._request("setWebHook", data=data)
+        return util.parse_response(ret)
+
+    def remove_webhook(self):
+        """
+        Use this method to remove a previously set outgoing webhook.
+        Returns:
+            - dict: dict that can be accessed like an object.
+        """
+        ret = self._request("setWebhook?remove", data={"url": "Empty"})
+        return util.parse_response(ret)
+
+    def get_updates(self, offset=None, limit=100, timeout=0, allowed_updates=None):
+        """
+        Use this method to receive incoming updates using long polling, see TelegramSDK.get_updates().
+        Returns:
+            - dict: raw json decoded response.
+        """
+        data = {"offset": offset, "limit": limit, "timeout": timeout}
+        if allowed_updates is not None:
+            data["allowed_updates"] = json.dumps(list(allowed_updates))
+        return self._request(
+            "getUpdates", data=data, timeout=transport.poll_timeout(timeout)
+        )
+
+    def send_message(
+        self,
+        text,
+        chat_id,
+        parse_mode=None,
+        disable_web_page_preview=False,
+        disable_notification=False,
+        reply_to_message_id=None,
+        reply_markup=None,
+    ):
+        """
+        Use this method to send text messages, see TelegramSDK.send_message().
+        Returns:
+            - dict: dict that can be accessed like an object.
+            - Future: of the dict, with bot.outbox.
+        """
+        outbox = self.outbox
+        if outbox is not None and not Outbox.sending():
+            return outbox.submit(
+                chat_id,
+                self.send_message,
+                text,
+                chat_id,
+                parse_mode,
+                disable_web_page_preview,
+                disable_notification,
+                reply_to_message_id,
+                reply_markup,
+            )
+        data = {
+            "chat_id": chat_id,
+            "text": text,
+            "disable_web_page_preview": disable_web_page_preview,
+            "disable_notification": disable_notification,
+        }
+        if parse_mode:
+            data["parse_mode"] = parse_mode
+        if reply_to_message_id:
+            data["reply_to_message_id"] = reply_to_message_id
+        if reply_markup:
+            data["reply_markup"] = reply_markup
+        ret = self._request("sendMessage", chat_id=chat_id, data=data)
+        return util.parse_response(ret)
+
+    def send_document(
+        self,
+        chat_id,
+        document,
+        caption=None,
+        disable_notification=False,
+        reply_to_message_id=None,
+    ):
+        """
+        Use this method to send general files, see TelegramSDK.send_document().
+        Returns:
+            - dict: dict that can be accessed like an object.
+            - Future: of the dict, with bot.outbox.
+        """
+        outbox = self.outbox
+        if outbox is not None and not Outbox.sending():
+            return outbox.submit(
+                chat_id,
+                self.send_document,
+                chat_id,
+                document,
+                caption,
+                disable_notification,
+                reply_to_message_id,
+            )
+        cache = self.upload_cache
+        if cache is not None and os.path.isfile(document):
+            file_id = cache.get(document)
+            if file_id is not None:
+                ret = self.send_document(
+                    chat_id,
+                    file_id,
+                    caption=caption,
+                    disable_notification=disable_notification,
+                    reply_to_message_id=reply_to_message_id,
+                )
+                if ret["ok"] or ret.get("error_code") != 400:
+                    return ret
+                cache.delete(document)
+        data = {
+            "chat_id": chat_id,
+            "reply_to_message_id": reply_to_message_id,
+            "caption": caption,
+            "disable_notification": disable_notification,
+        }
+        uploaded = os.path.isfile(document)
+        if uploaded:
+            with open(document, "rb") as f:
+                files = {"document": (os.path.basename(document), f)}
+                ret = self._request(
+                    "sendDocument", chat_id=chat_id, data=data, files=files
+                )
+        else:
+            data["document"] = document
+            ret = self._request("sendDocument", chat_id=chat_id, data=data)
+        ret = util.parse_response(ret)
+        if cache is not None and uploaded and ret["ok"]:
+            file_id = util.sent_file_id(ret.result)
+            if file_id is not None:
+                cache.set(document, file_id)
+        return ret
+
+    def send_chat_action(self, chat_id, action="typing"):
+        """
+        Use this method to tell the user that something is happening on the bot's side, see TelegramSDK.send_chat_action().
+        Returns:
+            - dict: dict that can be accessed like an object.
+            - Future: of the dict, with bot.outbox, a queued action of the chat is replaced by newer sends.
+        """
+        outbox = self.outbox
+        if outbox is not None and not Outbox.sending():
+            return outbox.submit(
+                chat_id, self.send_chat_action, chat_id, action, coalesce=action
+            )
+        data = {"chat_id": chat_id, "action": action}
+        ret = self._request("sendChatAction", chat_id=chat_id, data=data)
+        return util.parse_response(ret)
+
+    def get_file(self, file_id):
+        """
+        Use this method to get basic info about a file and prepare it for downloading.
+        Args:
+            - file_id (str): File identifier to get info about
+        Returns:
+            - dict: dict that can be accessed like an object.
+        """
+        cache = self.file_info_cache
+        if cache is None:
+            ret = self._fetch_file(file_id)
+        else:
+            ret = cache.get(file_id, self._fetch_file)
+        return util.parse_response(ret)
+
+    def _fetch_file(self, file_id):
+        """
+        This is private function, getFile request.
+        """
+        return self._request("getFile?file_id=" + file_id, method="GET")
+
+    def update(self, data):
+        """
+        Function to make data the update of the current thread or asyncio task.
+        Args:
+            - data (str, dict or Update): telegram update.
+        Returns:
+            - Context: per-update context bound to this bot.
+        """
+        if type(data) in (str, bytes):
+            data = util.loads(data)
+        if not isinstance(data, Model):
+            data = util.parse_response(data)
+        return Context(data, self).activate()
+
+    def command(self, *names, **kwargs):
+        """
+        Decorator to register a command handler on bot.router, see Router.command().
+        """
+        return self.router.command(*names, **kwargs)
+
+    def regex(self, pattern, flags=0, **kwargs):
+        """
+        Decorator to register a regex handler on bot.router, see Router.regex().
+        """
+        return self.router.regex(pattern, flags, **kwargs)
+
+    def filter(self, func, **kwargs):
+        """
+        Decorator to register a filter handler on bot.router, see Router.filter().
+        """
+        return self.router.filter(func, **kwargs)
+
+    def on(self, *update_types):
+        """
+        Decorator to register an update type handler on bot.router, see Router.on().
+        """
+        return self.router.on(*update_types)
+
+    def default(self, handler):
+        """
+        Decorator to register the fallback handler on bot.router, see Router.default().
+        """
+        return self.router.default(handler)
+
+    def dispatch(self, data):
+        """
+        Use this method to handle an update with the handlers of bot.router.
+        Args:
+            - data (str, dict or Update): telegram update.
+        Returns:
+            - bool: True if a handler was called.
+        """
+        return self.router.dispatch(self.update(data))
+
+    def poll(self, **kwargs):
+        """
+        Use this method to poll this bot, see Bot.poll_many().
+        """
+        Bot.poll_many([self], **kwargs)
+
+    def _fetch(bot, index, shards, lock, stop, last, timeout, debug):
+        """
+        This is private function, long polling loop of one bot in poll_many().
+        """
+        allowed_updates = bot.router.update_types() or ["message"]
+        offset = None
+        backoff = 1
+        while not stop.is_set():
+            try:
+                data = bot.get_updates(
+                    offset=offset, timeout=timeout, allowed_updates=allowed_updates
+                )
+            except requests.exceptions.Timeout:
+                continue
+            except requests.exceptions.ConnectionError as e:
+                logging.warning("%r get_updates: %s, retrying in 1 second.", bot, e)
+                time.sleep(1)
+                continue
+            if data.get("error_code") == 429:
+                time.sleep(data.get("parameters", {}).get("retry_after", 1))
+                continue
+            if not data["ok"]:
+                # a revoked token or another getUpdates consumer will not recover
+                if data.get("error_code") in (401, 409):
+                    logging.error("%r stopped: %s", bot, data.get("description"))
+                    return
+                logging.warning(
+                    "%r get_updates: %s, retrying in %d seconds.",
+                    bot,
+                    data.get("description"),
+                    backoff,
+                )
+                stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+            backoff = 1
+            for i in data["result"]:
+                offset = i["update_id"] + 1
+                if not any(k in i for k in allowed_updates):
+                    continue
+                chat_id = util.get_chat_id(i)
+                if not isinstance(chat_id, int):
+                    chat_id = i["update_id"]
+                # the lock of this bot only, a full shard must not hold back other bots
+                with lock:
+                    if stop.is_set():
+                        return
+                    if debug:
+                        logging.warning("%r: enqueue %d.", bot, i["update_id"])
+                    enqueued = None if bot.metrics is None else time.perf_counter()
+                    shards[hash((index, chat_id)) % len(shards)].put((bot, i, enqueued))
+                    last[index] = i["update_id"]
+
+    def _handle(q):
+        """
+        This is private function, handler thread of poll_many().
+        """
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            bot, data, enqueued = item
+            metrics = bot.metrics
+            if metrics is not None:
+                started = time.perf_counter()
+                if enqueued is not None:
+                    metrics.timing("queue_wait_seconds", started - enqueued)
+            status = "ok"
+            try:
+                bot.dispatch(data)
+            except BaseException:
+                status = "error"
+                logging.exception("Exception occurred!")
+            if metrics is not None:
+                metrics.timing(
+                    "handler_seconds", time.perf_counter() - started, status=status
+                )
+
+    def poll_many(bots, worker=8, timeout=30, queue_size=100, debug=False):
+        """
+        Use this method to poll many bots in one process.
+        Every bot long polls in a lightweight thread, updates of all bots are handled by one shared pool
+        of worker threads, updates of the same chat of the same bot are handled in order.
+        Handlers are registered on each bot (bot.command(), bot.on() etc) and receive its Context.
+        SIGINT and SIGTERM stop it gracefully: fetching stops, queued updates are handled and confirmed.
+        Args:
+            - bots (list): Bot instances.
+            - worker (int, optional): Number of handler threads shared by every bot. Defaults to 8.
+            - timeout (int, optional): Long polling timeout in seconds. Defaults to 30.
+            - queue_size (int, optional): Maximum queued updates per handler thread, fetching pauses when it is full. Defaults to 100.
+            - debug (bool, optional): Log every update. Defaults to False.
+        Bots without their own session share the pooled transport, its pool_maxsize is raised to the number of
+        those bots plus worker, so every long poll and handler send keeps its connection alive.
+        """
+        shared = sum(1 for bot in bots if bot.session is None)
+        if shared and transport.pool_maxsize < shared + worker:
+            transport.configure(pool_maxsize=shared + worker)
+        stop = threading.Event()
+        locks = [threading.Lock() for _ in bots]
+        last = {}
+        shards = [queue.Queue(queue_size) for _ in range(worker)]
+        handlers = [
+            threading.Thread(target=Bot._handle, args=(q,), daemon=True) for q in shards
+        ]
+        for thread in handlers:
+            thread.start()
+        fetchers = []
+        for index, bot in enumerate(bots):
+            bot.remove_webhook()
+            thread = threading.Thread(
+                target=Bot._fetch,
+                args=(bot, index, shards, locks[index], stop, last, timeout, debug),
+                daemon=True,
+            )
+            thread.start()
+            fetchers.append(thread)
+        logging.warning(
+            "Running Bot.poll_many() with %d bots and %d worker.", len(bots), worker
+        )
+
+        def shutdown(signum, frame):
+            stop.set()
+
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                previous[sig] = signal.signal(sig, shutdown)
+        try:
+            while not stop.wait(1):
+                if not any(thread.is_alive() for thread in fetchers):
+                    break
+        finally:
+            stop.set()
+            # wait for enqueues in progress, later ones see stop
+            for lock in locks:
+                with lock:
+                    pass
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+            logging.warning("Bot.poll_many() stopping, draining queued updates.")
+            for q in shards:
+                q.put(None)
+            for thread in handlers:
+                thread.join()
+            for bot in bots:
+                if bot.outbox is not None:
+                    bot.outbox.stop()
+            for index, update_id in last.items():
+                try:
+                    bots[index].get_updates(offset=update_id + 1, limit=1)
+                except Exception as e:
+                    logging.error("%r confirm offset failed: %s", bots[index], e)
@@ -0,0 +1,190 @@
+# -*-coding:utf8;-*-
+from collections import deque
+import json
+import os
+import threading
+
+
+class Checkpoint:
+    """
+    Durable polling state for at-least-once processing across restarts.
+    Fetched updates are journaled before Telegram confirms them and removed once a handler finished,
+    so a crash loses nothing: pending updates are replayed after restart.
+    Changes are appended to a journal next to the checkpoint file (path + ".journal"): one line per fetched batch,
+    fsynced before the batch is confirmed, and one update_id per ack, written before the next update is handled.
+    Every compact_size lines the journal is folded into the checkpoint file (offset, pending updates and the
+    dedupe index) and truncated. A bounded index of recently acknowledged update_id skips updates delivered again after a restart.
+    An update is handled again when the process dies after its handler returned and before the ack is written.
+    The files belong to one poller process, they are not locked against other nodes.
+    author: guangrei
+    """
+
+    def __init__(
+        self, path="checkpoint.json", dedupe_size=10000, compact_size=1000, fsync=False
+    ):
+        """
+        Args:
+            - path (str, optional): Json file of the checkpoint. Defaults to checkpoint.json.
+            - dedupe_size (int, optional): Number of handled update_id remembered. Defaults to 10000.
+            - compact_size (int, optional): Journal lines that trigger a compaction. Defaults to 1000.
+            - fsync (bool, optional): Also fsync every ack, so acks survive a power loss and not only a crash of the process. Defaults to False (acks are fsynced with the next fetched batch).
+        """
+        self.path = path
+        self.journal = path + ".journal"
+        self.compact_size = compact_size
+        self.fsync = fsync
+        self.offset = None
+        self._pending = {}
+        self._done = deque(maxlen=dedupe_size)
+        self._seen = set()
+        self._lines = 0
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.offset = data.get("offset")
+            self._pending = {int(k): v for k, v in data.get("pending", {}).items()}
+            for i in data.get("done", ()):
+                self._remember(i)
+        if os.path.exists(self.journal):
+            self._replay()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_file"] = None
+        state["_pid"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _remember(self, update_id):
+        """
+        This is private function, to add update_id to the bounded dedupe index.
+        """
+        if len(self._done) == self._done.maxlen:
+            self._seen.discard(self._done[0])
+        self._done.append(update_id)
+        self._seen.add(update_id)
+
+    def _ack(self, update_id):
+        """
+        This is private function, to move update_id from pending to the dedupe index.
+        """
+        if self._pending.pop(update_id, None) is not None:
+            self._remember(update_id)
+
+    def _add(self, updates):
+        """
+        This is private function, to add fetched updates to pending.
+        Returns:
+            - list: updates that are neither handled nor pending already.
+        """
+        new = []
+        for i in updates:
+            update_id = i["update_id"]
+            if self.offset is None or update_id >= self.offset:
+                self.offset = update_id + 1
+            if update_id in self._seen or update_id in self._pending:
+                continue
+            self._pending[update_id] = i
+            new.append(i)
+        return new
+
+    def _replay(self):
+        """
+        This is private function, to apply the journal written after the last compaction.
+        A torn last line of a crash during a write is ignored.
+        """
+        with open(self.journal) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if isinstance(entry, int):
+                    self._ack(entry)
+                else:
+                    self._add(entry)
+                self._lines += 1
+
+    def _append(self, line, sync):
+        """
+        This is private function, to append one journal line and compact the journal when it is long.
+        """
+        if self._file is None or self._pid != os.getpid():
+            self._file = open(self.journal, "a")
+            self._pid = os.getpid()
+        self._file.write(line + "\n")
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+        self._lines += 1
+        if self._lines >= self.compact_size:
+            self._save()
+
+    def pending(self):
+        """
+        Function to get journaled updates that were not handled yet, to replay them after restart.
+        Returns:
+            - list: updates ordered by update_id.
+        """
+        with self._lock:
+            return [self._pending[i] for i in sorted(self._pending)]
+
+    def accept(self, updates):
+        """
+        Use this method to journal a fetched batch before it is confirmed to Telegram.
+        Args:
+            - updates (list): updates returned by getUpdates.
+        Returns:
+            - list: updates that are neither handled nor pending already.
+        """
+        with self._lock:
+            new = self._add(updates)
+            if updates:
+                self._append(json.dumps(updates), True)
+            return new
+
+    def done(self, update_id):
+        """
+        Use this method to acknowledge a handled update.
+        Args:
+            - update_id (int): update identifier.
+        """
+        with self._lock:
+            self._ack(update_id)
+            self._append(str(int(update_id)), self.fsync)
+
+    def save(self):
+        """
+        Use this method to compact the journal into the checkpoint file now, for example before shutdown.
+        """
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        """
+        This is private function, to write the checkpoint atomically and truncate the journal.
+        """
+        data = {
+            "offset": self.offset,
+            "pending": self._pending,
+            "done": list(self._done),
+        }
+        tmp = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        # a crash before the truncate replays lines already in the checkpoint, which is harmless
+        if self._file is not None and self._pid == os.getpid():
+            self._file.close()
+        self._file = open(self.journal, "w")
+        self._pid = os.getpid()
+        self._lines = 0
@@ -0,0 +1,364 @@
+# -*-coding:utf8;-*-
+from .session import ZcacheSession
+from .transport import transport
+from .util import util
+import contextvars
+import inspect
+import logging
+import os
+import shutil
+import time
+
+_current = contextvars.ContextVar("TelegramSDK_context", default=None)
+
+
+class Context:
+    """
+    Per-update context with the reply, download and session helpers of telegram.
+    telegram.update() stores it in a contextvar, so every thread and asyncio task
+    works on its own update and can be handled in parallel inside one process.
+    author: guangrei
+    """
+
+    __slots__ = ("data", "bot", "match", "_session", "_parsed")
+
+    def __init__(self, data, bot):
+        """
+        Args:
+            - data (dict): update that can be accessed like an object.
+            - bot (object): client used to send replies, telegram class or an AsyncTelegram instance.
+        """
+        self.data = data
+        self.bot = bot
+        self.match = None
+        self._session = None
+        self._parsed = None
+
+    def current():
+        """
+        Function to get the context of the current thread or asyncio task.
+        Returns:
+            - Context: if an update was set.
+            - None: if no update was set.
+        """
+        return _current.get()
+
+    def activate(self):
+        """
+        Use this method to make this context the current one of the running thread or asyncio task.
+        Returns:
+            - Context: self.
+        """
+        _current.set(self)
+        return self
+
+    @property
+    def update_type(self):
+        """
+        Type of the update, for example "message" or "callback_query".
+        """
+        for key in self.data.keys():
+            if key != "update_id":
+                return key
+        return None
+
+    @property
+    def message(self):
+        """
+        Message of the update, also for edited messages, channel posts and callback queries.
+        """
+        data = self.data
+        for key in util.message_types:
+            if key in data:
+                return data[key]
+        if "callback_query" in data:
+            return data["callback_query"].get("message")
+        return data.get("message")
+
+    @property
+    def chat_id(self):
+        """
+        Chat of the update, the sender for updates without chat (inline queries, callback queries of inline messages), None if it has neither.
+        """
+        message = self.message
+        if message is not None and "chat" in message:
+            return message["chat"]["id"]
+        return util.get_chat_id(self.data)
+
+    @property
+    def user_id(self):
+        """
+        Sender of the update, the sender_chat for channel posts and anonymous admins, None if it has neither.
+        """
+        update_type = self.update_type
+        if update_type is None or not hasattr(self.data[update_type], "keys"):
+            return None
+        value = self.data[update_type]
+        sender = value.get("from")
+        if sender is None:
+            sender = value.get("sender_chat")
+        if sender is None:
+            return None
+        return sender["id"]
+
+    def _parse(self):
+        """
+        This is private function, to parse text, command and arguments once per update.
+        """
+        if self._parsed is None:
+            message = self.message
+            text = None
+            if message is not None:
+                text = message.get("text", message.get("caption"))
+            command = None
+            args = text
+            if text is not None:
+                if text.startswith("/"):
+                    head = text.split(None, 1)
+                    command = head[0].split("@")[0]
+                    args = head[1] if len(head) > 1 else None
+                if args is not None:
+                    args = args.strip() or None
+            self._parsed = (text, command, args)
+        return self._parsed
+
+    @property
+    def text(self):
+        """
+        Text or caption of the message, None if it has none.
+        """
+        return self._parse()[0]
+
+    @property
+    def command(self):
+        """
+        Command of the message without bot username, for example "/start", None if it is not a command.
+        """
+        return self._parse()[1]
+
+    @property
+    def args(self):
+        """
+        Text after the command, or the whole text if it is not a command (see util.get_text()), None if empty.
+        """
+        return self._parse()[2]
+
+    def reply_message(self, *args, **kwargs):
+        """
+        Use this method to quick reply with text message.
+        """
+        kwargs["chat_id"] = self.chat_id
+        kwargs["reply_to_message_id"] = self.message.message_id
+        return self.bot.send_message(*args, **kwargs)
+
+    def reply_file(self, path, **kwargs):
+        """
+        Use this method to quick reply with file.
+        """
+        kwargs["chat_id"] = self.chat_id
+        kwargs["document"] = path
+        kwargs["reply_to_message_id"] = self.message.message_id
+        return self.bot.send_document(**kwargs)
+
+    def download_file(
+        self,
+        path,
+        max_size=0,
+        filter=(),
+        concurrency=4,
+        photo="largest",
+        thumbnails=False,
+    ):
+        """
+        Use this method to auto download file.
+        Only the files of the message are selected (one photo size by default, no thumbnails),
+        size and extension known from the update are checked before any request is issued,
+        files are streamed to disk in chunks and several files are downloaded in parallel.
+        Args:
+            - path (str): Directory for downloaded files.
+            - max_fize (int, optional): Limit file size to be downloaded, it is also enforced while streaming. Default to 0 (no limit).
+            - filter (list or tuple): Filter file extension to be downloaded. Default to ()
+            - concurrency (int, optional): Number of parallel downloads. Default to 4.
+            - photo (str or int, optional): Photo size policy, "largest", "smallest", "all" or minimum pixels on the longest side, see util.select_photo(). Default to "largest".
+            - thumbnails (bool, optional): Also download thumbnails of documents, videos etc. Default to False.
+        Returns:
+            - list: List of path downloaded files.
+        Raises:
+            - TypeError: with AsyncTelegram, downloads are blocking, use its get_file() and file_url().
+        """
+        if inspect.iscoroutinefunction(getattr(self.bot, "get_file", None)):
+            raise TypeError(
+                "download_file() is blocking and not supported by AsyncTelegram, "
+                "download with await bot.get_file() and bot.file_url() instead"
+            )
+        files = []
+        for i in util.select_files(self.data, photo=photo, thumbnails=thumbnails):
+            if max_size > 0 and i.get("file_size", 0) > max_size:
+                continue
+            if len(filter) and "file_name" in i:
+                if os.path.splitext(i["file_name"])[1].lower() not in filter:
+                    continue
+            files.append(i)
+
+        def download(file):
+            # one failed file must not lose the others
+            try:
+                return self._download(file, path, max_size, filter)
+            except Exception:
+                logging.exception("download of %s failed!", file.get("file_id"))
+                return None
+
+        if len(files) > 1 and concurrency > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(min(concurrency, len(files))) as executor:
+                result = list(executor.map(download, files))
+        else:
+            result = [download(i) for i in files]
+        return [i for i in result if i is not None]
+
+    def _download(self, file, path, max_size, filter, chunk_size=65536):
+        """
+        This is private function, to stream one file to disk, or copy it from bot.download_cache.
+        Returns:
+            - str: downloaded file path.
+            - None: if file is filtered, bigger than max_size or could not be downloaded.
+        """
+        cache = getattr(self.bot, "download_cache", None)
+        unique_id = file.get("file_unique_id")
+        if cache is not None and unique_id is not None:
+            cached = cache.get(unique_id)
+            if cached is not None:
+                file_name = os.path.basename(cached)
+                if max_size > 0 and os.path.getsize(cached) > max_size:
+                    return None
+                if len(filter) and os.path.splitext(file_name)[1].lower() not in filter:
+                    return None
+                save = util.uniq_file(path, file_name)
+                shutil.copyfile(cached, save + ".part")
+                os.replace(save + ".part", save)
+                return save
+        p = self.bot.get_file(file["file_id"])
+        if not p["ok"]:
+            logging.error("getFile of %s failed: %r", file["file_id"], p)
+            return None
+        file_name = os.path.basename(p.result.file_path)
+        file_ext = os.path.splitext(file_name)[1]
+        if max_size > 0 and p.result.get("file_size", 0) > max_size:
+            return None
+        if len(filter) and file_ext.lower() not in filter:
+            return None
+        api = self.bot.file_url(p.result.file_path)
+        save = util.uniq_file(path, file_name)
+        size = 0
+        metrics = getattr(self.bot, "metrics", None)
+        if metrics is not None:
+            started = time.perf_counter()
+        session = getattr(self.bot, "session", None)
+        if session is None:
+            r = transport.get(api, verify=self.bot.ssl_verify, stream=True)
+        else:
+            r = session.request(
+                "GET",
+                api,
+                verify=self.bot.ssl_verify,
+                stream=True,
+                timeout=transport.timeout,
+            )
+        with r:
+            if r.status_code != 200:
+                logging.error("download of %s failed: %d", file_name, r.status_code)
+                # the cached file_path may have expired, the next attempt calls getFile again
+                info_cache = getattr(self.bot, "file_info_cache", None)
+                if info_cache is not None:
+                    info_cache.delete(file["file_id"])
+                return None
+            if max_size > 0 and int(r.headers.get("Content-Length", 0)) > max_size:
+                return None
+            try:
+                with open(save + ".part", "wb") as f:
+                    for chunk in r.iter_content(chunk_size):
+                        size += len(chunk)
+                        if max_size > 0 and size > max_size:
+                            break
+                        f.write(chunk)
+            except BaseException:
+                if os.path.exists(save + ".part"):
+                    os.remove(save + ".part")
+                raise
+        if metrics is not None:
+            metrics.timing(
+                "api_request_seconds", time.perf_counter() - started, method="download"
+            )
+            metrics.count("bytes_received_total", size, method="download")
+        if max_size > 0 and size > max_size:
+            os.remove(save + ".part")
+            return None
+        os.replace(save + ".part", save)
+        if cache is not None and unique_id is not None:
+            cache.put(unique_id, save, file_name)
+        return save
+
+    def _store(self, database):
+        """
+        This is private function, to get the session backend: bot.session_store,
+        else bot.cacheobject or a long-lived zcache store of database.
+        """
+        store = getattr(self.bot, "session_store", None)
+        if store is not None:
+            return store
+        cacheobject = getattr(self.bot, "cacheobject", None)
+        if cacheobject is not None:
+            return ZcacheSession.shared(cache=cacheobject)
+        return ZcacheSession.shared(database)
+
+    def _session_key(self):
+        """
+        This is private function, sessions are stored per user id and chat id.
+        """
+        user_id = self.user_id
+        chat_id = self.chat_id
+        if user_id is None and chat_id is None:
+            raise ValueError("%s update has no user and no chat" % self.update_type)
+        return "%s:%s" % (user_id, chat_id)
+
+    def set_session(self, value, ttl=0, database="database.json"):
+        """
+        Function set_session based user id and chat id.
+        Args:
+            - value (Any): Json serialize able object (str, int, dict, bool etc)
+            - ttl (int, optional): Limit time to life. Default to 0 (no limit).
+            - database (str, optional): Zcache database path, used when no session store is set. Default to database.json.
+        """
+        store = self._store(database)
+        metrics = getattr(self.bot, "metrics", None)
+        if metrics is None:
+            store.set(self._session_key(), value, ttl=ttl)
+        else:
+            started = time.perf_counter()
+            store.set(self._session_key(), value, ttl=ttl)
+            metrics.timing("session_seconds", time.perf_counter() - started, op="set")
+        self._session = (store, value)
+
+    def get_session(self, database="database.json"):
+        """
+        Function get_session based user id and chat id.
+        The value is fetched once per update, later calls in the same handler do not hit the backend.
+        Args:
+            - database (str, optional): Zcache database path, used when no session store is set. Default to database.json.
+        Returns:
+            - Any: session value if exists.
+            - None: if session not exists.
+        """
+        store = self._store(database)
+        if self._session is None or self._session[0] is not store:
+            metrics = getattr(self.bot, "metrics", None)
+            if metrics is None:
+                self._session = (store, store.get(self._session_key()))
+            else:
+                started = time.perf_counter()
+                self._session = (store, store.get(self._session_key()))
+                metrics.timing(
+                    "session_seconds", time.perf_counter() - started, op="get"
+                )
+        return self._session[1]
@@ -0,0 +1,186 @@
+# -*-coding:utf8;-*-
+from collections import OrderedDict
+import os
+import shutil
+import threading
+import time
+
+
+class FileInfoCache:
+    """
+    In-memory TTL cache of getFile results, forwarded media and stickers repeat the same file_id.
+    Concurrent lookups of the same file_id are single-flighted: one thread calls getFile, the others wait for its result.
+    Telegram guarantees a file_path for at least one hour, the default ttl stays below it.
+    author: guangrei
+    """
+
+    def __init__(self, ttl=3300, max_entries=10000):
+        """
+        Args:
+            - ttl (float, optional): Seconds a result is reused. Defaults to 3300.
+            - max_entries (int, optional): Least recently used entries are evicted above this size. Defaults to 10000.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_id, fetch):
+        """
+        Use this method to get the getFile result of file_id, fetch is only called when it is not cached.
+        Only successful results are cached, errors are returned (or raised) to every waiting caller.
+        Args:
+            - file_id (str): File identifier.
+            - fetch (callable): fetch(file_id) calls getFile and returns the json decoded response.
+        Returns:
+            - dict: json decoded getFile response.
+        """
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(file_id)
+                    return entry[1]
+                del self._entries[file_id]
+            flight = self._flights.get(file_id)
+            leader = flight is None
+            if leader:
+                # [done, result, exception]
+                flight = self._flights[file_id] = [threading.Event(), None, None]
+        if not leader:
+            flight[0].wait()
+            if flight[2] is not None:
+                raise flight[2]
+            return flight[1]
+        try:
+            flight[1] = ret = fetch(file_id)
+            if ret.get("ok"):
+                with self._lock:
+                    self._entries[file_id] = (time.monotonic() + self.ttl, ret)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return ret
+        except BaseException as e:
+            flight[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[file_id]
+            flight[0].set()
+
+    def delete(self, file_id):
+        """
+        Use this method to drop a cached result, for example when its file_path expired early.
+        Args:
+            - file_id (str): File identifier.
+        """
+        with self._lock:
+            self._entries.pop(file_id, None)
+
+
+class DownloadCache:
+    """
+    Content-addressed local cache of downloaded files keyed by file_unique_id, which stays the same
+    for a file across bots and file_id changes. Repeat downloads are copied from the cache without any request.
+    Files are stored as path/<file_unique_id>/<file name>, least recently used ones are evicted above max_size.
+    The directory can be shared by several processes.
+    author: guangrei
+    """
+
+    def __init__(self, path="download_cache", max_size=1 << 30):
+        """
+        Args:
+            - path (str, optional): Cache directory. Defaults to "download_cache".
+            - max_size (int, optional): Maximum total size in bytes. Defaults to 1 GiB.
+        """
+        self.path = path
+        self.max_size = max_size
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def get(self, file_unique_id):
+        """
+        Use this method to find a cached file.
+        Args:
+            - file_unique_id (str): Unique file identifier.
+        Returns:
+            - str: cached file path.
+            - None: if not cached.
+        """
+        folder = os.path.join(self.path, file_unique_id)
+        try:
+            names = [i for i in os.listdir(folder) if not i.endswith(".tmp")]
+        except OSError:
+            return None
+        if not names:
+            return None
+        cached = os.path.join(folder, names[0])
+        try:
+            os.utime(cached)
+        except OSError:
+            return None
+        return cached
+
+    def put(self, file_unique_id, local_path, file_name=None):
+        """
+        Use this method to copy a downloaded file into the cache.
+        Args:
+            - file_unique_id (str): Unique file identifier.
+            - local_path (str): Downloaded file.
+            - file_name (str, optional): Name of the cached file. Defaults to None (name of local_path).
+        """
+        folder = os.path.join(self.path, file_unique_id)
+        os.makedirs(folder, exist_ok=True)
+        target = os.path.join(folder, file_name or os.path.basename(local_path))
+        tmp = "%s.%d.tmp" % (target, os.getpid())
+        shutil.copyfile(local_path, tmp)
+        os.replace(tmp, target)
+        size = os.path.getsize(target)
+        with self._lock:
+            if self._size is None:
+                self._size = self._usage()[0]
+            else:
+                self._size += size
+            if self._size > self.max_size:
+                self._evict()
+
+    def _usage(self):
+        """
+        This is private function, returns (total size, [(mtime, size, path)]) of cached files.
+        """
+        total = 0
+        files = []
+        for entry in os.scandir(self.path):
+            if not entry.is_dir():
+                continue
+            try:
+                children = list(os.scandir(entry.path))
+            except OSError:
+                continue
+            for i in children:
+                try:
+                    st = i.stat()
+                except OSError:
+                    continue
+                total += st.st_size
+                files.append((st.st_mtime, st.st_size, i.path))
+        return total, files
+
+    def _evict(self):
+        """
+        This is private function, to remove least recently used files until the cache is below 90% of max_size.
+        """
+        total, files = self._usage()
+        files.sort()
+        for mtime, size, path in files:
+            if total <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+            total -= size
+        self._size = total
@@ -0,0 +1,330 @@
+# -*-coding:utf8;-*-
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import socket
+import threading
+import time
+
+
+class Metrics:
+    """
+    Instrumentation interface, subclass it or use PrometheusMetrics or StatsdMetrics.
+    Metrics are disabled by default (bot.metrics is None), the hot paths then skip even the clock reads.
+    Reported metrics:
+        - api_request_seconds (method): Bot API round-trip, response body included, method is "download" for files.
+        - api_parse_seconds (method): json decoding of the response.
+        - api_errors_total (method, code): responses with ok false.
+        - api_retries_total (method): requests retried after 429.
+        - bytes_sent_total / bytes_received_total (method): request and response bodies, method is "download" for files.
+        - queue_depth (shard): pending updates of a poll(worker=N) shard.
+        - queue_wait_seconds: time between enqueue and dequeue of an update.
+        - handler_seconds (status): handler duration, status is "ok" or "error".
+        - session_seconds (op): session store get and set.
+    author: guangrei
+    """
+
+    def timing(self, name, seconds, **labels):
+        """
+        Use this method to record a duration.
+        Args:
+            - name (str): Metric name.
+            - seconds (float): Duration.
+            - **labels: Label values.
+        """
+
+    def count(self, name, value=1, **labels):
+        """
+        Use this method to increment a counter.
+        Args:
+            - name (str): Metric name.
+            - value (int, optional): Increment. Defaults to 1.
+            - **labels: Label values.
+        """
+
+    def gauge(self, name, value, **labels):
+        """
+        Use this method to set a gauge.
+        Args:
+            - name (str): Metric name.
+            - value (float): Current value.
+            - **labels: Label values.
+        """
+
+    def flush(self):
+        """
+        Use this method to send buffered metrics, it is called when a poll worker exits.
+        """
+
+
+class PrometheusMetrics(Metrics):
+    """
+    In-process collector rendered in the Prometheus text format, durations are histograms.
+    Values are per process: with poll(worker=N) every worker keeps its own, use StatsdMetrics to aggregate them.
+    author: guangrei
+    """
+
+    def __init__(
+        self,
+        prefix="telegram_",
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ):
+        """
+        Args:
+            - prefix (str, optional): Prefix of metric names. Defaults to "telegram_".
+            - buckets (tuple, optional): Upper bounds of histogram buckets in seconds. Defaults to 5ms to 10s.
+        """
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def timing(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            n = bisect_left(self.buckets, seconds)
+            if n < len(self.buckets):
+                histogram[0][n] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def _labels(labels, extra=()):
+        """
+        This is private function, to format labels.
+        """
+        labels = tuple(labels) + tuple(extra)
+        if not labels:
+            return ""
+        return "{%s}" % ",".join(
+            '%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+            for k, v in labels
+        )
+
+    def render(self):
+        """
+        Function to get every metric in the Prometheus text exposition format.
+        Returns:
+            - str: metrics.
+        """
+        lines = []
+        labels = PrometheusMetrics._labels
+        with self._lock:
+            for kind, table in (("counter", self._counters), ("gauge", self._gauges)):
+                typed = set()
+                for (name, key), value in sorted(table.items(), key=str):
+                    name = self.prefix + name
+                    if name not in typed:
+                        lines.append("# TYPE %s %s" % (name, kind))
+                        typed.add(name)
+                    lines.append("%s%s %s" % (name, labels(key), value))
+            typed = set()
+            for (name, key), (counts, total, n) in sorted(
+                self._histograms.items(), key=str
+            ):
+                name = self.prefix + name
+                if name not in typed:
+                    lines.append("# TYPE %s histogram" % name)
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(
+                        "%s_bucket%s %d"
+                        % (name, labels(key, (("le", repr(float(bound))),)), cumulative)
+                    )
+                lines.append(
+                    "%s_bucket%s %d" % (name, labels(key, (("le", "+Inf"),)), n)
+                )
+                lines.append("%s_sum%s %s" % (name, labels(key), total))
+                lines.append("%s_count%s %d" % (name, labels(key), n))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9090, host="0.0.0.0"):
+        """
+        Use this method to expose render() over http for Prometheus scraping, from a background thread.
+        Args:
+            - port (int, optional): Listen port. Defaults to 9090.
+            - host (str, optional): Listen address. Defaults to "0.0.0.0".
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+
+class StatsdMetrics(Metrics):
+    """
+    StatsD exporter, metrics are buffered and sent over UDP in packets of up to buffer_size bytes.
+    A background thread of every process sends the buffer every flush_interval seconds, so metrics of an idle bot are not held back.
+    Labels become DogStatsD tags, or name suffixes with tags=False.
+    It works across processes: every poll(worker=N) worker sends with its own socket.
+    author: guangrei
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=8125,
+        prefix="telegram.",
+        tags=True,
+        buffer_size=1400,
+        flush_interval=1.0,
+    ):
+        """
+        Args:
+            - host (str, optional): StatsD server. Defaults to "127.0.0.1".
+            - port (int, optional): StatsD port. Defaults to 8125.
+            - prefix (str, optional): Prefix of metric names. Defaults to "telegram.".
+            - tags (bool, optional): Send labels as DogStatsD tags (|#k:v), otherwise append their values to the name. Defaults to True.
+            - buffer_size (int, optional): Maximum packet size. Defaults to 1400.
+            - flush_interval (float, optional): Seconds a metric may wait in the buffer. Defaults to 1.0.
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        self.tags = tags
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._size = 0
+        self._flushed = time.monotonic()
+        self._socket = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        del state["_wakeup"]
+        state["_socket"] = None
+        state["_flusher"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def _send(self, name, value, kind, labels):
+        """
+        This is private function, to buffer one metric line.
+        """
+        name = self.prefix + name
+        if not labels:
+            line = "%s:%s|%s" % (name, value, kind)
+        elif self.tags:
+            line = "%s:%s|%s|#%s" % (
+                name,
+                value,
+                kind,
+                ",".join("%s:%s" % (k, v) for k, v in sorted(labels.items())),
+            )
+        else:
+            name += "".join("." + str(labels[k]) for k in sorted(labels))
+            line = "%s:%s|%s" % (name, value, kind)
+        with self._lock:
+            self._forked()
+            if self._size + len(line) + 1 > self.buffer_size:
+                self._flush()
+            self._buffer.append(line)
+            self._size += len(line) + 1
+            if time.monotonic() - self._flushed >= self.flush_interval:
+                self._flush()
+            elif self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        """
+        This is private function, background thread that sends buffered metrics.
+        """
+        wakeup = self._wakeup
+        while not wakeup.wait(self.flush_interval):
+            self.flush()
+
+    def timing(self, name, seconds, **labels):
+        self._send(name, "%.3f" % (seconds * 1000), "ms", labels)
+
+    def count(self, name, value=1, **labels):
+        self._send(name, value, "c", labels)
+
+    def gauge(self, name, value, **labels):
+        self._send(name, value, "g", labels)
+
+    def flush(self):
+        """
+        Use this method to send buffered metrics now, for example before shutdown.
+        """
+        with self._lock:
+            self._forked()
+            self._flush()
+
+    def close(self):
+        """
+        Use this method to send buffered metrics and stop the background thread.
+        """
+        self.flush()
+        with self._lock:
+            self._wakeup.set()
+            self._wakeup = threading.Event()
+            self._flusher = None
+
+    def _forked(self):
+        """
+        This is private function, a forked worker drops the buffer of the parent, the parent sends it.
+        Threads do not survive fork, the worker starts its own flusher.
+        """
+        if self._pid != os.getpid():
+            self._buffer = []
+            self._size = 0
+            self._socket = None
+            self._wakeup = threading.Event()
+            self._flusher = None
+            self._pid = os.getpid()
+
+    def _flush(self):
+        """
+        This is private function, to send the buffer.
+        """
+        self._flushed = time.monotonic()
+        if not self._buffer:
+            return
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        data = "\n".join(self._buffer).encode("utf-8")
+        self._buffer = []
+        self._size = 0
+        try:
+            self._socket.sendto(data, self.address)
+        except OSError:
+            pass
@@ -0,0 +1,192 @@
+# -*-coding:utf8;-*-
+from .util import util
+
+
+class Model:
+    """
+    Compact typed model built with __slots__, an opt-in alternative to objectify dicts.
+    Known fields are slots, unknown fields are kept in the extra dict so nothing is lost.
+    Missing known fields read as None, the key "from" is stored as "_from" like objectify.
+    Models also support the read-only dict protocol used by the SDK helpers (data["chat"], "photo" in data, data.get()).
+    author: guangrei
+    """
+
+    __slots__ = ("extra",)
+    _types = {}
+    _fields = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = frozenset(cls.__slots__)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Function to build a model from a json decoded dict.
+        Args:
+            - data (dict): telegram object.
+        Returns:
+            - Model: typed model.
+        """
+        self = cls.__new__(cls)
+        extra = {}
+        fields = cls._fields
+        types = cls._types
+        for key, value in data.items():
+            if key == "from":
+                key = "_from"
+            if key not in fields:
+                extra[key] = value
+                continue
+            model = types.get(key)
+            if model is not None and value is not None:
+                if type(model) is list:
+                    value = [model[0].from_dict(i) for i in value]
+                else:
+                    value = model.from_dict(value)
+            object.__setattr__(self, key, value)
+        self.extra = extra
+        return self
+
+    def __getattr__(self, key):
+        if key in type(self)._fields:
+            return None
+        if key[:2] == "__" or key == "extra":
+            raise AttributeError(key)
+        try:
+            value = self.extra[key]
+        except (KeyError, AttributeError):
+            raise AttributeError(key)
+        if type(value) is dict:
+            return util.parse_response(value)
+        return value
+
+    def _name(key):
+        """
+        This is private function, to map a json key to an attribute name.
+        """
+        return "_from" if key == "from" else key
+
+    def __getitem__(self, key):
+        value = getattr(self, Model._name(key))
+        if value is None and key not in self:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        key = Model._name(key)
+        if key in type(self)._fields:
+            return getattr(self, key) is not None
+        return key in self.extra
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def keys(self):
+        keys = [
+            "from" if i == "_from" else i
+            for i in self.__slots__
+            if getattr(self, i) is not None
+        ]
+        return keys + list(self.extra)
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        """
+        Function to convert the model back to a json serializable dict.
+        Returns:
+            - dict: telegram object.
+        """
+        ret = {}
+        for key, value in self.items():
+            if isinstance(value, Model):
+                value = value.to_dict()
+            elif type(value) is list:
+                value = [i.to_dict() if isinstance(i, Model) else i for i in value]
+            ret[key] = value
+        return ret
+
+    def __repr__(self):
+        return "%s(%s)" % (
+            type(self).__name__,
+            ", ".join("%s=%r" % i for i in self.items()),
+        )
+
+
+class User(Model):
+    __slots__ = (
+        "id",
+        "is_bot",
+        "first_name",
+        "last_name",
+        "username",
+        "language_code",
+    )
+
+
+class Chat(Model):
+    __slots__ = ("id", "type", "title", "username", "first_name", "last_name")
+
+
+class PhotoSize(Model):
+    __slots__ = ("file_id", "file_unique_id", "width", "height", "file_size")
+
+
+class Document(Model):
+    __slots__ = (
+        "file_id",
+        "file_unique_id",
+        "thumbnail",
+        "file_name",
+        "mime_type",
+        "file_size",
+    )
+    _types = {"thumbnail": PhotoSize}
+
+
+class Message(Model):
+    __slots__ = (
+        "message_id",
+        "_from",
+        "sender_chat",
+        "date",
+        "chat",
+        "text",
+        "caption",
+        "entities",
+        "photo",
+        "document",
+        "reply_to_message",
+        "edit_date",
+        "media_group_id",
+    )
+
+
+Message._types = {
+    "_from": User,
+    "sender_chat": Chat,
+    "chat": Chat,
+    "photo": [PhotoSize],
+    "document": Document,
+    "reply_to_message": Message,
+}
+
+
+class Update(Model):
+    __slots__ = (
+        "update_id",
+        "message",
+        "edited_message",
+        "channel_post",
+        "edited_channel_post",
+    )
+    _types = {
+        "message": Message,
+        "edited_message": Message,
+        "channel_post": Message,
+        "edited_channel_post": Message,
+    }
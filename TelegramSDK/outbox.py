@@ -0,0 +1,140 @@
+# -*-coding:utf8;-*-
+from concurrent.futures import Future
+from .ratelimit import RateLimiter
+from .util import util
+import atexit
+import logging
+import os
+import queue
+import threading
+
+
+class Outbox:
+    """
+    Non-blocking outbound queue: with bot.outbox set, send_message(), send_document(), send_chat_action()
+    and the reply helpers return a concurrent.futures.Future right away and background sender threads
+    perform the requests over the pooled transport, so handlers do not wait for Telegram.
+    Sends of the same chat are performed by the same thread in submission order.
+    A sendChatAction that is still queued is dropped when the same action is queued again
+    (the first future is returned) or when a newer action or message for that chat is queued,
+    its future then resolves to {"ok": true, "result": true} without a request.
+    Queued sends are drained when a poll worker exits and at interpreter exit.
+    author: guangrei
+    """
+
+    _local = threading.local()
+
+    def __init__(self, worker=4, queue_size=1000):
+        """
+        Args:
+            - worker (int, optional): Number of sender threads, use transport.configure(pool_maxsize=...) of at least this size. Defaults to 4.
+            - queue_size (int, optional): Maximum queued sends per sender thread, submitting blocks while it is full. Defaults to 1000.
+        """
+        self.worker = worker
+        self.queue_size = queue_size
+        self._queues = None
+        self._threads = []
+        self._actions = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def sending():
+        """
+        Function to know whether the caller runs in a sender thread, bot methods then send right away.
+        Returns:
+            - bool: True in a sender thread.
+        """
+        return getattr(Outbox._local, "sending", False)
+
+    def start(self):
+        """
+        Use this method to start the sender threads, it is called on the first send of every process.
+        """
+        with self._lock:
+            if self._queues is not None and self._pid == os.getpid():
+                return
+            # threads do not survive fork, a poll worker starts its own
+            self._queues = [queue.Queue(self.queue_size) for _ in range(self.worker)]
+            self._actions = {}
+            self._threads = [
+                threading.Thread(target=self._run, args=(q,), daemon=True)
+                for q in self._queues
+            ]
+            for thread in self._threads:
+                thread.start()
+            if self._pid is None:
+                atexit.register(self.stop)
+            self._pid = os.getpid()
+
+    def stop(self):
+        """
+        Use this method to wait until every queued send is performed and stop the sender threads.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            queues, self._queues = self._queues, None
+            threads, self._threads = self._threads, []
+        if queues is None:
+            return
+        for q in queues:
+            q.put(None)
+        for thread in threads:
+            thread.join()
+
+    def submit(self, chat_id, func, *args, coalesce=None, **kwargs):
+        """
+        Use this method to queue a send.
+        Args:
+            - chat_id (int or str): Target chat, sends of a chat keep their order.
+            - func (callable): Send function, called as func(*args, **kwargs) by a sender thread.
+            - coalesce (str, optional): Chat action of a sendChatAction, see the class description. Defaults to None.
+        Returns:
+            - Future: result of func.
+        """
+        if self._queues is None or self._pid != os.getpid():
+            self.start()
+        key = str(chat_id)
+        # [func, args, kwargs, future, chat key, coalesce], func is None once dropped
+        entry = [func, args, kwargs, Future(), key, coalesce]
+        with self._lock:
+            queued = self._actions.pop(key, None)
+            if queued is not None:
+                if coalesce is not None and queued[5] == coalesce:
+                    self._actions[key] = queued
+                    return queued[3]
+                queued[0] = None
+                if queued[3].set_running_or_notify_cancel():
+                    queued[3].set_result(
+                        util.parse_response({"ok": True, "result": True})
+                    )
+            if coalesce is not None:
+                self._actions[key] = entry
+            queues = self._queues
+        queues[hash(key) % len(queues)].put(entry)
+        return entry[3]
+
+    def _run(self, q):
+        """
+        This is private function, sender thread loop.
+        """
+        Outbox._local.sending = True
+        RateLimiter.per_chat(True)
+        while True:
+            entry = q.get()
+            if entry is None:
+                break
+            with self._lock:
+                if self._actions.get(entry[4]) is entry:
+                    del self._actions[entry[4]]
+                func = entry[0]
+            if func is None:
+                continue
+            future = entry[3]
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*entry[1], **entry[2]))
+            except BaseException as e:
+                logging.exception("outbox: send to %s failed!", entry[4])
+                future.set_exception(e)
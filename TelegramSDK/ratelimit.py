@@ -0,0 +1,168 @@
+# -*-coding:utf8;-*-
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Flood control aware token bucket limiter, global and per chat.
+    Buckets are kept as theoretical arrival times (GCRA), so a send reserves its slot
+    in O(1) and waits only as long as needed to stay below Telegram limits.
+    Default limits follow Telegram bot FAQ: 30 messages per second globally,
+    1 message per second per private chat and 20 messages per minute per group.
+    The per chat limit is only waited for by concurrent senders, see per_chat().
+    author: guangrei
+    """
+
+    _local = threading.local()
+
+    def __init__(
+        self,
+        global_rate=30,
+        chat_rate=1,
+        group_rate=20 / 60,
+        global_burst=30,
+        chat_burst=3,
+        max_chats=10000,
+    ):
+        """
+        Args:
+            - global_rate (float, optional): Messages per second for the whole bot. Defaults to 30.
+            - chat_rate (float, optional): Messages per second per private chat. Defaults to 1.
+            - group_rate (float, optional): Messages per second per group or channel (negative chat id). Defaults to 20/60.
+            - global_burst (int, optional): Messages allowed at once globally. Defaults to 30.
+            - chat_burst (int, optional): Messages allowed at once per chat. Defaults to 3.
+            - max_chats (int, optional): Idle chat buckets are dropped above this size. Defaults to 10000.
+        """
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.global_burst = global_burst
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self._global = 0.0
+        self._chats = {}
+        self._lock = threading.Lock()
+
+    def per_chat(enable=None):
+        """
+        Function to know or set whether sends of the calling thread wait for the per chat limit.
+        A handler of the poll loop waiting for its chat would hold back the updates of every other chat,
+        so only concurrent senders (broadcast() and outbox threads) enable it, other sends rely on 429 retry_after.
+        Args:
+            - enable (bool, optional): New value for the calling thread. Defaults to None (unchanged).
+        Returns:
+            - bool: previous value.
+        """
+        previous = getattr(RateLimiter._local, "per_chat", False)
+        if enable is not None:
+            RateLimiter._local.per_chat = enable
+        return previous
+
+    def _reserve(tat, rate, burst, at):
+        """
+        This is private function, GCRA step: returns (allowed time, new theoretical arrival time).
+        """
+        interval = 1.0 / rate
+        tat = max(tat, at)
+        allowed = max(at, tat - (burst - 1) * interval)
+        return allowed, max(tat, allowed) + interval
+
+    def _rate(self, chat_id):
+        """
+        This is private function, groups and channels have negative ids or @username.
+        """
+        if str(chat_id)[:1] in ("-", "@"):
+            return self.group_rate
+        return self.chat_rate
+
+    def reserve(self, chat_id=None):
+        """
+        Use this method to reserve a slot without blocking.
+        A chat slot must be waited for before the global slot is reserved,
+        otherwise a delayed chat would hold back sends to every other chat, see acquire().
+        Args:
+            - chat_id (int or str, optional): Target chat. Defaults to None (global slot).
+        Returns:
+            - float: seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if chat_id is None:
+                if not self.global_rate:
+                    return 0.0
+                at, self._global = RateLimiter._reserve(
+                    self._global, self.global_rate, self.global_burst, now
+                )
+                return at - now
+            rate = self._rate(chat_id)
+            if not rate:
+                return 0.0
+            if len(self._chats) >= self.max_chats:
+                self._chats = {k: v for k, v in self._chats.items() if v > now}
+            at, self._chats[chat_id] = RateLimiter._reserve(
+                self._chats.get(chat_id, 0.0), rate, self.chat_burst, now
+            )
+            return at - now
+
+    def acquire(self, chat_id=None):
+        """
+        Use this method to wait until a message to chat_id can be sent.
+        Args:
+            - chat_id (int or str, optional): Target chat. Defaults to None (global limit only).
+        """
+        if chat_id is not None:
+            wait = self.reserve(chat_id)
+            if wait > 0:
+                time.sleep(wait)
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def wait(self, chat_id=None):
+        """
+        Asyncio version of acquire().
+        Args:
+            - chat_id (int or str, optional): Target chat. Defaults to None (global limit only).
+        """
+        if chat_id is not None:
+            wait = self.reserve(chat_id)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds, chat_id=None):
+        """
+        Use this method to hold sends after a 429 response, following parameters.retry_after.
+        A limit with rate 0 is unlimited and cannot hold sends, the caller has to wait itself then.
+        Args:
+            - seconds (float): Seconds to wait.
+            - chat_id (int or str, optional): Chat that got the 429. Defaults to None (pause every send).
+        Returns:
+            - bool: False if the limit is disabled and nothing is held.
+        """
+        with self._lock:
+            until = time.monotonic() + seconds
+            rate = None if chat_id is None else self._rate(chat_id)
+            if rate:
+                until += (self.chat_burst - 1) / rate
+                self._chats[chat_id] = max(self._chats.get(chat_id, 0.0), until)
+            elif self.global_rate:
+                until += (self.global_burst - 1) / self.global_rate
+                self._global = max(self._global, until)
+            else:
+                return False
+            return True
+
+    def share(self, workers):
+        """
+        Use this method to split the global rate between processes that send for the same bot.
+        Args:
+            - workers (int): Number of processes.
+        """
+        if self.global_rate and workers > 1:
+            self.global_rate = self.global_rate / workers
+            self.global_burst = max(1, self.global_burst // workers)
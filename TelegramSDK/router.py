@@ -0,0 +1,154 @@
+# -*-coding:utf8;-*-
+import re
+
+
+class Router:
+    """
+    Dispatch table for handlers registered with decorators.
+    Commands are looked up in a dict, regexes are compiled once at registration
+    and the command, arguments and text of an update are parsed once and shared by every matcher.
+    Handlers are called with the Context of the update, the first matching handler wins:
+    commands, then regexes, then filters, then update type handlers, then the default handler.
+    author: guangrei
+    """
+
+    def __init__(self):
+        self._commands = {}
+        self._regexes = {}
+        self._filters = {}
+        self._types = {}
+        self._default = None
+
+    def _register(table, update_types, entry):
+        """
+        This is private function, to add entry to the list of every update type.
+        """
+        if isinstance(update_types, str):
+            update_types = (update_types,)
+        for i in update_types:
+            table.setdefault(i, []).append(entry)
+
+    def command(self, *names, update_types=("message",)):
+        """
+        Decorator to register a command handler.
+        Args:
+            - *names (str): Commands with or without "/", for example "start" or "/help".
+            - update_types (tuple, optional): Update types the command is accepted in. Defaults to ("message",).
+        """
+
+        def decorator(handler):
+            for update_type in (
+                (update_types,) if isinstance(update_types, str) else update_types
+            ):
+                table = self._commands.setdefault(update_type, {})
+                for name in names:
+                    table["/" + name.lstrip("/")] = handler
+            return handler
+
+        return decorator
+
+    def regex(self, pattern, flags=0, update_types=("message",)):
+        """
+        Decorator to register a handler for texts matching pattern, the match is set on ctx.match.
+        Args:
+            - pattern (str): Regular expression, searched in the text or caption.
+            - flags (int, optional): re flags. Defaults to 0.
+            - update_types (tuple, optional): Update types to match. Defaults to ("message",).
+        """
+
+        def decorator(handler):
+            Router._register(
+                self._regexes, update_types, (re.compile(pattern, flags), handler)
+            )
+            return handler
+
+        return decorator
+
+    def filter(self, func, update_types=("message",)):
+        """
+        Decorator to register a handler for updates accepted by func.
+        Args:
+            - func (callable): func(ctx) returns True to handle the update.
+            - update_types (tuple, optional): Update types to match. Defaults to ("message",).
+        """
+
+        def decorator(handler):
+            Router._register(self._filters, update_types, (func, handler))
+            return handler
+
+        return decorator
+
+    def on(self, *update_types):
+        """
+        Decorator to register a handler for every update of the given types, for example "callback_query".
+        Args:
+            - *update_types (str): Update types.
+        """
+
+        def decorator(handler):
+            Router._register(self._types, update_types, handler)
+            return handler
+
+        return decorator
+
+    def default(self, handler):
+        """
+        Decorator to register the handler of updates no other handler matched.
+        """
+        self._default = handler
+        return handler
+
+    def update_types(self):
+        """
+        Function to get the update types handlers are registered for, to use as allowed_updates.
+        Returns:
+            - list: update types.
+        """
+        types = set(self._commands) | set(self._regexes)
+        types |= set(self._filters) | set(self._types)
+        if self._default is not None:
+            types.add("message")
+        return sorted(types)
+
+    def match(self, ctx):
+        """
+        Function to find the handler of an update.
+        Args:
+            - ctx (Context): context of the update.
+        Returns:
+            - callable: handler.
+            - None: if no handler matched.
+        """
+        update_type = ctx.update_type
+        if ctx.command is not None:
+            handler = self._commands.get(update_type, {}).get(ctx.command)
+            if handler is not None:
+                return handler
+        text = ctx.text
+        if text is not None:
+            for pattern, handler in self._regexes.get(update_type, ()):
+                match = pattern.search(text)
+                if match is not None:
+                    ctx.match = match
+                    return handler
+        for func, handler in self._filters.get(update_type, ()):
+            if func(ctx):
+                return handler
+        handlers = self._types.get(update_type)
+        if handlers:
+            return handlers[0]
+        return self._default
+
+    def dispatch(self, ctx):
+        """
+        Use this method to call the handler of an update.
+        Args:
+            - ctx (Context): context of the update.
+        Returns:
+            - bool: True if a handler was called.
+        """
+        handler = self.match(ctx)
+        if handler is None:
+            return False
+        handler(ctx)
+        return True
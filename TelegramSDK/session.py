@@ -0,0 +1,566 @@
+# -*-coding:utf8;-*-
+from collections import OrderedDict
+from urllib.parse import urlparse
+from zcache import Cache
+from .util import util
+import atexit
+import heapq
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+
+
+class SessionStore:
+    """
+    Session backend interface used by set_session() and get_session().
+    Keys are "<user id>:<chat id>" strings and values are json serializable objects.
+    author: guangrei
+    """
+
+    def get(self, key, default=None):
+        """
+        Use this method to read a session.
+        Args:
+            - key (str): Session key.
+            - default (Any, optional): Returned when the session does not exist or expired. Defaults to None.
+        Returns:
+            - Any: session value.
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=0):
+        """
+        Use this method to write a session.
+        Args:
+            - key (str): Session key.
+            - value (Any): Json serialize able object (str, int, dict, bool etc).
+            - ttl (int, optional): Limit time to life in seconds. Defaults to 0 (no limit).
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """
+        Use this method to delete a session.
+        Args:
+            - key (str): Session key.
+        """
+        raise NotImplementedError
+
+    def get_many(self, keys, default=None):
+        """
+        Use this method to read several sessions, network backends do it in one round-trip.
+        Args:
+            - keys (list): Session keys.
+            - default (Any, optional): Value of missing sessions. Defaults to None.
+        Returns:
+            - list: session values in the order of keys.
+        """
+        return [self.get(key, default) for key in keys]
+
+    def flush(self):
+        """
+        Use this method to write buffered changes, backends without write buffer do nothing.
+        """
+
+    def close(self):
+        """
+        Use this method to flush and release the backend.
+        """
+        self.flush()
+
+
+class ZcacheSession(SessionStore):
+    """
+    Legacy zcache backend, it keeps the database.json layout of older releases
+    (one record per user id with a "session_<chat id>" field) and one long-lived Cache per file.
+    author: guangrei
+    """
+
+    _shared = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path="database.json", cache=None):
+        """
+        Args:
+            - path (str, optional): Zcache database path. Defaults to database.json.
+            - cache (zcache.Cache, optional): Existing Cache object, for example telegram.cacheobject. Defaults to None.
+        """
+        self.cache = Cache(path=path) if cache is None else cache
+
+    def shared(path="database.json", cache=None):
+        """
+        Function to get the ZcacheSession of a database path or Cache object, it is created once per process.
+        Args:
+            - path (str, optional): Zcache database path. Defaults to database.json.
+            - cache (zcache.Cache, optional): Existing Cache object. Defaults to None.
+        Returns:
+            - ZcacheSession: session store.
+        """
+        with ZcacheSession._lock:
+            if cache is None:
+                key = (os.getpid(), os.path.abspath(path))
+            else:
+                key = (os.getpid(), id(cache))
+            store = ZcacheSession._shared.get(key)
+            if store is None:
+                store = ZcacheSession._shared[key] = ZcacheSession(path, cache)
+            return store
+
+    def _split(key):
+        """
+        This is private function, maps "<user id>:<chat id>" to the legacy record and field.
+        """
+        user_id, chat_id = key.split(":", 1)
+        return user_id, "session_" + chat_id
+
+    def get(self, key, default=None):
+        user_id, field = ZcacheSession._split(key)
+        if not self.cache.has(user_id):
+            return default
+        return self.cache.get(user_id).get(field, default)
+
+    def set(self, key, value, ttl=0):
+        user_id, field = ZcacheSession._split(key)
+        if self.cache.has(user_id):
+            data = self.cache.get(user_id)
+        else:
+            data = {"id": int(user_id) if user_id.lstrip("-").isdigit() else user_id}
+        data[field] = value
+        self.cache.set(user_id, data, ttl=ttl)
+
+    def delete(self, key):
+        user_id, field = ZcacheSession._split(key)
+        if self.cache.has(user_id):
+            data = self.cache.get(user_id)
+            if data.pop(field, None) is not None:
+                self.cache.set(user_id, data)
+
+
+class SQLiteSession(SessionStore):
+    """
+    Process safe session backend on SQLite in WAL mode, one key per row.
+    Writes are buffered and committed in one transaction every flush_interval seconds or batch_size changes,
+    reads can be served from an in-memory LRU cache of cache_size sessions,
+    and expired rows are purged through an index on the expiry time.
+    Other processes see a write once it is flushed and the read cache never sees them,
+    so with poll(worker=N) use shard=True, which handles every chat in one worker.
+    author: guangrei
+    """
+
+    def __init__(
+        self,
+        path="session.db",
+        cache_size=0,
+        flush_interval=0.5,
+        batch_size=500,
+        purge_interval=60,
+        timeout=30,
+    ):
+        """
+        Args:
+            - path (str, optional): SQLite database path. Defaults to session.db.
+            - cache_size (int, optional): Sessions kept in the read cache, only safe when one process writes a session, see the class description. Defaults to 0 (always read from the database).
+            - flush_interval (float, optional): Seconds buffered writes may wait, set 0 to write through. Defaults to 0.5.
+            - batch_size (int, optional): Buffered writes that trigger an immediate flush. Defaults to 500.
+            - purge_interval (int, optional): Seconds between deletes of expired rows. Defaults to 60.
+            - timeout (int, optional): Seconds to wait for the database lock held by other processes. Defaults to 30.
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.purge_interval = purge_interval
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._pid = None
+        atexit.register(self.close)
+
+    def _reset(self):
+        """
+        This is private function, per process state, connections and threads do not survive fork.
+        """
+        self._pid = os.getpid()
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._purged = 0.0
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._db = sqlite3.connect(
+            self.path, timeout=self.timeout, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires) "
+            "WHERE expires > 0"
+        )
+        self._db.commit()
+
+    def _state(self):
+        """
+        This is private function, to open the database on first use in every process.
+        """
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _remember(self, key, value, expires):
+        """
+        This is private function, to put a json value in the read cache.
+        """
+        if not self.cache_size:
+            return
+        self._cache[key] = (value, expires)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            self._state()
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._cache.get(key)
+                if entry is not None:
+                    self._cache.move_to_end(key)
+            if entry is None:
+                row = self._db.execute(
+                    "SELECT value, expires FROM sessions WHERE key = ?", (key,)
+                ).fetchone()
+                entry = (None, 0.0) if row is None else row
+                self._remember(key, *entry)
+        value, expires = entry
+        if value is None or (expires and expires <= now):
+            return default
+        return util.loads(value)
+
+    def set(self, key, value, ttl=0):
+        expires = time.time() + ttl if ttl else 0.0
+        self._write(key, json.dumps(value), expires)
+
+    def delete(self, key):
+        self._write(key, None, 0.0)
+
+    def _write(self, key, value, expires):
+        """
+        This is private function, to buffer one change, value None deletes the key.
+        """
+        with self._lock:
+            self._state()
+            self._pending[key] = (value, expires)
+            self._remember(key, value, expires)
+            if not self.flush_interval or len(self._pending) >= self.batch_size:
+                self.flush()
+            elif self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        """
+        This is private function, background thread that flushes buffered writes.
+        """
+        while not self._wakeup.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            pending, self._pending = self._pending, {}
+            now = time.time()
+            purge = now - self._purged >= self.purge_interval
+            if not pending and not purge:
+                return
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO sessions (key, value, expires) VALUES (?, ?, ?)",
+                    [(k, v, e) for k, (v, e) in pending.items() if v is not None],
+                )
+                self._db.executemany(
+                    "DELETE FROM sessions WHERE key = ?",
+                    [(k,) for k, (v, e) in pending.items() if v is None],
+                )
+                if purge:
+                    self._purged = now
+                    self._db.execute(
+                        "DELETE FROM sessions WHERE expires > 0 AND expires <= ?",
+                        (now,),
+                    )
+
+    def close(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self.flush()
+            self._wakeup.set()
+            self._db.close()
+            self._pid = None
+
+
+class MemorySession(SessionStore):
+    """
+    In-memory LRU session backend with TTL, for tests and single process bots.
+    Sessions are lost when the process exits and are not shared between workers.
+    author: guangrei
+    """
+
+    def __init__(self, max_entries=10000):
+        """
+        Args:
+            - max_entries (int, optional): Least recently used sessions are evicted above this size. Defaults to 10000.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._expiry = []
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        """
+        This is private function, to drop expired sessions through the expiry heap.
+        """
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, key = heapq.heappop(self._expiry)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == expires:
+                del self._entries[key]
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._purge(time.time())
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+        return util.loads(entry[0])
+
+    def set(self, key, value, ttl=0):
+        value = json.dumps(value)
+        with self._lock:
+            now = time.time()
+            self._purge(now)
+            expires = now + ttl if ttl else 0.0
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            if expires:
+                heapq.heappush(self._expiry, (expires, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if len(self._expiry) > 2 * self.max_entries:
+                self._expiry = [i for i in self._expiry if i[1] in self._entries]
+                heapq.heapify(self._expiry)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisSession(SessionStore):
+    """
+    Shared session backend for any server that speaks the Redis protocol (RESP),
+    so several poller or webhook nodes can serve the same users.
+    Connections are pooled and kept alive, several commands are pipelined in one round-trip
+    and TTL is delegated to the server. No redis client package is required.
+    author: guangrei
+    """
+
+    def __init__(
+        self,
+        url="redis://127.0.0.1:6379/0",
+        prefix="telegram:session:",
+        pool_size=8,
+        timeout=5,
+    ):
+        """
+        Args:
+            - url (str, optional): Server url, redis://[:password@]host[:port][/db]. Defaults to redis://127.0.0.1:6379/0.
+            - prefix (str, optional): Prefix of every session key. Defaults to telegram:session:.
+            - pool_size (int, optional): Maximum number of open connections per process. Defaults to 8.
+            - timeout (int, optional): Socket timeout in seconds. Defaults to 5.
+        """
+        url = urlparse(url)
+        self.host = url.hostname or "127.0.0.1"
+        self.port = url.port or 6379
+        self.db = int(url.path.strip("/") or 0)
+        self.password = url.password
+        self.prefix = prefix
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _connect(self):
+        """
+        This is private function, to open and authenticate one connection.
+        """
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile("rb"))
+        commands = []
+        if self.password:
+            commands.append(("AUTH", self.password))
+        if self.db:
+            commands.append(("SELECT", self.db))
+        if commands:
+            try:
+                RedisSession._call(conn, commands)
+            except BaseException:
+                sock.close()
+                raise
+        return conn
+
+    def _encode(command):
+        """
+        This is private function, to encode one command as a RESP array of bulk strings.
+        """
+        out = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read(f):
+        """
+        This is private function, to read one RESP reply, error replies are returned as ValueError.
+        """
+        line = f.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by redis server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode("utf-8")
+        if kind == b"-":
+            return ValueError(body.decode("utf-8"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            if size < 0:
+                return None
+            data = f.read(size + 2)
+            if len(data) != size + 2:
+                raise ConnectionError("connection closed by redis server")
+            return data[:-2]
+        if kind == b"*":
+            size = int(body)
+            if size < 0:
+                return None
+            return [RedisSession._read(f) for _ in range(size)]
+        raise ConnectionError("invalid redis reply: %r" % line)
+
+    def _call(conn, commands):
+        """
+        This is private function, to send commands in one write and read every reply.
+        """
+        sock, f = conn
+        sock.sendall(b"".join(RedisSession._encode(i) for i in commands))
+        replies = [RedisSession._read(f) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, ValueError):
+                raise reply
+        return replies
+
+    def _acquire(self):
+        """
+        This is private function, returns (connection, reused) from the pool of this process.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pool = queue.LifoQueue()
+                self._size = 0
+            try:
+                return self._pool.get_nowait(), True
+            except queue.Empty:
+                pass
+            if self._size < self.pool_size:
+                self._size += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect(), False
+            except BaseException:
+                with self._lock:
+                    self._size -= 1
+                raise
+        return self._pool.get(timeout=self.timeout), True
+
+    def _discard(self, conn):
+        """
+        This is private function, to close a broken connection and free its pool slot.
+        """
+        for i in reversed(conn):
+            try:
+                i.close()
+            except OSError:
+                pass
+        with self._lock:
+            self._size -= 1
+
+    def execute(self, *commands):
+        """
+        Use this method to run Redis commands pipelined over one pooled connection.
+        A pooled connection closed by the server is replaced and the commands are sent again once.
+        Args:
+            - *commands (tuple): Commands, for example ("GET", key), ("SET", key, value, "EX", 60).
+        Returns:
+            - list: replies in the order of commands.
+        """
+        while True:
+            conn, reused = self._acquire()
+            try:
+                replies = RedisSession._call(conn, commands)
+            except ValueError:
+                self._pool.put(conn)
+                raise
+            except (OSError, ConnectionError):
+                self._discard(conn)
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                self._discard(conn)
+                raise
+            self._pool.put(conn)
+            return replies
+
+    def get(self, key, default=None):
+        return self.get_many([key], default)[0]
+
+    def get_many(self, keys, default=None):
+        if not keys:
+            return []
+        values = self.execute(("MGET",) + tuple(self.prefix + i for i in keys))[0]
+        return [default if i is None else util.loads(i) for i in values]
+
+    def set(self, key, value, ttl=0):
+        command = ("SET", self.prefix + key, json.dumps(value))
+        if ttl:
+            command += ("PX", int(ttl * 1000))
+        self.execute(command)
+
+    def delete(self, key):
+        self.execute(("DEL", self.prefix + key))
+
+    def close(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            pool, self._pid = self._pool, None
+        while True:
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                break
+            for i in reversed(conn):
+                i.close()
@@ -1,12 +1,19 @@
 # -*-coding:utf8;-*-
-from zcache import Cache
+from concurrent.futures import Future
 from .TelegramSDK import TelegramSDK
+from .checkpoint import Checkpoint
+from .context import Context
+from .models import Model, Update
+from .ratelimit import RateLimiter
+from .router import Router
 from .util import util
 import time
 import os
-import requests
+import signal
+import threading
 import logging
-import json
+import queue
+import requests
 
 
 logging.basicConfig(format="%(asctime)s - %(message)s", datefmt="%d-%b-%y %H:%M:%S")
@@ -19,16 +26,77 @@ class telegram(TelegramSDK):
     author: guangrei.
     """
     cacheobject = None
+    session_store = None
+    router = Router()
+    _polling = False
+    _depth = None
 
     def update(data):
         """
-        Function to update TelegramSDK.data
+        Function to update TelegramSDK.data and the context of the current thread or asyncio task.
+        Args:
+            - data (str, dict or Update): data telegram webhook json, typed models are used as is.
+        Returns:
+            - Context: per-update context, safe to use when updates are handled concurrently.
+        """
+        if type(data) in (str, bytes):
+            data = util.loads(data)
+        if isinstance(data, Model):
+            TelegramSDK.data = data
+        else:
+            TelegramSDK.data = util.parse_response(data)
+        return Context(TelegramSDK.data, telegram).activate()
+
+    def context():
+        """
+        Use this method to get the context of the update handled by the current thread or asyncio task.
+        Returns:
+            - Context: per-update context, it falls back to TelegramSDK.data when telegram.update() was not called in this thread.
+        """
+        ctx = Context.current()
+        if ctx is None:
+            return Context(TelegramSDK.data, telegram)
+        return ctx
+
+    def command(*names, **kwargs):
+        """
+        Decorator to register a command handler on telegram.router, see Router.command().
+        """
+        return telegram.router.command(*names, **kwargs)
+
+    def regex(pattern, flags=0, **kwargs):
+        """
+        Decorator to register a regex handler on telegram.router, see Router.regex().
+        """
+        return telegram.router.regex(pattern, flags, **kwargs)
+
+    def filter(func, **kwargs):
+        """
+        Decorator to register a filter handler on telegram.router, see Router.filter().
+        """
+        return telegram.router.filter(func, **kwargs)
+
+    def on(*update_types):
+        """
+        Decorator to register an update type handler on telegram.router, see Router.on().
+        """
+        return telegram.router.on(*update_types)
+
+    def default(handler):
+        """
+        Decorator to register the fallback handler on telegram.router, see Router.default().
+        """
+        return telegram.router.default(handler)
+
+    def dispatch(data):
+        """
+        Use this method to handle an update with the handlers of telegram.router, it is the default poll() callback.
         Args:
-            - data (str or dict): data telegram webhook json.
+            - data (str, dict or Update): telegram update.
+        Returns:
+            - bool: True if a handler was called.
         """
-        if type(data) == str:
-            data = json.loads(data)
-        TelegramSDK.data = util.parse_response(data)
+        return telegram.router.dispatch(telegram.update(data))
 
     def set_token(token):
         """
@@ -38,166 +106,733 @@ class telegram(TelegramSDK):
         """
         TelegramSDK.token = token
 
+    def set_api_url(url):
+        """
+        Use this method to send requests to another Bot API server, for example a local telegram-bot-api server
+        or testing.FakeBotAPI, the TELEGRAM_API_URL environment variable takes precedence.
+        Args:
+            - url (str): Bot API server url. Default is https://api.telegram.org.
+        """
+        TelegramSDK.api_url = url
+
     def disable_ssl():
         """
         Use this method to disable ssl verification.
         """
         TelegramSDK.ssl_verify = False
 
-    def download_file(path, max_size=0, filter=()):
+    def set_rate_limiter(limiter):
+        """
+        Use this method to replace the flood control limiter every send goes through.
+        Args:
+            - limiter (RateLimiter or None): New limiter, set None to disable rate limiting.
+        """
+        TelegramSDK.rate_limiter = limiter
+
+    def set_metrics(metrics):
+        """
+        Use this method to instrument API calls, the poll pipeline, handlers and sessions.
+        Args:
+            - metrics (Metrics or None): For example metrics.PrometheusMetrics() or metrics.StatsdMetrics(), set None to disable.
+        """
+        TelegramSDK.metrics = metrics
+
+    def set_upload_cache(cache):
+        """
+        Use this method to reuse file_id of files already uploaded by send_document() and reply_file().
+        Args:
+            - cache (UploadCache or None): Upload cache, set None to always upload.
+        """
+        TelegramSDK.upload_cache = cache
+
+    def set_outbox(outbox):
+        """
+        Use this method to send in the background, send methods and reply helpers then return a
+        concurrent.futures.Future right away instead of waiting for Telegram.
+        Args:
+            - outbox (Outbox or None): For example outbox.Outbox(worker=4), set None to send synchronously.
+        """
+        TelegramSDK.outbox = outbox
+
+    def set_file_info_cache(cache):
+        """
+        Use this method to replace the cache of getFile results used by download_file().
+        Args:
+            - cache (FileInfoCache or None): For example file_cache.FileInfoCache(ttl=600), set None to call getFile every time.
+        """
+        TelegramSDK.file_info_cache = cache
+
+    def set_download_cache(cache):
+        """
+        Use this method to keep downloaded files in a local cache keyed by file_unique_id,
+        download_file() then copies repeat files from disk without any request.
+        Args:
+            - cache (DownloadCache or None): For example file_cache.DownloadCache("download_cache"), set None to disable.
+        """
+        TelegramSDK.download_cache = cache
+
+    def set_session_store(store):
+        """
+        Use this method to replace the zcache database.json session backend.
+        Args:
+            - store (SessionStore or None): Session backend, for example session.SQLiteSession(), set None to use zcache.
+        """
+        telegram.session_store = store
+
+    def download_file(
+        path, max_size=0, filter=(), concurrency=4, photo="largest", thumbnails=False
+    ):
         """
         Use this method to auto download file.
         Args:
             - path (str): Directory for downloaded files.
             - max_fize (int, optional): Limit file size to be downloaded. Default to 0 (no limit).
             - filter (list or tuple): Filter file extension to be downloaded. Default to ()
+            - concurrency (int, optional): Number of parallel downloads. Default to 4.
+            - photo (str or int, optional): Photo size policy, "largest", "smallest", "all" or minimum pixels on the longest side. Default to "largest".
+            - thumbnails (bool, optional): Also download thumbnails of documents, videos etc. Default to False.
         Returns:
             - list: List of path downloaded files.
         """
-        result = util.find(telegram.data, "file_id")
-        output = []
-        for file_id in result:
-            p = telegram.get_file(file_id)
-            file_name = os.path.basename(p.result.file_path)
-            file_ext = os.path.splitext(file_name)[1]
-            if max_size > 0 and p.result.file_size > max_size:
-                continue
-            if len(filter) and file_ext.lower() not in filter:
-                continue
-            api = (
-                "https://api.telegram.org/file/bot"
-                + telegram.token
-                + "/"
-                + p.result.file_path
-            )
-            r = requests.get(api, verify=telegram.ssl_verify)
-            save = util.uniq_file(path, file_name)
-            util.save_file(r.content, save)
-            output.append(save)
-        if TelegramSDK.method == "poll" and TelegramSDK.worker == 1:
-            telegram.get_updates(offset=telegram.data.update_id + 1, limit=1)
-        return output
+        return telegram.context().download_file(
+            path,
+            max_size=max_size,
+            filter=filter,
+            concurrency=concurrency,
+            photo=photo,
+            thumbnails=thumbnails,
+        )
 
     def reply_message(*args, **kwargs):
         """
         Use this method to quick reply with text message.
         """
-        kwargs["chat_id"] = telegram.data.message.chat.id
-        kwargs["reply_to_message_id"] = telegram.data.message.message_id
-        ret = telegram.send_message(*args, **kwargs)
-        if TelegramSDK.method == "poll" and TelegramSDK.worker == 1:
-            telegram.get_updates(
-                offset=telegram.data.update_id + 1, limit=1
-            )  # remove from queue
-        return ret
+        return telegram.context().reply_message(*args, **kwargs)
 
     def reply_file(path, **kwargs):
         """
         Use this method to quick reply with file.
         """
-        kwargs["chat_id"] = telegram.data.message.chat.id
-        kwargs["document"] = path
-        kwargs["reply_to_message_id"] = telegram.data.message.message_id
-        ret = telegram.send_document(**kwargs)
-        if TelegramSDK.method == "poll" and TelegramSDK.worker == 1:
-            telegram.get_updates(
-                offset=telegram.data.update_id + 1, limit=1
-            )  # remove from queue
-        return ret
+        return telegram.context().reply_file(path, **kwargs)
+
+    def broadcast(
+        chat_ids, text=None, document=None, concurrency=8, checkpoint=None, **kwargs
+    ):
+        """
+        Use this method to send the same message or document to many chats.
+        Sends run concurrently over the pooled transport within TelegramSDK.rate_limiter,
+        a local document is uploaded once and its file_id is reused for the other chats.
+        Args:
+            - chat_ids (iterable): Target chat ids, it is consumed lazily.
+            - text (str, optional): Message text, or document caption when document is set. Defaults to None.
+            - document (str, optional): Path or file_id of a document. Defaults to None.
+            - concurrency (int, optional): Number of concurrent sends. Defaults to 8.
+            - checkpoint (str, optional): File that records finished chat ids, chats found in it are skipped so a crashed broadcast can be resumed. Defaults to None.
+            - **kwargs: Extra send_message() or send_document() keyword arguments.
+        Yields:
+            - tuple: (chat_id, result) in completion order, result is the response dict or the raised exception.
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+        def send(chat_id, document):
+            previous = RateLimiter.per_chat(True)
+            try:
+                if document is not None:
+                    ret = telegram.send_document(
+                        chat_id, document, caption=text, **kwargs
+                    )
+                else:
+                    ret = telegram.send_message(text, chat_id, **kwargs)
+            finally:
+                RateLimiter.per_chat(previous)
+            # with an outbox the send is queued, the broadcast still needs its result
+            return ret.result() if isinstance(ret, Future) else ret
+
+        done = set()
+        if checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                done = set(line.strip() for line in f)
+        pending = (i for i in chat_ids if str(i) not in done)
+        log = open(checkpoint, "a") if checkpoint is not None else None
+
+        def finish(chat_id, result):
+            if log is not None and not isinstance(result, BaseException):
+                if result.get("error_code") != 429:
+                    log.write(str(chat_id) + "\n")
+                    log.flush()
+            return chat_id, result
+
+        try:
+            if document is not None and os.path.isfile(document):
+                for chat_id in pending:
+                    try:
+                        ret = send(chat_id, document)
+                    except Exception as e:
+                        ret = e
+                    yield finish(chat_id, ret)
+                    if not isinstance(ret, BaseException) and ret["ok"]:
+                        document = util.sent_file_id(ret.result) or document
+                        break
+            futures = {}
+
+            def drain(limit):
+                while len(futures) > limit:
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        exc = future.exception()
+                        ret = future.result() if exc is None else exc
+                        yield finish(futures.pop(future), ret)
+
+            with ThreadPoolExecutor(concurrency) as executor:
+                for chat_id in pending:
+                    yield from drain(concurrency * 2 - 1)
+                    futures[executor.submit(send, chat_id, document)] = chat_id
+                yield from drain(0)
+        finally:
+            if log is not None:
+                log.close()
+
+    def _updates(
+        interval=1, timeout=30, debug=False, allowed_updates=None, offset=None
+    ):
+        """
+        This is private function, generator that yields batches of updates.
+        The poller owns the offset: every request passes max(update_id) + 1 and so confirms
+        the whole previous batch at once, handlers never have to acknowledge updates themselves.
+        With timeout > 0 Telegram holds the request open until updates arrive (long polling)
+        and the next batch is fetched right away, otherwise it sleeps interval seconds between requests.
+        Error responses are retried with exponential backoff up to 60 seconds, except 401 and 409 which raise ValueError.
+        """
+        backoff = 1
+        while True:
+            telegram._polling = True
+            try:
+                data = telegram.get_updates(
+                    offset=offset, timeout=timeout, allowed_updates=allowed_updates
+                )
+            except requests.exceptions.Timeout:
+                if debug:
+                    logging.warning("get_updates: client timeout, polling again.")
+                continue
+            except requests.exceptions.ConnectionError as e:
+                logging.warning("get_updates: %s, retrying in 1 second.", str(e))
+                time.sleep(1)
+                continue
+            finally:
+                telegram._polling = False
+            if data.get("error_code") == 429:
+                time.sleep(data.get("parameters", {}).get("retry_after", 1))
+                continue
+            if not data["ok"]:
+                # a revoked token or another getUpdates consumer will not recover
+                if data.get("error_code") in (401, 409):
+                    raise ValueError(data)
+                logging.warning(
+                    "get_updates: %s, retrying in %d seconds.",
+                    data.get("description", data.get("error_code")),
+                    backoff,
+                )
+                telegram._polling = True
+                try:
+                    time.sleep(backoff)
+                finally:
+                    telegram._polling = False
+                backoff = min(backoff * 2, 60)
+                continue
+            backoff = 1
+            if data["result"]:
+                offset = max(i["update_id"] for i in data["result"]) + 1
+            yield data["result"]
+            if not timeout and interval:
+                time.sleep(interval)
+
+    def _stop_handler(stop):
+        """
+        This is private function, signal handler that asks the poll loop to stop.
+        While the loop is idle in a long poll the request is interrupted right away,
+        that is safe because the pending request has not returned any update yet.
+        """
+
+        def handler(signum, frame):
+            stop.set()
+            if telegram._polling:
+                raise KeyboardInterrupt
+
+        return handler
+
+    def _signals(handler):
+        """
+        This is private function, to install handler for SIGINT and SIGTERM.
+        Returns previous handlers, signals can only be installed from the main thread.
+        """
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                previous[sig] = signal.signal(sig, handler)
+        return previous
+
+    def _confirm(offset):
+        """
+        This is private function, to confirm handled updates before shutdown so they are not delivered again.
+        """
+        try:
+            telegram.get_updates(offset=offset, limit=1)
+        except Exception as e:
+            logging.error("confirm offset %d failed: %s", offset, str(e))
 
-    def _feeder(interval, queue, debug):
+    def _feeder(
+        interval,
+        queues,
+        debug,
+        timeout=30,
+        worker=1,
+        depth=None,
+        hot_threshold=0,
+        allowed_updates=("message",),
+        checkpoint=None,
+        done=None,
+        finished=None,
+    ):
         """
         This is private function, to be used as feeder in multiprocessing poll.
+        queue.put() blocks while the bounded queue is full, so fetching pauses until workers catch up.
+        With one queue per worker every update goes to queues[chat_id % len(queues)],
+        so updates of the same chat are always handled in order by the same worker.
+        On SIGTERM it stops fetching, confirms what was enqueued and sends one stop sentinel per worker.
+        With a checkpoint, fetched updates are journaled before they are confirmed, workers acknowledge
+        handled updates on the done queue and pending updates of a previous run are enqueued first.
         """
+        stop = threading.Event()
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, telegram._stop_handler(stop))
         if debug:
             logging.warning("feeder started!")
+        shards = len(queues)
+        last = None
+        acker = None
+        metrics = TelegramSDK.metrics
+
+        def enqueue(i):
+            shard = 0
+            if shards > 1:
+                chat_id = util.get_chat_id(i)
+                if not isinstance(chat_id, int):
+                    chat_id = i["update_id"]
+                shard = chat_id % shards
+            if depth is not None:
+                with depth.get_lock():
+                    depth[shard] += 1
+                    pending = depth[shard]
+                if metrics is not None:
+                    metrics.gauge("queue_depth", pending, shard=shard)
+                if hot_threshold and pending == hot_threshold:
+                    logging.warning(
+                        "feeder: shard %d is hot, %d pending updates (last chat %s).",
+                        shard,
+                        pending,
+                        util.get_chat_id(i),
+                    )
+            if debug:
+                logging.warning(
+                    "feeder: enqueue %d to shard %d.", i["update_id"], shard
+                )
+            if metrics is not None:
+                # the enqueue time travels with the update for the queue wait of the worker
+                i = (time.time(), i)
+            queues[shard].put(i)
+
         try:
-            while True:
-                data = telegram.get_updates()
-                if data["ok"]:
-                    for i in data["result"]:
-                        if "message" in i:
-                            if debug:
-                                logging.warning("feeder: enqueue %d.", i["update_id"])
-                            queue.put_nowait(i)
-                            telegram.get_updates(offset=i["update_id"] + 1, limit=1)
-                else:
-                    raise ValueError(data)
-                if interval:
-                    time.sleep(interval)
-        except BaseException as e:
-            logging.error(str(e))
-            exit(1)
+            offset = None
+            if checkpoint is not None:
+                acker = threading.Thread(
+                    target=telegram._acker,
+                    args=(checkpoint, done, worker, finished),
+                    daemon=True,
+                )
+                acker.start()
+                offset = checkpoint.offset
+                for i in checkpoint.pending():
+                    enqueue(i)
+            for updates in telegram._updates(
+                interval, timeout, debug, allowed_updates, offset
+            ):
+                if stop.is_set():
+                    break
+                batch = updates
+                if checkpoint is not None:
+                    batch = checkpoint.accept(updates)
+                for i in batch:
+                    if any(k in i for k in allowed_updates):
+                        enqueue(i)
+                    elif checkpoint is not None:
+                        checkpoint.done(i["update_id"])
+                if updates:
+                    last = updates[-1]["update_id"]
+                if stop.is_set():
+                    break
+        except KeyboardInterrupt:
+            pass
+        except Exception:
+            logging.exception("feeder stopped!")
+        finally:
+            if last is not None:
+                telegram._confirm(last + 1)
+            for n in range(worker):
+                queues[n % shards].put(None)
+            if acker is not None:
+                # a worker killed while writing to the done queue can leave the acker blocked,
+                # its unacknowledged updates stay pending and are replayed on restart.
+                while acker.is_alive() and not finished.is_set():
+                    acker.join(1)
+                acker.join(1)
+                checkpoint.save()
+            if metrics is not None:
+                metrics.flush()
+            if debug:
+                logging.warning("feeder stopped!")
+
+    def _acker(checkpoint, done, worker, finished=None):
+        """
+        This is private function, feeder thread that records updates acknowledged by workers.
+        It returns after the stop sentinel of every worker, once all handled updates are recorded,
+        or when finished is set and the done queue is empty because a worker died.
+        """
+        stopped = 0
+        while stopped < worker:
+            try:
+                update_id = done.get(timeout=1)
+            except queue.Empty:
+                if finished is not None and finished.is_set():
+                    break
+                continue
+            if update_id is None:
+                stopped += 1
+            else:
+                checkpoint.done(update_id)
 
-    def _worker(name, callback, queue, debug=False):
+    def _worker(
+        name,
+        callback,
+        queue,
+        debug=False,
+        depth=None,
+        shard=0,
+        worker=1,
+        typed=False,
+        done=None,
+    ):
         """
         This is private function, to be used as worker in multiprocessing poll.
+        It blocks on the queue while idle and exits after the stop sentinel, once every queued update is handled.
+        Updates cross the queue as plain dicts and are converted to models in the worker when typed is set.
         """
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        telegram._depth = depth
+        if TelegramSDK.rate_limiter is not None:
+            TelegramSDK.rate_limiter.share(worker)
+        metrics = TelegramSDK.metrics
         if debug:
             logging.warning("worker %d start!", name)
-        try:
-            while True:
-                if not queue.empty():
-                    data = queue.get()
-                    if debug:
-                        logging.warning(
-                            "worker %d: dequeue %d.", name, data["update_id"]
-                        )
-                    try:
-                        callback(data)
-                    except BaseException as e:
-                        logging.exception("Exception occurred!")
-        except BaseException as e:
-            logging.error(str(e))
-            exit(1)
+        while True:
+            data = queue.get()
+            if data is None:
+                break
+            if isinstance(data, tuple):
+                enqueued, data = data
+                if metrics is not None:
+                    metrics.timing("queue_wait_seconds", time.time() - enqueued)
+            if debug:
+                logging.warning("worker %d: dequeue %d.", name, data["update_id"])
+            if metrics is not None:
+                started = time.perf_counter()
+            status = "ok"
+            try:
+                callback(Update.from_dict(data) if typed else data)
+            except BaseException:
+                status = "error"
+                logging.exception("Exception occurred!")
+            finally:
+                if depth is not None:
+                    with depth.get_lock():
+                        depth[shard] -= 1
+                        pending = depth[shard]
+                    if metrics is not None:
+                        metrics.gauge("queue_depth", pending, shard=shard)
+                if done is not None:
+                    done.put(data["update_id"])
+            if metrics is not None:
+                metrics.timing(
+                    "handler_seconds", time.perf_counter() - started, status=status
+                )
+        if done is not None:
+            done.put(None)
+        if TelegramSDK.outbox is not None:
+            TelegramSDK.outbox.stop()
+        if telegram.session_store is not None:
+            telegram.session_store.flush()
+        if metrics is not None:
+            metrics.flush()
+        if debug:
+            logging.warning("worker %d stopped!", name)
+
+    def queue_depth():
+        """
+        Use this method to get pending updates in multiprocessing poll, it can be called from handlers.
+        Pending updates include the one being handled.
+        Returns:
+            - list: pending updates per shard (one item per worker with shard=True, otherwise one item).
+            - None: if poll is not running with multiprocessing.
+        """
+        if telegram._depth is None:
+            return None
+        return list(telegram._depth)
 
-    def poll(callback, interval=1, worker=1, debug=False):
+    def poll(
+        callback=None,
+        interval=1,
+        worker=1,
+        debug=False,
+        timeout=30,
+        queue_size=100,
+        shard=False,
+        hot_threshold=None,
+        typed=False,
+        allowed_updates=None,
+        checkpoint=None,
+    ):
         """
         Use this method to poll the bot.
+        SIGINT and SIGTERM stop it gracefully: fetching stops, handled updates are confirmed
+        and in multiprocessing mode workers drain the queue before they exit.
         Args:
-            - callback (callable): Function to handle user data.
-            - interval (int): Interval number for request looping, set 0 to no interval. Default to 1.
+            - callback (callable, optional): Function to handle user data. Default to None (telegram.dispatch(), handlers registered on telegram.router).
+            - interval (int): Interval number for request looping when timeout is 0, set 0 to no interval. Default to 1.
             - worker (int): Number of worker. Default to 1 (without multiprocessing).
             - debug (bool, optional): Show more verbose in multiprocessing mode. Default to False.
+            - timeout (int, optional): Long polling timeout in seconds, set 0 to use short polling with interval. Default to 30.
+            - queue_size (int, optional): Maximum queued updates in multiprocessing mode (per worker with shard=True), the feeder pauses when it is full. Default to 100.
+            - shard (bool, optional): Give every worker its own queue and dispatch updates by chat id, updates of the same chat are handled in order. Default to False.
+            - hot_threshold (int, optional): Log a warning when a shard has this many pending updates. Default to None (half of queue_size).
+            - typed (bool, optional): Pass updates to callback as compact __slots__ models (models.Update) instead of dicts. Default to False.
+            - allowed_updates (list, optional): Update types to fetch and forward to callback. Default to None (types of telegram.router handlers without callback, otherwise ["message"]).
+            - checkpoint (str or Checkpoint, optional): Durable checkpoint file, updates are acknowledged after they are handled, unhandled updates are replayed after a crash and redelivered ones are skipped. Default to None (updates are confirmed when fetched).
         """
+        if callback is None:
+            callback = telegram.dispatch
+            if allowed_updates is None:
+                allowed_updates = telegram.router.update_types()
+        if not allowed_updates:
+            allowed_updates = ("message",)
+        if isinstance(checkpoint, str):
+            checkpoint = Checkpoint(checkpoint)
         TelegramSDK.method = "poll"
         TelegramSDK.remove_webhook()
-        logging.warning(
-            "Running telegram.poll() with %d interval and %d worker.", interval, worker
-        )
+        if timeout:
+            logging.warning(
+                "Running telegram.poll() with %d long polling timeout and %d worker.",
+                timeout,
+                worker,
+            )
+        else:
+            logging.warning(
+                "Running telegram.poll() with %d interval and %d worker.",
+                interval,
+                worker,
+            )
+        stop = threading.Event()
         if worker > 1:
             import multiprocessing
 
-            q = multiprocessing.Queue()
+            shards = worker if shard else 1
+            queues = [multiprocessing.Queue(maxsize=queue_size) for _ in range(shards)]
+            depth = multiprocessing.Array("i", shards)
+            done = multiprocessing.Queue() if checkpoint is not None else None
+            finished = multiprocessing.Event()
+            if hot_threshold is None:
+                hot_threshold = queue_size // 2
             processes = []
             TelegramSDK.worker = worker
+            telegram._depth = depth
             process = multiprocessing.Process(
-                target=telegram._feeder, args=(interval, q, debug)
+                target=telegram._feeder,
+                args=(
+                    interval,
+                    queues,
+                    debug,
+                    timeout,
+                    worker,
+                    depth,
+                    hot_threshold,
+                    allowed_updates,
+                    checkpoint,
+                    done,
+                    finished,
+                ),
             )
             process.start()
             processes.append(process)
             for i in range(worker):
                 process = multiprocessing.Process(
-                    target=telegram._worker, args=(i + 1, callback, q, debug)
+                    target=telegram._worker,
+                    args=(
+                        i + 1,
+                        callback,
+                        queues[i % shards],
+                        debug,
+                        depth,
+                        i % shards,
+                        worker,
+                        typed,
+                        done,
+                    ),
                 )
                 process.start()
                 processes.append(process)
-            for process in processes:
-                process.join()
+
+            def shutdown(signum, frame):
+                if not stop.is_set():
+                    stop.set()
+                    logging.warning(
+                        "telegram.poll() stopping, draining queued updates."
+                    )
+                    if processes[0].is_alive():
+                        os.kill(processes[0].pid, signal.SIGTERM)
+
+            previous = telegram._signals(shutdown)
+            try:
+                # workers first: once they are gone the feeder stops waiting for acknowledgements.
+                for process in processes[1:]:
+                    process.join()
+                finished.set()
+                processes[0].join()
+            finally:
+                for sig, handler in previous.items():
+                    signal.signal(sig, handler)
         else:
-            while True:
-                data = telegram.get_updates()
-                if data["ok"]:
-                    for i in data["result"]:
-                        if "message" in i:
-                            try:
-                                callback(i)
-                            except BaseException as e:
-                                logging.exception("Exception occurred!")
-                else:
-                    raise ValueError(data)
-                if interval:
-                    time.sleep(interval)
+            previous = telegram._signals(telegram._stop_handler(stop))
+            last = None
+            offset = None
+
+            metrics = TelegramSDK.metrics
+
+            def handle(i):
+                if any(k in i for k in allowed_updates):
+                    if metrics is not None:
+                        started = time.perf_counter()
+                    status = "ok"
+                    try:
+                        callback(Update.from_dict(i) if typed else i)
+                    except BaseException:
+                        status = "error"
+                        logging.exception("Exception occurred!")
+                    if metrics is not None:
+                        metrics.timing(
+                            "handler_seconds",
+                            time.perf_counter() - started,
+                            status=status,
+                        )
+                if checkpoint is not None:
+                    checkpoint.done(i["update_id"])
+
+            try:
+                if checkpoint is not None:
+                    offset = checkpoint.offset
+                    for i in checkpoint.pending():
+                        if stop.is_set():
+                            break
+                        handle(i)
+                for updates in telegram._updates(
+                    interval, timeout, debug, allowed_updates, offset
+                ):
+                    if stop.is_set():
+                        break
+                    if checkpoint is not None:
+                        updates = checkpoint.accept(updates)
+                    for i in updates:
+                        if stop.is_set():
+                            break
+                        handle(i)
+                        last = i["update_id"]
+                    if stop.is_set():
+                        break
+            except KeyboardInterrupt:
+                pass
+            finally:
+                for sig, handler in previous.items():
+                    signal.signal(sig, handler)
+                if TelegramSDK.outbox is not None:
+                    TelegramSDK.outbox.stop()
+                if checkpoint is not None:
+                    checkpoint.save()
+                elif last is not None:
+                    telegram._confirm(last + 1)
+                if metrics is not None:
+                    metrics.flush()
+
+    def webhook(
+        callback,
+        url,
+        host="0.0.0.0",
+        port=8443,
+        path="/",
+        secret_token=None,
+        worker=8,
+        queue_size=100,
+        certfile=None,
+        keyfile=None,
+        self_signed=False,
+        max_connections=40,
+        allowed_updates=None,
+        typed=False,
+        debug=False,
+    ):
+        """
+        Use this method to register the webhook and serve it with the built-in server, see webhook.WebhookServer.
+        Telegram is answered as soon as an update is queued, handlers run in a bounded pool of threads.
+        Args:
+            - callback (callable): Function to handle user data.
+            - url (str): Public HTTPS url of this server, a TLS proxy can forward it to host:port.
+            - host (str, optional): Listen address. Default to "0.0.0.0".
+            - port (int, optional): Listen port. Default to 8443.
+            - path (str, optional): Url path that accepts updates. Default to "/".
+            - secret_token (str, optional): Secret checked on every request. Default to None (random token).
+            - worker (int, optional): Number of handler threads. Default to 8.
+            - queue_size (int, optional): Maximum queued updates per handler thread. Default to 100.
+            - certfile (str, optional): Certificate to serve HTTPS directly. Default to None.
+            - keyfile (str, optional): Private key of certfile. Default to None.
+            - self_signed (bool, optional): Upload certfile to Telegram, required for a self-signed certificate. Default to False.
+            - max_connections (int, optional): Maximum simultaneous connections from Telegram. Default to 40.
+            - allowed_updates (list, optional): Update types to receive. Default to None.
+            - typed (bool, optional): Pass updates to callback as models.Update instead of dicts. Default to False.
+            - debug (bool, optional): Log every request. Default to False.
+        """
+        from .webhook import WebhookServer
+        import secrets
+
+        if secret_token is None:
+            secret_token = secrets.token_urlsafe(32)
+        server = WebhookServer(
+            callback,
+            secret_token=secret_token,
+            path=path,
+            worker=worker,
+            queue_size=queue_size,
+            typed=typed,
+            debug=debug,
+            metrics=TelegramSDK.metrics,
+        )
+        TelegramSDK.method = "webhook"
+        ret = TelegramSDK.set_webhook(
+            url,
+            certificate=certfile if self_signed else None,
+            secret_token=secret_token,
+            max_connections=max_connections,
+            allowed_updates=allowed_updates,
+        )
+        if not ret["ok"]:
+            raise ValueError(ret)
+        server.serve(host, port, certfile=certfile, keyfile=keyfile)
 
     def set_session(value, ttl=0, database="database.json"):
         """
@@ -205,44 +840,17 @@ class telegram(TelegramSDK):
         Args:
             - value (Any): Json serialize able object (str, int, dict, bool etc)
             - ttl (int, optional): Limit time to life. Default to 0 (no limit).
-            - database (str, optional): Zcache database path. Default to database.json.
+            - database (str, optional): Zcache database path, used when no session store is set. Default to database.json.
         """
-
-        data = telegram.data
-        id = str(data.message._from.id)
-        chat_id = str(data.message.chat.id)
-        if telegram.cacheobject is not None:
-            c = telegram.cacheobject
-        else:
-            c = Cache(path=database)
-        if not c.has(id):
-            data = data.message._from
-            data["session_" + chat_id] = value
-            c.set(id, data, ttl=ttl)
-        else:
-            data = c.get(id)
-            data["session_" + chat_id] = value
-            c.set(id, data, ttl=ttl)
+        telegram.context().set_session(value, ttl=ttl, database=database)
 
     def get_session(database="database.json"):
         """
         Function get_session based user id and chat id.
         Args:
-            - database (str, optional): Zcache database path. Default to database.json.
+            - database (str, optional): Zcache database path, used when no session store is set. Default to database.json.
         Returns:
             - Any: session value if exists.
             - None: if session not exists.
         """
-
-        data = telegram.data
-        id = str(data.message._from.id)
-        chat_id = str(data.message.chat.id)
-        if telegram.cacheobject is not None:
-            c = telegram.cacheobject
-        else:
-            c = Cache(path=database)
-        if not c.has(id):
-            return None
-        else:
-            data = c.get(id)
-            return data["session_" + chat_id]
+        return telegram.context().get_session(database=database)
@@ -0,0 +1,511 @@
+# -*-coding:utf8;-*-
+from collections import Counter, deque
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import parse_qsl, urlsplit
+from .util import util
+import json
+import socket
+import socketserver
+import threading
+import time
+
+
+class FakeBotAPI:
+    """
+    Local fake Telegram Bot API server for tests and benchmarks, point a bot at it with
+    Bot(token, api_url=server.url), telegram.set_api_url(server.url) or TELEGRAM_API_URL.
+    It serves getUpdates (long polling), sendMessage, sendDocument, sendChatAction, getFile and file downloads,
+    other methods answer {"ok": true}. Latency, 429 flood control answers and large files can be injected,
+    it counts requests per method and measures the delay between delivering an update and the reply to its chat.
+    author: guangrei
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0,
+        flood_every=0,
+        retry_after=1,
+        chunk_size=65536,
+    ):
+        """
+        Args:
+            - host (str, optional): Listen address. Defaults to "127.0.0.1".
+            - port (int, optional): Listen port. Defaults to 0 (any free port).
+            - latency (float, optional): Seconds added to every API response, file downloads excluded. Defaults to 0.
+            - flood_every (int, optional): Answer every nth send with 429 Too Many Requests. Defaults to 0 (never).
+            - retry_after (int, optional): retry_after of 429 answers. Defaults to 1.
+            - chunk_size (int, optional): Write size of file downloads. Defaults to 65536.
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.chunk_size = chunk_size
+        self.requests = Counter()
+        self.latencies = []
+        self.replies = 0
+        self._updates = deque()
+        self._update_id = 0
+        self._files = {}
+        self._sends = 0
+        self._delivered = set()
+        self._waiting = {}
+        self._first = None
+        self._last = None
+        self._cond = threading.Condition()
+        self._httpd = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def url(self):
+        """
+        Bot API url of the running server, for example "http://127.0.0.1:8081".
+        """
+        host, port = self._httpd.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def start(self):
+        """
+        Use this method to start the server in a background thread.
+        Returns:
+            - FakeBotAPI: self.
+        """
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Use this method to stop the server.
+        """
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def add_file(self, size, file_name="file.bin"):
+        """
+        Use this method to register a file served by getFile and downloads, its content is generated while streaming
+        so large files do not use memory.
+        Args:
+            - size (int): File size in bytes.
+            - file_name (str, optional): File name. Defaults to "file.bin".
+        Returns:
+            - dict: Document object, with file_id and file_unique_id.
+        """
+        with self._cond:
+            file_id = "file%d" % (len(self._files) + 1)
+            self._files[file_id] = {
+                "file_id": file_id,
+                "file_unique_id": "u" + file_id,
+                "file_size": size,
+                "file_path": "documents/" + file_id + "_" + file_name,
+                "file_name": file_name,
+            }
+            return {k: v for k, v in self._files[file_id].items() if k != "file_path"}
+
+    def push(self, text="hi", chat_id=1, user_id=None, document=None, update=None):
+        """
+        Use this method to queue an update for getUpdates.
+        Args:
+            - text (str, optional): Message text, or caption with document. Defaults to "hi".
+            - chat_id (int, optional): Chat id. Defaults to 1.
+            - user_id (int, optional): Sender id. Defaults to None (chat_id).
+            - document (dict, optional): Document returned by add_file(). Defaults to None.
+            - update (dict, optional): Raw update without update_id, replaces the generated message. Defaults to None.
+        Returns:
+            - dict: queued update.
+        """
+        with self._cond:
+            self._update_id += 1
+            if update is None:
+                message = {
+                    "message_id": self._update_id,
+                    "from": {"id": chat_id if user_id is None else user_id},
+                    "chat": {"id": chat_id, "type": "private"},
+                    "date": int(time.time()),
+                }
+                if document is None:
+                    message["text"] = text
+                else:
+                    message["document"] = document
+                    message["caption"] = text
+                update = {"message": message}
+            update = dict(update, update_id=self._update_id)
+            self._updates.append(update)
+            self._cond.notify_all()
+            return update
+
+    def wait(self, replies, timeout=None):
+        """
+        Use this method to wait until the server received a number of replies (sendMessage and sendDocument).
+        Args:
+            - replies (int): Number of replies.
+            - timeout (float, optional): Seconds to wait. Defaults to None (forever).
+        Returns:
+            - bool: False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.replies >= replies, timeout)
+
+    def stats(self):
+        """
+        Function to get request counters and reply latencies.
+        Returns:
+            - dict: requests (per method), replies, pending (queued updates), latencies (seconds)
+              and elapsed (seconds from the first delivered update to the last reply).
+        """
+        with self._cond:
+            elapsed = 0
+            if self._first is not None and self._last is not None:
+                elapsed = self._last - self._first
+            return {
+                "requests": dict(self.requests),
+                "replies": self.replies,
+                "pending": len(self._updates),
+                "latencies": list(self.latencies),
+                "elapsed": elapsed,
+            }
+
+    def _get_updates(self, params):
+        """
+        This is private function, getUpdates with offset confirmation and long polling.
+        """
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._updates and self._updates[0]["update_id"] < offset:
+                self._updates.popleft()
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                while self._updates and self._updates[0]["update_id"] < offset:
+                    self._updates.popleft()
+            result = list(islice(self._updates, limit))
+            now = time.monotonic()
+            if result and self._first is None:
+                self._first = now
+            for i in result:
+                if i["update_id"] in self._delivered:
+                    continue
+                self._delivered.add(i["update_id"])
+                chat_id = util.get_chat_id(i)
+                self._waiting.setdefault(str(chat_id), deque()).append(now)
+        return result
+
+    def _reply(self, params):
+        """
+        This is private function, to record a reply, it is matched to the oldest unanswered update of its chat.
+        """
+        chat_id = str(params.get("chat_id"))
+        with self._cond:
+            waiting = self._waiting.get(chat_id)
+            self._last = time.monotonic()
+            if waiting:
+                self.latencies.append(self._last - waiting.popleft())
+            self.replies += 1
+            self._cond.notify_all()
+        return {
+            "message_id": self.replies,
+            "chat": {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else chat_id},
+            "date": int(time.time()),
+            "text": params.get("text", params.get("caption", "")),
+        }
+
+    def _call(self, method, params):
+        """
+        This is private function, to answer a Bot API method.
+        Returns:
+            - tuple: (status code, json response).
+        """
+        with self._cond:
+            self.requests[method] += 1
+        if method in ("sendMessage", "sendDocument", "sendChatAction"):
+            with self._cond:
+                self._sends += 1
+                flood = self.flood_every and self._sends % self.flood_every == 0
+            if flood:
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after %d"
+                    % self.retry_after,
+                    "parameters": {"retry_after": self.retry_after},
+                }
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": self._get_updates(params)}
+        if method in ("sendMessage", "sendDocument"):
+            result = self._reply(params)
+            if method == "sendDocument":
+                result["document"] = self.add_file(0, "upload.bin")
+            return 200, {"ok": True, "result": result}
+        if method == "getFile":
+            info = self._files.get(params.get("file_id"))
+            if info is None:
+                return 400, {
+                    "ok": False,
+                    "error_code": 400,
+                    "description": "Bad Request: invalid file_id",
+                }
+            return 200, {"ok": True, "result": info}
+        return 200, {"ok": True, "result": True}
+
+    def _handler(self):
+        """
+        This is private function, request handler class bound to the server.
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # one segment per response, otherwise delayed ack adds 40ms to every keep-alive request
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def _params(self):
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query))
+                size = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(size) if size > 0 else b""
+                ctype = self.headers.get("Content-Type", "")
+                if ctype.startswith("application/json") and body:
+                    params.update(util.loads(body))
+                elif ctype.startswith("multipart/form-data"):
+                    message = BytesParser().parsebytes(
+                        b"Content-Type: " + ctype.encode("latin-1") + b"\r\n\r\n" + body
+                    )
+                    for part in message.get_payload():
+                        name = part.get_param("name", header="content-disposition")
+                        if part.get_filename() is None:
+                            params[name] = part.get_payload(decode=True).decode("utf-8")
+                elif body:
+                    params.update(parse_qsl(body.decode("utf-8")))
+                return url.path, params
+
+            def _handle(self):
+                path, params = self._params()
+                parts = path.strip("/").split("/")
+                if (
+                    len(parts) >= 3
+                    and parts[0] == "file"
+                    and parts[1].startswith("bot")
+                ):
+                    return self._download("/".join(parts[2:]))
+                if len(parts) != 2 or not parts[0].startswith("bot"):
+                    return self._send(404, {"ok": False, "error_code": 404})
+                if server.latency:
+                    time.sleep(server.latency)
+                status, ret = server._call(parts[1], params)
+                self._send(status, ret)
+
+            def _send(self, status, ret):
+                body = json.dumps(ret).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _download(self, file_path):
+                for info in list(server._files.values()):
+                    if info["file_path"] == file_path:
+                        break
+                else:
+                    return self._send(404, {"ok": False, "error_code": 404})
+                with server._cond:
+                    server.requests["download"] += 1
+                size = info["file_size"]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(size))
+                self.end_headers()
+                chunk = b"\0" * server.chunk_size
+                while size > 0:
+                    self.wfile.write(chunk[:size])
+                    size -= len(chunk)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakeRedis:
+    """
+    Local fake Redis protocol (RESP) server for RedisSession tests, point a session at it with
+    RedisSession(server.url). It serves AUTH, SELECT, PING, GET, MGET, SET (with EX or PX) and DEL
+    from one in-memory keyspace, pipelined commands are answered in order.
+    It counts commands and connections, disconnect() drops every client connection.
+    author: guangrei
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, password=None):
+        """
+        Args:
+            - host (str, optional): Listen address. Defaults to "127.0.0.1".
+            - port (int, optional): Listen port. Defaults to 0 (any free port).
+            - password (str, optional): Password required by AUTH. Defaults to None (no AUTH).
+        """
+        self.host = host
+        self.port = port
+        self.password = password
+        self.commands = Counter()
+        self.connections = 0
+        self._store = {}
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def url(self):
+        """
+        Server url of the running server, for example "redis://:password@127.0.0.1:6379/0".
+        """
+        host, port = self._server.server_address[:2]
+        auth = ":%s@" % self.password if self.password else ""
+        return "redis://%s%s:%d/0" % (auth, host, port)
+
+    def start(self):
+        """
+        Use this method to start the server in a background thread.
+        Returns:
+            - FakeRedis: self.
+        """
+        self._server = socketserver.ThreadingTCPServer(
+            (self.host, self.port), self._handler()
+        )
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Use this method to stop the server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self.disconnect()
+            self._server = None
+
+    def disconnect(self):
+        """
+        Use this method to close every client connection, like a server restart.
+        """
+        with self._lock:
+            clients, self._clients = self._clients, set()
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _get(self, key):
+        """
+        This is private function, to read a key that did not expire.
+        """
+        entry = self._store.get(key)
+        if entry is None or (entry[1] and entry[1] <= time.monotonic()):
+            return None
+        return entry[0]
+
+    def _bulk(value):
+        """
+        This is private function, to encode a bulk string reply.
+        """
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _call(self, args, state):
+        """
+        This is private function, to answer one command.
+        Returns:
+            - bytes: RESP reply.
+        """
+        name = args[0].upper().decode("utf-8")
+        with self._lock:
+            self.commands[name] += 1
+            if name == "AUTH":
+                if args[-1].decode("utf-8") != self.password:
+                    return b"-WRONGPASS invalid password\r\n"
+                state["auth"] = True
+                return b"+OK\r\n"
+            if self.password and not state.get("auth"):
+                return b"-NOAUTH Authentication required.\r\n"
+            if name == "PING":
+                return b"+PONG\r\n"
+            if name == "SELECT":
+                return b"+OK\r\n"
+            if name == "GET":
+                return FakeRedis._bulk(self._get(args[1]))
+            if name == "MGET":
+                return b"*%d\r\n" % (len(args) - 1) + b"".join(
+                    FakeRedis._bulk(self._get(i)) for i in args[1:]
+                )
+            if name == "SET":
+                expires = 0
+                if len(args) >= 5:
+                    unit = args[3].upper()
+                    scale = 1000.0 if unit == b"PX" else 1.0 if unit == b"EX" else 0
+                    if not scale:
+                        return b"-ERR syntax error\r\n"
+                    expires = time.monotonic() + int(args[4]) / scale
+                self._store[args[1]] = (args[2], expires)
+                return b"+OK\r\n"
+            if name == "DEL":
+                deleted = sum(self._store.pop(i, None) is not None for i in args[1:])
+                return b":%d\r\n" % deleted
+        return b"-ERR unknown command '%s'\r\n" % args[0]
+
+    def _handler(self):
+        """
+        This is private function, connection handler class bound to the server.
+        """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with server._lock:
+                    server.connections += 1
+                    server._clients.add(self.connection)
+                state = {}
+                while True:
+                    try:
+                        line = self.rfile.readline()
+                        if not line.startswith(b"*"):
+                            return
+                        args = []
+                        for _ in range(int(line[1:])):
+                            size = int(self.rfile.readline()[1:])
+                            args.append(self.rfile.read(size + 2)[:-2])
+                        self.wfile.write(server._call(args, state))
+                    except (OSError, ValueError):
+                        return
+
+        return Handler
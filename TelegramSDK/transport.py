@@ -0,0 +1,158 @@
+# -*-coding:utf8;-*-
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import os
+import threading
+import requests
+
+
+class transport:
+    """
+    Pooled, keep-alive HTTP transport shared by every TelegramSDK API method.
+    One requests.Session is created lazily per process (it is rebuilt after fork),
+    so consecutive calls to api.telegram.org reuse the same TCP+TLS connection.
+    author: guangrei
+    """
+
+    pool_connections = 4
+    pool_maxsize = 16
+    timeout = (10, 60)
+    poll_slack = 15
+    retries = 3
+    backoff_factor = 0.3
+    keep_alive = True
+    _session = None
+    _pid = None
+    _custom = None
+    _lock = threading.Lock()
+
+    def configure(
+        pool_connections=None,
+        pool_maxsize=None,
+        timeout=None,
+        retries=None,
+        backoff_factor=None,
+        keep_alive=None,
+    ):
+        """
+        Use this method to tune the default pooled transport.
+        Args:
+            - pool_connections (int, optional): Number of host pools to cache. Defaults to None (unchanged).
+            - pool_maxsize (int, optional): Maximum number of connections kept alive per host. Defaults to None (unchanged).
+            - timeout (float or tuple, optional): Default (connect, read) timeout in seconds. Defaults to None (unchanged).
+            - retries (int, optional): Retries for connection errors and 502/503/504 responses, POST is never retried after it was sent. Defaults to None (unchanged).
+            - backoff_factor (float, optional): Backoff factor between retries. Defaults to None (unchanged).
+            - keep_alive (bool, optional): Keep connections open between requests. Defaults to None (unchanged).
+        """
+        if pool_connections is not None:
+            transport.pool_connections = pool_connections
+        if pool_maxsize is not None:
+            transport.pool_maxsize = pool_maxsize
+        if timeout is not None:
+            transport.timeout = timeout
+        if retries is not None:
+            transport.retries = retries
+        if backoff_factor is not None:
+            transport.backoff_factor = backoff_factor
+        if keep_alive is not None:
+            transport.keep_alive = keep_alive
+        transport.close()
+
+    def set_transport(obj):
+        """
+        Use this method to swap in a custom transport, for example in tests or benchmarks.
+        Args:
+            - obj (object or None): Object with a requests compatible request(method, url, **kwargs) method, set None to restore the default pooled session.
+        """
+        transport._custom = obj
+
+    def get_session():
+        """
+        Function to get the pooled session of the current process.
+        Returns:
+            - requests.Session: pooled session or the custom transport if one is set.
+        """
+        if transport._custom is not None:
+            return transport._custom
+        pid = os.getpid()
+        if transport._session is None or transport._pid != pid:
+            with transport._lock:
+                if transport._session is None or transport._pid != pid:
+                    transport._session = transport._new_session()
+                    transport._pid = pid
+        return transport._session
+
+    def _new_session():
+        """
+        This is private function, to build a pooled requests.Session.
+        """
+        session = requests.Session()
+        retry = Retry(
+            total=transport.retries,
+            connect=transport.retries,
+            read=0,
+            status=transport.retries,
+            status_forcelist=(502, 503, 504),
+            backoff_factor=transport.backoff_factor,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=transport.pool_connections,
+            pool_maxsize=transport.pool_maxsize,
+            max_retries=retry,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if not transport.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def request(method, url, **kwargs):
+        """
+        Use this method to send http request through the pooled transport.
+        Args:
+            - method (str): Http method.
+            - url (str): Request url.
+            - **kwargs: Any requests.request keyword arguments.
+        Returns:
+            - requests.Response: response object.
+        """
+        kwargs.setdefault("timeout", transport.timeout)
+        return transport.get_session().request(method, url, **kwargs)
+
+    def poll_timeout(timeout):
+        """
+        Function to get the http client timeout for a long polling request.
+        The read timeout is always longer than the server side timeout, so an idle long poll is never cut by the client.
+        Args:
+            - timeout (int): Server side long polling timeout in seconds.
+        Returns:
+            - tuple: (connect, read) timeout in seconds.
+        """
+        if isinstance(transport.timeout, tuple):
+            connect = transport.timeout[0]
+        else:
+            connect = transport.timeout
+        return (connect, timeout + transport.poll_slack)
+
+    def get(url, **kwargs):
+        """
+        Shortcut for transport.request("GET", url, **kwargs).
+        """
+        return transport.request("GET", url, **kwargs)
+
+    def post(url, **kwargs):
+        """
+        Shortcut for transport.request("POST", url, **kwargs).
+        """
+        return transport.request("POST", url, **kwargs)
+
+    def close():
+        """
+        Use this method to close pooled connections, a new session is created on next request.
+        """
+        with transport._lock:
+            if transport._session is not None:
+                transport._session.close()
+            transport._session = None
+            transport._pid = None
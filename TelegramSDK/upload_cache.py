@@ -0,0 +1,148 @@
+# -*-coding:utf8;-*-
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class UploadCache:
+    """
+    Persistent LRU cache that maps local files to the file_id Telegram returned after upload,
+    so repeat sends of the same file go out as a file_id reference without multipart upload.
+    Entries are keyed by absolute path and invalidated when size or mtime change,
+    or keyed by content hash with hash_content=True.
+    Several processes can share the file: every write merges the entries other processes saved meanwhile,
+    under a lock on path + ".lock" (POSIX only), and replaces the file atomically.
+    author: guangrei
+    """
+
+    def __init__(self, path="upload_cache.json", max_entries=1000, hash_content=False):
+        """
+        Args:
+            - path (str, optional): Json file to persist the cache, set None to keep it in memory. Defaults to upload_cache.json.
+            - max_entries (int, optional): Least recently used entries are evicted above this size. Defaults to 1000.
+            - hash_content (bool, optional): Key files by sha1 of their content instead of path + size + mtime. Defaults to False.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hash_content = hash_content
+        self._entries = OrderedDict()
+        self._changed = set()
+        self._deleted = set()
+        self._lock = threading.Lock()
+        if path is not None:
+            self._entries.update(self._load())
+            self._trim()
+
+    def _key(self, local_path):
+        """
+        This is private function, returns (key, signature) of a local file.
+        """
+        if self.hash_content:
+            h = hashlib.sha1()
+            with open(local_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    h.update(chunk)
+            return "sha1:" + h.hexdigest(), None
+        st = os.stat(local_path)
+        return os.path.abspath(local_path), [st.st_size, st.st_mtime_ns]
+
+    def get(self, local_path):
+        """
+        Use this method to get the cached file_id of a local file.
+        Args:
+            - local_path (str): File path.
+        Returns:
+            - str: file_id if cached and the file did not change.
+            - None: if not cached.
+        """
+        key, signature = self._key(local_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != signature:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, local_path, file_id):
+        """
+        Use this method to cache the file_id of an uploaded local file.
+        Args:
+            - local_path (str): File path.
+            - file_id (str): file_id returned by Telegram.
+        """
+        key, signature = self._key(local_path)
+        with self._lock:
+            self._entries[key] = [signature, file_id]
+            self._entries.move_to_end(key)
+            self._changed.add(key)
+            self._deleted.discard(key)
+            self._trim()
+            self._save()
+
+    def delete(self, local_path):
+        """
+        Use this method to drop a cached file_id, for example when Telegram rejects it.
+        Args:
+            - local_path (str): File path.
+        """
+        key, _ = self._key(local_path)
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._changed.discard(key)
+                self._deleted.add(key)
+                self._save()
+
+    def _trim(self):
+        """
+        This is private function, to evict least recently used entries above max_entries.
+        """
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self):
+        """
+        This is private function, to read the saved entries, least recently used first.
+        """
+        try:
+            with open(self.path) as f:
+                return json.load(f, object_pairs_hook=OrderedDict)
+        except FileNotFoundError:
+            return OrderedDict()
+
+    def _save(self):
+        """
+        This is private function, to merge the changes of this process into the saved entries and write the cache atomically.
+        Entries set since the last save become the most recently used, entries saved by other processes are kept.
+        """
+        if self.path is None:
+            self._changed.clear()
+            self._deleted.clear()
+            return
+        with open(self.path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self._load()
+            for key in self._deleted:
+                entries.pop(key, None)
+            for key in self._changed:
+                if key in self._entries:
+                    entries[key] = self._entries[key]
+                    entries.move_to_end(key)
+            self._entries = entries
+            self._changed.clear()
+            self._deleted.clear()
+            self._trim()
+            tmp = "%s.%d.tmp" % (self.path, os.getpid())
+            with open(tmp, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)
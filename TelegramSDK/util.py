@@ -2,42 +2,100 @@
 from datetime import datetime
 import os
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+class objectify(dict):
+    """
+    Dict that can be accessed like an object.
+    Nested dicts are wrapped on first access only, so reading data.message.text does not walk the whole update.
+    The key "from" can also be read and tested with "in" as "_from" to avoid conflict with Python keyword "from".
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            value = dict.__getitem__(self, key)
+        except KeyError:
+            if key != "_from":
+                raise
+            key = "from"
+            value = dict.__getitem__(self, key)
+        if type(value) is dict:
+            value = objectify(value)
+            dict.__setitem__(self, key, value)
+        return value
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            if key[:2] == "__":
+                raise AttributeError(key)
+            raise
+
+    __setattr__ = dict.__setitem__
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (
+            key == "_from" and dict.__contains__(self, "from")
+        )
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
 
 class util:
     """Class utility."""
 
+    message_types = (
+        "message",
+        "edited_message",
+        "channel_post",
+        "edited_channel_post",
+        "business_message",
+        "edited_business_message",
+    )
+    media_types = (
+        "animation",
+        "audio",
+        "document",
+        "sticker",
+        "video",
+        "video_note",
+        "voice",
+    )
+
     def parse_response(data):
         """
         Function to make telegram response accessible through dot "." like an object.
-        The key "from" renamed to "_from" to avoid conflict with Python keyword "from".
+        The key "from" can be read as "_from" to avoid conflict with Python keyword "from".
         This function used in telegram.update()
         Args:
             - data (dict): json decoded from telegram response.
         Returns:
             - dict: dict that can be accessed like an object.
         """
+        if type(data) is objectify:
+            return data
+        return objectify(data)
 
-        def format_dict_nested(dictionary):
-            for key, value in dictionary.items():
-                if isinstance(value, dict):
-                    format_dict_nested(value)
-                    dictionary[key] = objectify(value)
-            return dictionary
-
-        class objectify(dict):
-            __slots__ = ()
-            __getattr__ = dict.__getitem__
-            __setattr__ = dict.__setitem__
-
-        def parse(array):
-            if "message" in array and "from" in array["message"]:
-                array["message"]["_from"] = array["message"]["from"]
-                del array["message"]["from"]
-            u = format_dict_nested(array)
-            return objectify(u)
-
-        ret = parse(data)
-        return ret
+    def loads(data):
+        """
+        Function to decode json, orjson is used when it is installed.
+        Args:
+            - data (str or bytes): json document.
+        Returns:
+            - Any: decoded object.
+        """
+        return json_loads(data)
 
     def get_command(msg):
         """
@@ -75,6 +133,28 @@ class util:
         else:
             return msg.strip()
 
+    def get_chat_id(data):
+        """
+        Function to get the chat id of an update, falls back to the sender id for updates without chat.
+        This function used in telegram.poll() to shard updates per chat.
+        Args:
+            - data (dict): telegram update.
+        Returns:
+            - int: chat id or user id.
+            - None: if update has no chat and no sender.
+        """
+        for key, value in data.items():
+            if not hasattr(value, "keys"):
+                continue
+            if "chat" in value:
+                return value["chat"]["id"]
+            if "message" in value and "chat" in value["message"]:
+                return value["message"]["chat"]["id"]
+            sender = value.get("from", value.get("_from"))
+            if sender is not None:
+                return sender["id"]
+        return None
+
     def save_file(content, local_path):
         """
         This function used in telegram.download_file().
@@ -112,6 +192,89 @@ class util:
 
         return tuple(_inner(data, search))
 
+    def sent_file_id(message):
+        """
+        Function to get the file_id of the file a send method returned, a reply also carries the
+        files of reply_to_message so only the media keys of the sent message itself are read.
+        This function used in send_document() and telegram.broadcast().
+        Args:
+            - message (dict): Message returned by sendDocument.
+        Returns:
+            - str: file_id.
+            - None: if the message has no file.
+        """
+        for key in ("document",) + util.media_types:
+            if key in message:
+                return message[key]["file_id"]
+        sizes = message.get("photo")
+        if sizes:
+            return util.select_photo(sizes)[0]["file_id"]
+        return None
+
+    def select_files(data, photo="largest", thumbnails=False):
+        """
+        Function to select the file objects of an update based on its message type.
+        A photo message carries every size of the same image, only the sizes chosen by photo are selected.
+        This function used in telegram.download_file().
+        Args:
+            - data (dict): telegram update or message.
+            - photo (str or int, optional): "largest", "smallest", "all" or the smallest size with at least this many pixels on its longest side. Default to "largest".
+            - thumbnails (bool, optional): Also select thumbnails of documents, videos etc. Default to False.
+        Returns:
+            - tuple: file objects (dict with file_id, and file_size/file_name when Telegram sent them).
+        """
+        message = data
+        for key in util.message_types:
+            if key in data:
+                message = data[key]
+                break
+        else:
+            if "callback_query" in data:
+                message = data["callback_query"].get("message", {})
+        files = []
+        sizes = message.get("photo")
+        if sizes:
+            files.extend(util.select_photo(sizes, photo))
+        for key in util.media_types:
+            if key in message:
+                files.append(message[key])
+                thumb = message[key].get("thumbnail", message[key].get("thumb"))
+                if thumbnails and thumb is not None:
+                    files.append(thumb)
+        seen = set()
+        output = []
+        for i in files:
+            uid = i.get("file_unique_id", i["file_id"])
+            if uid not in seen:
+                seen.add(uid)
+                output.append(i)
+        return tuple(output)
+
+    def select_photo(sizes, policy="largest"):
+        """
+        Function to select photo sizes.
+        Args:
+            - sizes (list): PhotoSize objects of a photo message.
+            - policy (str or int, optional): "largest", "smallest", "all" or minimum pixels on the longest side. Default to "largest".
+        Returns:
+            - list: selected PhotoSize objects.
+        """
+        if policy == "all":
+            return list(sizes)
+
+        def area(i):
+            return i.get("width", 0) * i.get("height", 0)
+
+        if policy == "smallest":
+            return [min(sizes, key=area)]
+        if isinstance(policy, int):
+            fit = [
+                i for i in sizes if max(i.get("width", 0), i.get("height", 0)) >= policy
+            ]
+            if fit:
+                return [min(fit, key=area)]
+        return [max(sizes, key=area)]
+
     def uniq_file(path, filename):
         """
         Function to generate unique file name.
@@ -0,0 +1,306 @@
+# -*-coding:utf8;-*-
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .models import Update
+from .util import util
+import asyncio
+import hmac
+import logging
+import queue
+import signal
+import threading
+import time
+
+
+class WebhookServer:
+    """
+    Built-in webhook receiver: Telegram gets its 200 as soon as the update is queued,
+    handlers run in a bounded pool of threads and updates of the same chat are handled in order
+    by the same thread. It can serve HTTP/1.1 with keep-alive itself (serve())
+    or be embedded as a WSGI (wsgi) or ASGI (asgi) application.
+    author: guangrei
+    """
+
+    def __init__(
+        self,
+        callback,
+        secret_token=None,
+        path="/",
+        worker=8,
+        queue_size=100,
+        queue_timeout=5,
+        typed=False,
+        debug=False,
+        metrics=None,
+    ):
+        """
+        Args:
+            - callback (callable): Function to handle user data, same as telegram.poll().
+            - secret_token (str, optional): Expected X-Telegram-Bot-Api-Secret-Token header, see telegram.set_webhook(). Defaults to None (not verified).
+            - path (str, optional): Url path that accepts updates. Defaults to "/".
+            - worker (int, optional): Number of handler threads. Defaults to 8.
+            - queue_size (int, optional): Maximum queued updates per handler thread. Defaults to 100.
+            - queue_timeout (int, optional): Seconds a request waits for queue space before it is answered with 503 and Telegram retries it later. Defaults to 5.
+            - typed (bool, optional): Pass updates to callback as models.Update instead of dicts. Defaults to False.
+            - debug (bool, optional): Log every request. Defaults to False.
+            - metrics (Metrics, optional): Records queue wait and handler duration, see metrics.Metrics. Defaults to None (disabled).
+        """
+        self.callback = callback
+        self.secret_token = secret_token
+        self.path = path
+        self.worker = worker
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.typed = typed
+        self.debug = debug
+        self.metrics = metrics
+        self._queues = None
+        self._threads = []
+        self._httpd = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Use this method to start the handler threads, it is called on the first update.
+        """
+        with self._lock:
+            if self._queues is not None:
+                return
+            self._queues = [queue.Queue(self.queue_size) for _ in range(self.worker)]
+            self._threads = [
+                threading.Thread(target=self._run, args=(q,), daemon=True)
+                for q in self._queues
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self):
+        """
+        Use this method to stop the handler threads once every queued update is handled.
+        """
+        with self._lock:
+            queues, self._queues = self._queues, None
+            threads, self._threads = self._threads, []
+        if queues is None:
+            return
+        for q in queues:
+            q.put(None)
+        for thread in threads:
+            thread.join()
+
+    def _run(self, q):
+        """
+        This is private function, handler thread loop.
+        """
+        metrics = self.metrics
+        while True:
+            data = q.get()
+            if data is None:
+                break
+            if metrics is not None:
+                started = time.perf_counter()
+                enqueued, data = data
+                metrics.timing("queue_wait_seconds", started - enqueued)
+            status = "ok"
+            try:
+                self.callback(Update.from_dict(data) if self.typed else data)
+            except BaseException:
+                status = "error"
+                logging.exception("Exception occurred!")
+            if metrics is not None:
+                metrics.timing(
+                    "handler_seconds", time.perf_counter() - started, status=status
+                )
+
+    def _accept(self, method, path, secret, body):
+        """
+        This is private function, to check a request.
+        Returns:
+            - tuple: (status code, decoded update or None).
+        """
+        if path.split("?", 1)[0] != self.path:
+            return 404, None
+        if method != "POST":
+            return 405, None
+        if self.secret_token is not None and not hmac.compare_digest(
+            (secret or "").encode("utf-8"), self.secret_token.encode("utf-8")
+        ):
+            return 403, None
+        try:
+            data = util.loads(body)
+        except ValueError:
+            return 400, None
+        if not isinstance(data, dict) or "update_id" not in data:
+            return 400, None
+        return 200, data
+
+    def _put(self, data, block=True):
+        """
+        This is private function, to queue an update on the thread of its chat.
+        Returns:
+            - bool: False if the queue stayed full.
+        """
+        self.start()
+        queues = self._queues
+        chat_id = util.get_chat_id(data)
+        if not isinstance(chat_id, int):
+            chat_id = data["update_id"]
+        item = data if self.metrics is None else (time.perf_counter(), data)
+        try:
+            queues[chat_id % len(queues)].put(
+                item, block=block, timeout=self.queue_timeout
+            )
+        except queue.Full:
+            logging.warning(
+                "webhook: queue full, update %d refused.", data["update_id"]
+            )
+            return False
+        return True
+
+    def dispatch(self, method, path, secret, body):
+        """
+        Use this method to feed a request from any web framework.
+        Args:
+            - method (str): Request method.
+            - path (str): Request path.
+            - secret (str): Value of the X-Telegram-Bot-Api-Secret-Token header, None if missing.
+            - body (bytes): Request body.
+        Returns:
+            - int: status code to answer Telegram with.
+        """
+        status, data = self._accept(method, path, secret, body)
+        if status == 200 and not self._put(data):
+            status = 503
+        if self.debug:
+            logging.warning("webhook: %s %s %d", method, path, status)
+        return status
+
+    def wsgi(self, environ, start_response):
+        """
+        WSGI application, for example gunicorn "module:server.wsgi".
+        """
+        try:
+            size = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            size = 0
+        body = environ["wsgi.input"].read(size) if size > 0 else b""
+        status = self.dispatch(
+            environ["REQUEST_METHOD"],
+            environ.get("PATH_INFO") or "/",
+            environ.get("HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN"),
+            body,
+        )
+        start_response(WebhookServer._status(status), [("Content-Length", "0")])
+        return [b""]
+
+    async def asgi(self, scope, receive, send):
+        """
+        ASGI application, for example uvicorn "module:server.asgi".
+        The handler threads are stopped on lifespan shutdown.
+        """
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    self.start()
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await asyncio.get_running_loop().run_in_executor(None, self.stop)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        body = []
+        while True:
+            message = await receive()
+            body.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        secret = None
+        for key, value in scope.get("headers", ()):
+            if key == b"x-telegram-bot-api-secret-token":
+                secret = value.decode("latin-1")
+        status, data = self._accept(
+            scope["method"], scope["path"], secret, b"".join(body)
+        )
+        if status == 200 and not self._put(data, block=False):
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(None, self._put, data):
+                status = 503
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-length", b"0")],
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
+
+    def _status(code):
+        """
+        This is private function, WSGI status line.
+        """
+        return "%d %s" % (code, HTTPStatus(code).phrase)
+
+    def serve(self, host="0.0.0.0", port=8443, certfile=None, keyfile=None):
+        """
+        Use this method to serve the webhook with the built-in threaded HTTP/1.1 server.
+        SIGINT and SIGTERM stop it gracefully: it stops accepting requests and handles every queued update.
+        Args:
+            - host (str, optional): Listen address. Defaults to "0.0.0.0".
+            - port (int, optional): Listen port, Telegram supports 443, 80, 88 and 8443. Defaults to 8443.
+            - certfile (str, optional): Certificate to serve HTTPS directly, not needed behind a TLS proxy. Defaults to None.
+            - keyfile (str, optional): Private key of certfile. Defaults to None.
+        """
+        from .telegram import telegram
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                size = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(size) if size > 0 else b""
+                status = server.dispatch(
+                    self.command,
+                    self.path,
+                    self.headers.get("X-Telegram-Bot-Api-Secret-Token"),
+                    body,
+                )
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_POST = do_GET = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        if certfile is not None:
+            import ssl
+
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self._httpd.socket = context.wrap_socket(
+                self._httpd.socket, server_side=True
+            )
+
+        def shutdown(signum, frame):
+            logging.warning("webhook stopping, draining queued updates.")
+            threading.Thread(target=self._httpd.shutdown).start()
+
+        self.start()
+        previous = telegram._signals(shutdown)
+        logging.warning(
+            "Running webhook server on %s:%d with %d worker.", host, port, self.worker
+        )
+        try:
+            self._httpd.serve_forever()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+            self._httpd.server_close()
+            self.stop()
@@ -0,0 +1,180 @@
+# -*-coding:utf8;-*-
+"""
+Benchmark of telegram.poll() against the local fake Bot API server (TelegramSDK.testing.FakeBotAPI).
+Every update is answered with one message, it reports updates/s, p50/p99 delay from delivering an update
+to its reply, API requests per update, CPU seconds of the poller and its workers and the peak RSS of the largest of them.
+
+    python benchmarks/poll.py --updates 2000 --worker 1 4
+    python benchmarks/poll.py --latency 0.02 --file-size 1048576 --json result.json
+    python benchmarks/poll.py --latency 0.02 --outbox
+    python benchmarks/poll.py --baseline result.json --tolerance 0.2
+
+With --baseline it exits with status 1 when updates/s or p99 of a mode regressed more than tolerance.
+"""
+
+from multiprocessing import Pipe, Process
+import argparse
+import json
+import os
+import resource
+import shutil
+import signal
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TelegramSDK import telegram
+from TelegramSDK.outbox import Outbox
+from TelegramSDK.testing import FakeBotAPI
+
+download_dir = os.path.join(tempfile.gettempdir(), "telegramsdk-benchmark")
+
+
+def handler(data):
+    telegram.update(data)
+    if "document" in data["message"]:
+        # one directory per worker, file names are only unique within a process
+        path = os.path.join(download_dir, str(os.getpid()))
+        os.makedirs(path, exist_ok=True)
+        telegram.download_file(path)
+    telegram.reply_message("ok")
+
+
+def run(conn, worker, shard, timeout, rate_limit, outbox):
+    """
+    Poller process, it reports its resource usage after SIGTERM stopped poll().
+    """
+    if not rate_limit:
+        telegram.set_rate_limiter(None)
+    if outbox:
+        telegram.set_outbox(Outbox())
+    telegram.poll(handler, worker=worker, shard=shard, timeout=timeout)
+    usage = [
+        resource.getrusage(resource.RUSAGE_SELF),
+        resource.getrusage(resource.RUSAGE_CHILDREN),
+    ]
+    conn.send(
+        {
+            "cpu": sum(i.ru_utime + i.ru_stime for i in usage),
+            # ru_maxrss is in kilobytes on linux and bytes on macos, for RUSAGE_CHILDREN it is
+            # the peak of the largest child, not a sum
+            "max rss": max(i.ru_maxrss for i in usage)
+            / (1048576 if sys.platform == "darwin" else 1024),
+        }
+    )
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def bench(args, worker):
+    server = FakeBotAPI(
+        latency=args.latency, flood_every=args.flood_every, retry_after=1
+    ).start()
+    os.environ["TELEGRAM_API_URL"] = server.url
+    os.environ["TELEGRAM_BOT_TOKEN"] = "123456:benchmark"
+    document = None
+    if args.file_size:
+        document = server.add_file(args.file_size)
+    for i in range(args.updates):
+        server.push(text="update %d" % i, chat_id=i % args.chats + 1, document=document)
+    parent, child = Pipe()
+    process = Process(
+        target=run,
+        args=(
+            child,
+            worker,
+            args.shard,
+            args.poll_timeout,
+            args.rate_limit,
+            args.outbox,
+        ),
+    )
+    process.start()
+    finished = server.wait(args.updates, timeout=args.max_time)
+    os.kill(process.pid, signal.SIGTERM)
+    usage = parent.recv()
+    process.join()
+    stats = server.stats()
+    server.stop()
+    latencies = stats["latencies"]
+    return {
+        "mode": "worker=%d" % worker,
+        "finished": finished,
+        "updates/s": stats["replies"] / stats["elapsed"] if stats["elapsed"] else 0,
+        "p50 ms": percentile(latencies, 0.5) * 1000,
+        "p99 ms": percentile(latencies, 0.99) * 1000,
+        "requests/update": sum(stats["requests"].values()) / args.updates,
+        "cpu s": usage["cpu"],
+        "max rss MB": usage["max rss"],
+    }
+
+
+def compare(results, baseline, tolerance):
+    failed = False
+    baseline = {i["mode"]: i for i in baseline}
+    for i in results:
+        base = baseline.get(i["mode"])
+        if base is None:
+            continue
+        if i["updates/s"] < base["updates/s"] * (1 - tolerance):
+            print(
+                "%s: updates/s regressed %.1f -> %.1f"
+                % (i["mode"], base["updates/s"], i["updates/s"])
+            )
+            failed = True
+        if i["p99 ms"] > base["p99 ms"] * (1 + tolerance):
+            print(
+                "%s: p99 regressed %.1f -> %.1f ms"
+                % (i["mode"], base["p99 ms"], i["p99 ms"])
+            )
+            failed = True
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="telegram.poll() benchmark")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--worker", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--shard", action="store_true")
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--flood-every", type=int, default=0)
+    parser.add_argument("--file-size", type=int, default=0)
+    parser.add_argument("--rate-limit", action="store_true")
+    parser.add_argument("--outbox", action="store_true")
+    parser.add_argument("--poll-timeout", type=int, default=1)
+    parser.add_argument("--max-time", type=float, default=300)
+    parser.add_argument("--json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    os.makedirs(download_dir, exist_ok=True)
+    try:
+        results = [bench(args, worker) for worker in args.worker]
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+    columns = list(results[0])
+    print("  ".join("%15s" % i for i in columns))
+    for i in results:
+        print(
+            "  ".join(
+                "%15.2f" % v if isinstance(v, float) else "%15s" % v for v in i.values()
+            )
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,4 +20,5 @@ setup(
     license="MIT",
     platforms="any",
     install_requires=["requests", "zcache"],
+    extras_require={"async": ["aiohttp"], "speed": ["orjson"]},
 )
@@ -0,0 +1,107 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.TelegramSDK import TelegramSDK
+from TelegramSDK.testing import FakeBotAPI
+from TelegramSDK.transport import transport
+import json
+import multiprocessing
+import os
+import signal
+import pytest
+
+
+class Response:
+    """
+    requests.Response stand-in of FakeTransport.
+    """
+
+    def __init__(self, data, status_code=200):
+        self.content = json.dumps(data).encode("utf-8")
+        self.status_code = status_code
+        self.headers = {"Content-Type": "application/json"}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeTransport:
+    """
+    In-process transport for transport.set_transport(): answers are queued per API method,
+    methods without a queued answer get {"ok": true, "result": true}.
+    """
+
+    def __init__(self):
+        self.answers = {}
+        self.calls = []
+
+    def answer(self, method, *answers):
+        self.answers.setdefault(method, []).extend(answers)
+
+    def request(self, method, url, **kwargs):
+        name = url.rsplit("/", 1)[-1].split("?")[0]
+        self.calls.append(
+            (name, kwargs.get("data") or kwargs.get("json"), kwargs.get("files"))
+        )
+        answers = self.answers.get(name)
+        ret = answers.pop(0) if answers else {"ok": True, "result": True}
+        if isinstance(ret, BaseException):
+            raise ret
+        return Response(ret, ret.get("error_code", 200))
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """
+    FakeTransport every API call of the default bot (telegram) goes through.
+    """
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123456:test")
+    fake = FakeTransport()
+    transport.set_transport(fake)
+    yield fake
+    transport.set_transport(None)
+
+
+class RecordingAPI(FakeBotAPI):
+    """
+    FakeBotAPI that records the text of every reply per chat.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.texts = {}
+
+    def _reply(self, params):
+        with self._cond:
+            self.texts.setdefault(str(params.get("chat_id")), []).append(
+                params.get("text", params.get("caption"))
+            )
+        return super()._reply(params)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """
+    Fake Bot API the default bot (telegram) is pointed at, without rate limiting.
+    """
+    with RecordingAPI() as server:
+        monkeypatch.setenv("TELEGRAM_API_URL", server.url)
+        monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123456:test")
+        monkeypatch.setattr(TelegramSDK, "rate_limiter", None)
+        yield server
+
+
+def start(target, *args, **kwargs):
+    """
+    Run target in a forked process, poll() installs signal handlers and only stops on a signal.
+    """
+    process = multiprocessing.get_context("fork").Process(
+        target=target, args=args, kwargs=kwargs
+    )
+    process.start()
+    return process
+
+
+def stop(process, timeout=30):
+    if process.is_alive():
+        os.kill(process.pid, signal.SIGTERM)
+    process.join(timeout)
+    assert not process.is_alive()
@@ -0,0 +1,71 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.aio import AsyncTelegram
+from TelegramSDK.testing import FakeBotAPI
+import asyncio
+import json
+import pytest
+
+pytest.importorskip("aiohttp")
+
+
+class AllowedAPI(FakeBotAPI):
+    """
+    FakeBotAPI that records allowed_updates of every getUpdates.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.allowed = []
+
+    def _get_updates(self, params):
+        self.allowed.append(params.get("allowed_updates"))
+        return super()._get_updates(params)
+
+
+def run(server, handler, replies, **kwargs):
+    async def main():
+        async with AsyncTelegram(
+            "123456:test", api_url=server.url, rate_limiter=False
+        ) as bot:
+            task = asyncio.ensure_future(bot.poll(handler(bot), timeout=1, **kwargs))
+            while server.replies < replies:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(asyncio.wait_for(main(), 30))
+
+
+def test_poll_forwards_allowed_updates():
+    with AllowedAPI() as server:
+        server.push("hi", chat_id=1)
+        server.push(update={"callback_query": {"id": "1", "from": {"id": 2}}})
+
+        def handler(bot):
+            async def handle(data):
+                await bot.send_message("ok", bot.context().chat_id)
+
+            return handle
+
+        run(server, handler, 2, allowed_updates=("message", "callback_query"))
+    assert json.loads(server.allowed[0]) == ["message", "callback_query"]
+
+
+def test_download_file_is_rejected_with_a_clear_error():
+    with FakeBotAPI() as server:
+        server.push(document=server.add_file(10))
+        errors = []
+
+        def handler(bot):
+            async def handle(data):
+                try:
+                    bot.context().download_file("/tmp")
+                except TypeError as e:
+                    errors.append(str(e))
+                await bot.reply_message("done")
+
+            return handle
+
+        run(server, handler, 1)
+    assert "AsyncTelegram" in errors[0]
+    assert "download" not in server.requests
@@ -0,0 +1,109 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.bot import Bot
+from TelegramSDK.testing import FakeBotAPI
+from TelegramSDK.upload_cache import UploadCache
+from TelegramSDK.transport import transport
+import requests
+
+FLOOD = {"ok": False, "error_code": 429, "parameters": {"retry_after": 0}}
+
+
+class ReplyAPI(FakeBotAPI):
+    """
+    FakeBotAPI whose sends carry the replied-to photo message and record the document parameter.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.documents = []
+
+    def _call(self, method, params):
+        status, ret = super()._call(method, params)
+        if method == "sendDocument" and status == 200:
+            self.documents.append(params.get("document"))
+            if params.get("reply_to_message_id"):
+                # Telegram puts reply_to_message ahead of the sent document
+                ret["result"] = dict(
+                    reply_to_message={
+                        "message_id": int(params["reply_to_message_id"]),
+                        "photo": [{"file_id": "photo", "width": 90, "height": 90}],
+                    },
+                    **ret["result"]
+                )
+        return status, ret
+
+
+def test_429_is_retried_after_retry_after():
+    with FakeBotAPI(flood_every=2, retry_after=1) as server:
+        bot = Bot("123456:test", api_url=server.url, rate_limiter=False)
+        results = [bot.send_message("hi", chat_id) for chat_id in (1, 2, 3)]
+        assert all(i["ok"] for i in results)
+        # every second send is answered with 429 and sent again
+        assert server.stats()["requests"]["sendMessage"] == 5
+
+
+def test_429_is_returned_after_max_retries():
+    with FakeBotAPI(flood_every=1, retry_after=0) as server:
+        bot = Bot("123456:test", api_url=server.url, rate_limiter=False, max_retries=2)
+        ret = bot.send_message("hi", 1)
+        assert ret["error_code"] == 429
+        assert server.stats()["requests"]["sendMessage"] == 3
+
+
+def test_upload_cache_reuses_the_sent_file_id(tmp_path):
+    document = tmp_path / "report.pdf"
+    document.write_bytes(b"%PDF")
+    with ReplyAPI() as server:
+        cache = UploadCache(None)
+        bot = Bot(
+            "123456:test", api_url=server.url, rate_limiter=False, upload_cache=cache
+        )
+        first = bot.send_document(1, str(document), reply_to_message_id=5)
+        second = bot.send_document(2, str(document))
+        assert first["ok"] and second["ok"]
+        # the upload is a multipart file, the repeat send references its file_id
+        assert server.documents == [None, first.result.document.file_id]
+        assert cache.get(str(document)) == first.result.document.file_id
+
+
+def test_poll_many_sizes_the_shared_pool(monkeypatch):
+    class Revoked(FakeBotAPI):
+        def _call(self, method, params):
+            if method == "getUpdates":
+                return 401, {"ok": False, "error_code": 401}
+            return super()._call(method, params)
+
+    monkeypatch.setattr(transport, "pool_maxsize", 16)
+    with Revoked() as server:
+        bots = [
+            Bot("%d:test" % i, api_url=server.url, rate_limiter=False)
+            for i in range(30)
+        ]
+        bots.append(Bot("30:test", api_url=server.url, session=requests.Session()))
+        # every fetcher stops on 401, so poll_many returns
+        Bot.poll_many(bots, worker=4, timeout=1)
+    assert transport.pool_maxsize == 34
+    transport.close()
+
+
+def test_bots_keep_their_own_settings(fake):
+    a = Bot("1:a", rate_limiter=False, max_retries=0)
+    b = Bot("2:b", rate_limiter=False, max_retries=1)
+    assert a.endpoint != b.endpoint
+    fake.answer("sendMessage", FLOOD, FLOOD, FLOOD)
+    assert a.send_message("hi", 1)["error_code"] == 429
+    assert len(fake.calls) == 1
+    # the 429 answer is sent again once by the second bot
+    assert b.send_message("hi", 1)["error_code"] == 429
+    assert len(fake.calls) == 3
+
+
+def test_context_replies_through_its_bot(fake):
+    bot = Bot("123456:test", rate_limiter=False)
+    message = {"message_id": 10, "chat": {"id": 4}, "text": "hi"}
+    ctx = bot.update({"update_id": 1, "message": message})
+    assert ctx.bot is bot
+    ctx.reply_message("hello")
+    name, data, files = fake.calls[0]
+    assert name == "sendMessage"
+    assert (data["chat_id"], data["reply_to_message_id"]) == (4, 10)
@@ -0,0 +1,68 @@
+# -*-coding:utf8;-*-
+from TelegramSDK import telegram
+from TelegramSDK.TelegramSDK import TelegramSDK
+import requests
+import pytest
+
+
+@pytest.fixture
+def fake(fake, monkeypatch):
+    monkeypatch.setattr(TelegramSDK, "rate_limiter", None)
+    return fake
+
+
+def test_broadcast_sends_to_every_chat_once(fake):
+    results = dict(telegram.broadcast(iter(range(1, 31)), text="news", concurrency=4))
+    assert sorted(results) == list(range(1, 31))
+    assert all(ret["ok"] for ret in results.values())
+    chats = [data["chat_id"] for name, data, files in fake.calls]
+    assert sorted(chats) == list(range(1, 31))
+    assert {data["text"] for name, data, files in fake.calls} == {"news"}
+
+
+def test_broadcast_uploads_a_document_once(fake, tmp_path):
+    document = tmp_path / "report.pdf"
+    document.write_bytes(b"%PDF")
+    sent = {"message_id": 1, "chat": {"id": 1}, "document": {"file_id": "F1"}}
+    fake.answer("sendDocument", {"ok": True, "result": sent})
+    results = list(
+        telegram.broadcast([1, 2, 3, 4], text="report", document=str(document))
+    )
+    assert len(results) == 4 and results[0][0] == 1
+    uploads = [files for name, data, files in fake.calls if files]
+    assert len(uploads) == 1
+    assert [data["document"] for name, data, files in fake.calls[1:]] == ["F1"] * 3
+    assert {data["caption"] for name, data, files in fake.calls} == {"report"}
+
+
+def test_broadcast_resumes_from_checkpoint(fake, tmp_path):
+    checkpoint = str(tmp_path / "broadcast.txt")
+    fake.answer(
+        "sendMessage",
+        {"ok": True, "result": True},
+        {"ok": True, "result": True},
+        requests.ConnectionError("reset"),
+        {"ok": False, "error_code": 429, "parameters": {"retry_after": 0}},
+        {"ok": False, "error_code": 429, "parameters": {"retry_after": 0}},
+        {"ok": False, "error_code": 429, "parameters": {"retry_after": 0}},
+        {"ok": False, "error_code": 429, "parameters": {"retry_after": 0}},
+    )
+    results = dict(
+        telegram.broadcast(
+            [1, 2, 3, 4, 5], text="hi", concurrency=1, checkpoint=checkpoint
+        )
+    )
+    assert isinstance(results[3], requests.ConnectionError)
+    assert results[4]["error_code"] == 429
+    assert results[5]["ok"]
+    with open(checkpoint) as f:
+        assert f.read().split() == ["1", "2", "5"]
+    del fake.calls[:]
+    # failed and rate limited chats are sent again, finished ones are skipped
+    results = dict(
+        telegram.broadcast(
+            [1, 2, 3, 4, 5], text="hi", concurrency=1, checkpoint=checkpoint
+        )
+    )
+    assert sorted(results) == [3, 4]
+    assert sorted(data["chat_id"] for name, data, files in fake.calls) == [3, 4]
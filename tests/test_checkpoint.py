@@ -0,0 +1,55 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.checkpoint import Checkpoint
+import os
+
+
+def updates(*ids):
+    return [{"update_id": i, "message": {"text": str(i)}} for i in ids]
+
+
+def test_pending_updates_survive_a_restart(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path)
+    assert checkpoint.accept(updates(1, 2, 3)) == updates(1, 2, 3)
+    checkpoint.done(1)
+    restarted = Checkpoint(path)
+    assert restarted.offset == 4
+    assert restarted.pending() == updates(2, 3)
+    # redelivered updates are skipped, handled or not
+    assert restarted.accept(updates(1, 2, 3, 4)) == updates(4)
+
+
+def test_acks_are_appended_not_rewritten(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path, compact_size=100)
+    checkpoint.accept(updates(*range(1, 51)))
+    for i in range(1, 51):
+        checkpoint.done(i)
+    assert not os.path.exists(path)
+    with open(path + ".journal") as f:
+        assert len(f.readlines()) == 51
+    assert Checkpoint(path).pending() == []
+
+
+def test_journal_is_compacted(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path, compact_size=10)
+    checkpoint.accept(updates(*range(1, 21)))
+    for i in range(1, 16):
+        checkpoint.done(i)
+    assert os.path.exists(path)
+    with open(path + ".journal") as f:
+        assert len(f.readlines()) < 10
+    restarted = Checkpoint(path)
+    assert [i["update_id"] for i in restarted.pending()] == list(range(16, 21))
+    assert restarted.accept(updates(5)) == []
+
+
+def test_torn_journal_line_is_ignored(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path)
+    checkpoint.accept(updates(1, 2))
+    checkpoint.done(1)
+    with open(path + ".journal", "a") as f:
+        f.write('[{"update_id": 3, "mess')
+    assert Checkpoint(path).pending() == updates(2)
@@ -0,0 +1,72 @@
+# -*-coding:utf8;-*-
+from TelegramSDK import telegram
+from TelegramSDK.TelegramSDK import TelegramSDK
+import asyncio
+import threading
+
+
+def message(chat_id, text="hi"):
+    return {
+        "update_id": chat_id,
+        "message": {
+            "message_id": chat_id * 10,
+            "from": {"id": chat_id},
+            "chat": {"id": chat_id},
+            "text": text,
+        },
+    }
+
+
+def replies(fake):
+    return [(data["chat_id"], data["text"]) for name, data, files in fake.calls]
+
+
+def test_threads_reply_to_their_own_update(fake, monkeypatch):
+    monkeypatch.setattr(TelegramSDK, "rate_limiter", None)
+    barrier = threading.Barrier(8)
+
+    def handle(chat_id):
+        telegram.update(message(chat_id))
+        # every thread has set its update before any of them replies
+        barrier.wait(5)
+        assert telegram.context().chat_id == chat_id
+        telegram.reply_message(str(chat_id))
+
+    threads = [threading.Thread(target=handle, args=(i,)) for i in range(1, 9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(replies(fake)) == [(i, str(i)) for i in range(1, 9)]
+    assert all(
+        data["reply_to_message_id"] == data["chat_id"] * 10 for _, data, _ in fake.calls
+    )
+
+
+def test_tasks_reply_to_their_own_update(fake, monkeypatch):
+    monkeypatch.setattr(TelegramSDK, "rate_limiter", None)
+
+    async def handle(chat_id):
+        ctx = telegram.update(message(chat_id, "/start  %d" % chat_id))
+        await asyncio.sleep(0.01)
+        assert telegram.context() is ctx
+        assert (ctx.command, ctx.args) == ("/start", str(chat_id))
+        telegram.reply_message(ctx.args)
+
+    async def main():
+        await asyncio.gather(*(handle(i) for i in range(1, 9)))
+
+    asyncio.run(main())
+    assert sorted(replies(fake)) == [(i, str(i)) for i in range(1, 9)]
+
+
+def test_context_falls_back_to_the_shared_update(fake, monkeypatch):
+    monkeypatch.setattr(TelegramSDK, "rate_limiter", None)
+    telegram.update(message(5))
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(telegram.context().chat_id))
+    thread.start()
+    thread.join()
+    # threads without telegram.update() use TelegramSDK.data like before
+    assert seen == [5]
+    assert TelegramSDK.data.message.chat.id == 5
@@ -0,0 +1,92 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.bot import Bot
+from TelegramSDK.context import Context
+from TelegramSDK.file_cache import FileInfoCache
+from TelegramSDK.testing import FakeBotAPI
+from TelegramSDK.util import util
+import os
+import requests
+import pytest
+
+
+@pytest.fixture
+def api():
+    with FakeBotAPI(chunk_size=1024) as server:
+        yield server
+
+
+def context(server, document, **kwargs):
+    """
+    Context of a document update, with a bot of its own.
+    """
+    bot = Bot("123456:test", api_url=server.url, rate_limiter=False, **kwargs)
+    update = server.push(document=document)
+    return Context(util.parse_response(update), bot)
+
+
+def test_download_file(api, tmp_path):
+    ctx = context(api, api.add_file(10000, "a.bin"))
+    files = ctx.download_file(str(tmp_path))
+    assert len(files) == 1
+    assert os.path.getsize(files[0]) == 10000
+    assert files[0].endswith("a.bin")
+
+
+def test_max_size_from_the_update_skips_the_request(api, tmp_path):
+    ctx = context(api, api.add_file(10000))
+    assert ctx.download_file(str(tmp_path), max_size=5000) == []
+    assert "getFile" not in api.stats()["requests"]
+
+
+def test_max_size_is_enforced_while_streaming(api, tmp_path):
+    document = api.add_file(10000)
+    del document["file_size"]
+    ctx = context(api, document)
+    assert ctx.download_file(str(tmp_path), max_size=5000) == []
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_failed_download_is_skipped_and_not_cached(tmp_path):
+    class ExpiredPath(FakeBotAPI):
+        expired = True
+
+        def _call(self, method, params):
+            status, ret = super()._call(method, params)
+            if method == "getFile" and self.expired:
+                self.expired = False
+                ret = dict(ret, result=dict(ret["result"], file_path="documents/gone"))
+            return status, ret
+
+    with ExpiredPath() as server:
+        ctx = context(server, server.add_file(100), file_info_cache=FileInfoCache())
+        assert ctx.download_file(str(tmp_path)) == []
+        assert os.listdir(str(tmp_path)) == []
+        # the expired getFile result was dropped, the next attempt fetches a fresh one
+        assert len(ctx.download_file(str(tmp_path))) == 1
+        assert server.stats()["requests"]["getFile"] == 2
+
+
+def test_download_uses_the_bot_session(api, tmp_path):
+    class Session(requests.Session):
+        urls = []
+
+        def request(self, method, url, **kwargs):
+            self.urls.append(url)
+            return super().request(method, url, **kwargs)
+
+    session = Session()
+    ctx = context(api, api.add_file(100), session=session)
+    assert len(ctx.download_file(str(tmp_path))) == 1
+    assert session.urls[-1].startswith(api.url + "/file/bot123456:test/")
+
+
+def test_photo_message_downloads_one_size(api, tmp_path):
+    sizes = [api.add_file(size, "photo.jpg") for size in (100, 1000, 5000)]
+    for i, size in zip(sizes, (90, 320, 1280)):
+        i.update(width=size, height=size)
+    bot = Bot("123456:test", api_url=api.url, rate_limiter=False)
+    update = api.push(update={"message": {"chat": {"id": 1}, "photo": sizes}})
+    ctx = Context(util.parse_response(update), bot)
+    files = ctx.download_file(str(tmp_path))
+    assert [os.path.getsize(i) for i in files] == [5000]
+    assert api.requests["getFile"] == api.requests["download"] == 1
@@ -0,0 +1,125 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.bot import Bot
+from TelegramSDK.context import Context
+from TelegramSDK.file_cache import DownloadCache, FileInfoCache
+from TelegramSDK.testing import FakeBotAPI
+from TelegramSDK.util import util
+import os
+import threading
+import time
+
+
+def test_file_info_is_fetched_once_by_concurrent_lookups():
+    cache = FileInfoCache()
+    calls = []
+    release = threading.Event()
+
+    def fetch(file_id):
+        calls.append(file_id)
+        release.wait(5)
+        return {"ok": True, "result": {"file_id": file_id}}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("a", fetch)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ["a"]
+    assert len(results) == 8 and all(i is results[0] for i in results)
+    assert cache.get("a", fetch) is results[0]
+    assert calls == ["a"]
+
+
+def test_file_info_errors_are_shared_and_not_cached():
+    cache = FileInfoCache()
+    answers = [{"ok": False, "error_code": 400}, {"ok": True, "result": {}}]
+    assert cache.get("a", lambda file_id: answers.pop(0))["ok"] is False
+    assert cache.get("a", lambda file_id: answers.pop(0))["ok"] is True
+    release = threading.Event()
+    errors = []
+
+    def fetch(file_id):
+        release.wait(5)
+        raise ConnectionError("down")
+
+    def lookup():
+        try:
+            cache.get("b", fetch)
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 4
+    assert cache.get("b", lambda file_id: {"ok": True})["ok"]
+
+
+def test_file_info_ttl_and_max_entries():
+    cache = FileInfoCache(ttl=0.05, max_entries=2)
+    calls = []
+
+    def fetch(file_id):
+        calls.append(file_id)
+        return {"ok": True, "result": {"file_id": file_id}}
+
+    for file_id in ("a", "b", "a", "c", "a", "b"):
+        cache.get(file_id, fetch)
+    assert calls == ["a", "b", "c", "b"]
+    time.sleep(0.1)
+    cache.get("a", fetch)
+    cache.delete("a")
+    cache.get("a", fetch)
+    assert calls == ["a", "b", "c", "b", "a", "a"]
+
+
+def test_download_cache_evicts_least_recently_used(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"), max_size=250)
+    for name in ("a", "b"):
+        source = tmp_path / name
+        source.write_bytes(b"x" * 100)
+        cache.put(name, str(source), name + ".bin")
+        time.sleep(0.01)
+    assert open(cache.get("a"), "rb").read() == b"x" * 100
+    assert cache.get("missing") is None
+    source = tmp_path / "c"
+    source.write_bytes(b"x" * 100)
+    cache.put("c", str(source))
+    assert cache.get("b") is None
+    assert cache.get("a").endswith(os.path.join("a", "a.bin"))
+    assert cache.get("c").endswith(os.path.join("c", "c"))
+
+
+def test_repeat_download_is_copied_from_the_cache(tmp_path):
+    with FakeBotAPI() as server:
+        bot = Bot(
+            "123456:test",
+            api_url=server.url,
+            rate_limiter=False,
+            download_cache=DownloadCache(str(tmp_path / "cache")),
+        )
+        document = server.add_file(1000, "a.bin")
+        for target in ("one", "two", "three"):
+            os.mkdir(str(tmp_path / target))
+        for target in ("one", "two"):
+            update = util.parse_response(server.push(document=document))
+            files = Context(update, bot).download_file(str(tmp_path / target))
+            assert os.path.getsize(files[0]) == 1000
+        assert server.requests["download"] == 1
+        # another file_id of the same file, for example a forward, is not downloaded again
+        update = util.parse_response(
+            server.push(document=dict(document, file_id="forwarded"))
+        )
+        assert Context(update, bot).download_file(str(tmp_path / "three"))
+        assert server.requests["download"] == 1
+        assert server.requests["getFile"] == 1
@@ -0,0 +1,84 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.bot import Bot
+from TelegramSDK.metrics import PrometheusMetrics, StatsdMetrics
+from TelegramSDK.testing import FakeBotAPI
+import os
+import socket
+import time
+import pytest
+
+
+@pytest.fixture
+def udp():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(5)
+    yield sock
+    sock.close()
+
+
+def statsd(udp, **kwargs):
+    host, port = udp.getsockname()
+    return StatsdMetrics(host, port, **kwargs)
+
+
+def test_statsd_packets(udp):
+    metrics = statsd(udp, buffer_size=60, flush_interval=60)
+    metrics.count("api_errors_total", method="sendMessage", code=400)
+    metrics.timing("handler_seconds", 0.0125, status="ok")
+    metrics.flush()
+    # the second line does not fit into the packet of the first one
+    assert (
+        udp.recv(1500) == b"telegram.api_errors_total:1|c|#code:400,method:sendMessage"
+    )
+    assert udp.recv(1500) == b"telegram.handler_seconds:12.500|ms|#status:ok"
+    untagged = statsd(udp, tags=False, flush_interval=60)
+    untagged.gauge("queue_depth", 3, shard=1)
+    untagged.gauge("queue_depth", 4, shard=2)
+    untagged.flush()
+    assert udp.recv(1500) == b"telegram.queue_depth.1:3|g\ntelegram.queue_depth.2:4|g"
+    metrics.close()
+    untagged.close()
+
+
+def test_statsd_flushes_an_idle_buffer(udp):
+    metrics = statsd(udp, flush_interval=0.05)
+    metrics.count("api_retries_total")
+    started = time.monotonic()
+    assert udp.recv(1500) == b"telegram.api_retries_total:1|c"
+    assert time.monotonic() - started < 2
+    metrics.close()
+    assert not metrics._buffer
+
+
+def test_statsd_forked_worker_drops_the_parent_buffer(udp):
+    metrics = statsd(udp, flush_interval=60)
+    metrics.count("parent")
+    pid = os.fork()
+    if pid == 0:
+        metrics.count("child")
+        metrics.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert udp.recv(1500) == b"telegram.child:1|c"
+    metrics.flush()
+    assert udp.recv(1500) == b"telegram.parent:1|c"
+    metrics.close()
+
+
+def test_prometheus_metrics_of_api_calls():
+    metrics = PrometheusMetrics(buckets=(0.5, 1))
+    with FakeBotAPI() as server:
+        bot = Bot(
+            "123456:test", api_url=server.url, rate_limiter=False, metrics=metrics
+        )
+        bot.send_message("hi", 1)
+    metrics.timing("handler_seconds", 0.75, status="ok")
+    metrics.gauge("queue_depth", 2, shard=0)
+    text = metrics.render()
+    assert "# TYPE telegram_api_request_seconds histogram" in text
+    assert 'telegram_api_request_seconds_count{method="sendMessage"} 1' in text
+    assert 'telegram_handler_seconds_bucket{status="ok",le="0.5"} 0' in text
+    assert 'telegram_handler_seconds_bucket{status="ok",le="1.0"} 1' in text
+    assert 'telegram_handler_seconds_bucket{status="ok",le="+Inf"} 1' in text
+    assert 'telegram_queue_depth{shard="0"} 2' in text
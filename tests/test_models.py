@@ -0,0 +1,49 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.models import Message, Update
+from TelegramSDK.util import util
+import copy
+import json
+
+UPDATE = {
+    "update_id": 10,
+    "message": {
+        "message_id": 5,
+        "from": {"id": 1, "first_name": "a", "is_bot": False, "new_user_field": 1},
+        "chat": {"id": 2, "type": "private"},
+        "date": 1700000000,
+        "text": "hi",
+        "photo": [{"file_id": "p1", "file_unique_id": "u1", "width": 1}],
+        "new_message_field": {"nested": [1, 2]},
+    },
+    "new_update_type": {"id": 3},
+}
+
+
+def test_update_round_trip_keeps_unknown_fields():
+    data = copy.deepcopy(UPDATE)
+    update = Update.from_dict(data)
+    assert update.to_dict() == UPDATE
+    assert (
+        Update.from_dict(json.loads(json.dumps(update.to_dict()))).to_dict() == UPDATE
+    )
+    message = update.message
+    assert isinstance(message, Message)
+    assert message.extra == {"new_message_field": {"nested": [1, 2]}}
+    assert message._from.extra == {"new_user_field": 1}
+    assert update.extra == {"new_update_type": {"id": 3}}
+    assert message.new_message_field.nested == [1, 2]
+    assert update.new_update_type.id == 3
+
+
+def test_model_reads_like_a_dict():
+    update = Update.from_dict(UPDATE)
+    message = update["message"]
+    assert message.chat.id == message["chat"]["id"] == 2
+    assert message["from"]["id"] == message._from.id == 1
+    assert "from" in message and "_from" in message
+    assert "photo" in message and "caption" not in message
+    assert message.caption is None
+    assert message.get("caption", "none") == "none"
+    assert message.get("new_message_field") == {"nested": [1, 2]}
+    assert list(update.keys()) == ["update_id", "message", "new_update_type"]
+    assert util.get_chat_id(update) == 2
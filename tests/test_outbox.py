@@ -0,0 +1,52 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.bot import Bot
+from TelegramSDK.outbox import Outbox
+from TelegramSDK.testing import FakeBotAPI
+import requests
+import pytest
+
+
+@pytest.fixture
+def outbox():
+    outbox = Outbox(worker=4)
+    yield outbox
+    outbox.stop()
+
+
+def test_sends_of_a_chat_keep_their_order(server, outbox):
+    server.latency = 0.01
+    bot = Bot("123456:test", api_url=server.url, rate_limiter=False, outbox=outbox)
+    futures = [bot.send_message(str(i), i % 5) for i in range(50)]
+    assert all(future.result(30)["ok"] for future in futures)
+    assert server.texts == {
+        str(chat): [str(i) for i in range(chat, 50, 5)] for chat in range(5)
+    }
+
+
+def test_failed_send_sets_the_exception(fake, outbox):
+    fake.answer("sendMessage", requests.ConnectionError("down"))
+    bot = Bot("123456:test", rate_limiter=False, outbox=outbox)
+    future = bot.send_message("hi", 1)
+    assert isinstance(future.exception(30), requests.ConnectionError)
+    # the sender thread survives a failed send
+    assert bot.send_message("hi", 1).result(30)["ok"]
+
+
+def test_queued_chat_actions_are_coalesced():
+    outbox = Outbox(worker=1)
+    with FakeBotAPI(latency=0.2) as server:
+        bot = Bot("123456:test", api_url=server.url, rate_limiter=False, outbox=outbox)
+        # the only sender thread is busy with this send while the actions are queued
+        first = bot.send_message("busy", 1)
+        typing = bot.send_chat_action(2, "typing")
+        assert bot.send_chat_action(2, "typing") is typing
+        upload = bot.send_chat_action(3, "upload_document")
+        replaced = bot.send_chat_action(3, "typing")
+        reply = bot.send_message("done", 2)
+        assert typing.done() and typing.result() == {"ok": True, "result": True}
+        assert upload.done() and not replaced.done()
+        outbox.stop()
+        assert first.result()["ok"] and reply.result()["ok"]
+        assert replaced.result()["ok"]
+        assert server.requests["sendChatAction"] == 1
+        assert server.requests["sendMessage"] == 2
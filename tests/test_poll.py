@@ -0,0 +1,58 @@
+# -*-coding:utf8;-*-
+from TelegramSDK import telegram
+from conftest import start, stop
+import os
+import pytest
+
+
+def echo(data):
+    telegram.update(data)
+    if data["update_id"] == int(os.environ.get("CRASH_AT", 0)):
+        os._exit(1)
+    telegram.reply_message(str(data["update_id"]))
+
+
+def push(server, updates=20, chats=4):
+    expected = {}
+    for i in range(updates):
+        update = server.push(chat_id=i % chats + 1)
+        expected.setdefault(str(i % chats + 1), []).append(str(update["update_id"]))
+    return expected
+
+
+@pytest.mark.parametrize("worker,shard", [(1, False), (3, True)])
+def test_poll_replies_every_update_in_chat_order(server, worker, shard):
+    expected = push(server)
+    process = start(telegram.poll, echo, worker=worker, timeout=1, shard=shard)
+    try:
+        assert server.wait(20, timeout=30)
+    finally:
+        stop(process)
+    assert server.texts == expected
+
+
+def test_poll_worker_replies_every_update_once(server):
+    expected = push(server)
+    process = start(telegram.poll, echo, worker=3, timeout=1)
+    try:
+        assert server.wait(20, timeout=30)
+    finally:
+        stop(process)
+    assert sorted(sum(server.texts.values(), [])) == sorted(sum(expected.values(), []))
+
+
+def test_checkpoint_replays_unhandled_updates(server, tmp_path, monkeypatch):
+    expected = push(server, updates=6, chats=2)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    monkeypatch.setenv("CRASH_AT", "3")
+    crashed = start(telegram.poll, echo, timeout=1, checkpoint=checkpoint)
+    crashed.join(30)
+    assert crashed.exitcode == 1
+    assert server.replies == 2
+    monkeypatch.delenv("CRASH_AT")
+    process = start(telegram.poll, echo, timeout=1, checkpoint=checkpoint)
+    try:
+        assert server.wait(6, timeout=30)
+    finally:
+        stop(process)
+    assert server.texts == expected
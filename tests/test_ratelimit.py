@@ -0,0 +1,79 @@
+# -*-coding:utf8;-*-
+from TelegramSDK import telegram
+from TelegramSDK.TelegramSDK import TelegramSDK
+from TelegramSDK.ratelimit import RateLimiter
+import threading
+import pytest
+
+
+def test_burst_then_rate():
+    limiter = RateLimiter(global_rate=10, global_burst=2)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(0.1, abs=0.01)
+
+
+def test_chats_have_their_own_buckets():
+    limiter = RateLimiter(chat_rate=1, chat_burst=1, group_rate=0.5)
+    assert limiter.reserve(1) == 0
+    assert limiter.reserve(1) == pytest.approx(1, abs=0.01)
+    assert limiter.reserve(2) == 0
+    assert limiter.reserve(-100) == 0
+    assert limiter.reserve(-100) == pytest.approx(2, abs=0.01)
+
+
+@pytest.mark.parametrize(
+    "kwargs,chat_id",
+    [
+        ({"global_rate": 0}, None),
+        ({"chat_rate": 0}, 1),
+        ({"group_rate": 0}, -100),
+        ({"group_rate": 0}, "@channel"),
+    ],
+)
+def test_rate_0_is_unlimited(kwargs, chat_id):
+    limiter = RateLimiter(**kwargs)
+    for _ in range(100):
+        assert limiter.reserve(chat_id) == 0
+
+
+def test_pause_of_a_disabled_limit_holds_nothing():
+    assert RateLimiter(global_rate=0).pause(1) is False
+    assert RateLimiter(global_rate=0, group_rate=0).pause(1, chat_id=-100) is False
+    # a disabled chat limit falls back to the global one
+    limiter = RateLimiter(group_rate=0)
+    assert limiter.pause(1, chat_id=-100) is True
+    assert limiter.reserve() == pytest.approx(1, abs=0.05)
+
+
+def test_pause_holds_the_chat():
+    limiter = RateLimiter(chat_burst=1)
+    assert limiter.pause(2, chat_id=1) is True
+    assert limiter.reserve(1) == pytest.approx(2, abs=0.05)
+    assert limiter.reserve(2) == 0
+
+
+def test_per_chat_is_thread_local():
+    assert RateLimiter.per_chat() is False
+    previous = RateLimiter.per_chat(True)
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(RateLimiter.per_chat()))
+    thread.start()
+    thread.join()
+    assert RateLimiter.per_chat() is True
+    RateLimiter.per_chat(previous)
+    assert seen == [False]
+
+
+def test_429_is_retried_after_retry_after(fake, monkeypatch):
+    monkeypatch.setattr(TelegramSDK, "rate_limiter", None)
+    sleeps = []
+    monkeypatch.setattr("time.sleep", sleeps.append)
+    fake.answer(
+        "sendMessage",
+        {"ok": False, "error_code": 429, "parameters": {"retry_after": 3}},
+        {"ok": True, "result": {"message_id": 1}},
+    )
+    assert telegram.send_message("hi", 1)["ok"]
+    assert sleeps == [3]
+    assert [i[0] for i in fake.calls] == ["sendMessage", "sendMessage"]
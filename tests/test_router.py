@@ -0,0 +1,141 @@
+# -*-coding:utf8;-*-
+from TelegramSDK import telegram
+from TelegramSDK.bot import Bot
+from TelegramSDK.models import Update
+from TelegramSDK.router import Router
+from conftest import start, stop
+import re
+import pytest
+
+CHANNEL_POST = {
+    "channel_post": {
+        "message_id": 1,
+        "sender_chat": {"id": -100, "type": "channel"},
+        "chat": {"id": -100, "type": "channel"},
+        "text": "/post news",
+    }
+}
+INLINE_CALLBACK = {
+    "callback_query": {
+        "id": "1",
+        "from": {"id": 7},
+        "inline_message_id": "abc",
+        "data": "vote",
+    }
+}
+INLINE_QUERY = {"inline_query": {"id": "1", "from": {"id": 8}, "query": "cats"}}
+
+
+def message(text, chat_id=1):
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "from": {"id": chat_id},
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text,
+        },
+    }
+
+
+def test_commands_are_looked_up_without_bot_username():
+    router = Router()
+    start = router.command("start", "/help")(lambda ctx: None)
+    default = router.default(lambda ctx: None)
+    for text in ("/start", "/start@my_bot", "/help me", "/start  "):
+        assert router.match(telegram.update(message(text))) is start
+    ctx = telegram.update(message("/help   me please "))
+    assert (ctx.command, ctx.args) == ("/help", "me please")
+    assert router.match(telegram.update(message("/stop"))) is default
+
+
+def test_regexes_are_compiled_once_and_set_match(monkeypatch):
+    router = Router()
+    handler = router.regex(r"order (\d+)", re.I)(lambda ctx: None)
+    compiled = []
+    monkeypatch.setattr(re, "compile", lambda *args: compiled.append(args))
+    ctx = telegram.update(message("ORDER 42"))
+    assert router.match(ctx) is handler
+    assert ctx.match.group(1) == "42"
+    assert router.match(telegram.update(message("no order"))) is None
+    assert compiled == []
+
+
+def test_fallthrough_order():
+    router = Router()
+    calls = []
+    router.command("start")(lambda ctx: calls.append("command"))
+    router.regex("start")(lambda ctx: calls.append("regex"))
+    router.filter(lambda ctx: ctx.chat_id == 2)(lambda ctx: calls.append("filter"))
+    router.on("message", "callback_query")(lambda ctx: calls.append("on"))
+    router.default(lambda ctx: calls.append("default"))
+    for text, chat_id in (
+        ("/start", 1),
+        ("/stop start", 1),
+        ("/stop", 2),
+        ("/stop", 1),
+    ):
+        assert router.dispatch(telegram.update(message(text, chat_id)))
+    assert router.dispatch(telegram.update(dict(INLINE_CALLBACK, update_id=2)))
+    assert router.dispatch(telegram.update(dict(INLINE_QUERY, update_id=3)))
+    assert calls == ["command", "regex", "filter", "on", "on", "default"]
+    assert router.update_types() == ["callback_query", "message"]
+    assert not Router().dispatch(telegram.update(message("/start")))
+
+
+@pytest.mark.parametrize(
+    "update,chat_id,user_id",
+    [
+        (CHANNEL_POST, -100, -100),
+        (INLINE_CALLBACK, 7, 7),
+        (INLINE_QUERY, 8, 8),
+        ({"poll": {"id": "1", "question": "?"}}, None, None),
+    ],
+)
+def test_context_of_updates_without_message_or_sender(update, chat_id, user_id):
+    update = dict(update, update_id=1)
+    for data in (update, Update.from_dict(update)):
+        ctx = telegram.update(data)
+        assert (ctx.chat_id, ctx.user_id) == (chat_id, user_id)
+    if chat_id is None:
+        with pytest.raises(ValueError):
+            ctx._session_key()
+    else:
+        assert ctx._session_key() == "%s:%s" % (user_id, chat_id)
+
+
+def test_poll_dispatches_to_registered_handlers(server):
+    bot = Bot("123456:test", api_url=server.url, rate_limiter=False)
+
+    @bot.command("start")
+    def on_start(ctx):
+        ctx.reply_message("welcome")
+
+    @bot.regex(r"^\d+$")
+    def on_number(ctx):
+        ctx.reply_message(str(int(ctx.match.group(0)) * 2))
+
+    @bot.on("channel_post", "callback_query")
+    def on_other(ctx):
+        bot.send_message(ctx.update_type, ctx.chat_id)
+
+    @bot.default
+    def on_text(ctx):
+        ctx.reply_message("?")
+
+    server.push("/start", chat_id=1)
+    server.push("21", chat_id=1)
+    server.push("hello", chat_id=2)
+    server.push(update=CHANNEL_POST)
+    server.push(update=INLINE_CALLBACK)
+    process = start(bot.poll, timeout=1)
+    try:
+        assert server.wait(5, timeout=30)
+    finally:
+        stop(process)
+    assert server.texts == {
+        "1": ["welcome", "42"],
+        "2": ["?"],
+        "-100": ["channel_post"],
+        "7": ["callback_query"],
+    }
@@ -0,0 +1,169 @@
+# -*-coding:utf8;-*-
+from TelegramSDK import telegram
+from TelegramSDK.session import MemorySession, RedisSession, SQLiteSession
+from TelegramSDK.testing import FakeRedis
+import time
+import pytest
+
+
+@pytest.fixture
+def redis():
+    with FakeRedis(password="secret") as server:
+        yield server
+
+
+def test_redis_session_roundtrip(redis):
+    session = RedisSession(redis.url, pool_size=2)
+    session.set("1:1", {"count": 1})
+    session.set("1:2", [1, "a"])
+    assert session.get("1:1") == {"count": 1}
+    assert session.get_many(["1:1", "1:2", "1:3"], 0) == [{"count": 1}, [1, "a"], 0]
+    session.delete("1:1")
+    assert session.get("1:1") is None
+    # AUTH is sent once, when the pooled connection is opened
+    assert redis.commands["AUTH"] == redis.connections == 1
+    session.close()
+
+
+def test_redis_session_ttl(redis):
+    session = RedisSession(redis.url)
+    session.set("1:1", "soon gone", ttl=0.05)
+    assert session.get("1:1") == "soon gone"
+    time.sleep(0.1)
+    assert session.get("1:1", "expired") == "expired"
+    session.close()
+
+
+def test_redis_session_pipelines_commands(redis):
+    session = RedisSession(redis.url)
+    replies = session.execute(
+        ("SET", "a", "1"), ("GET", "a"), ("DEL", "a"), ("GET", "a")
+    )
+    assert replies == ["OK", b"1", 1, None]
+    with pytest.raises(ValueError):
+        session.execute(("NOPE",))
+    session.close()
+
+
+def test_redis_session_reconnects_after_disconnect(redis):
+    session = RedisSession(redis.url)
+    session.set("1:1", 1)
+    redis.disconnect()
+    assert session.get("1:1") == 1
+    assert redis.connections == 2
+    session.close()
+
+
+def test_redis_session_wrong_password(redis):
+    session = RedisSession(redis.url.replace("secret", "wrong"))
+    with pytest.raises(ValueError):
+        session.get("1:1")
+
+
+def test_memory_session_lru_and_ttl():
+    session = MemorySession(max_entries=2)
+    session.set("1:1", {"count": 1})
+    session.set("1:2", 2, ttl=0.05)
+    assert session.get_many(["1:1", "1:2", "1:3"], 0) == [{"count": 1}, 2, 0]
+    # 1:1 was read last, so 1:2 is evicted
+    session.get("1:1")
+    session.set("1:3", 3)
+    assert session.get("1:2") is None
+    assert session.get("1:3") == 3
+    session.set("1:3", 3, ttl=0.05)
+    time.sleep(0.1)
+    assert session.get("1:3", "expired") == "expired"
+    session.delete("1:1")
+    assert session.get("1:1") is None
+
+
+def test_session_is_read_once_per_update(monkeypatch):
+    class Counting(MemorySession):
+        reads = 0
+
+        def get(self, key, default=None):
+            Counting.reads += 1
+            return super().get(key, default)
+
+    store = Counting()
+    monkeypatch.setattr(telegram, "session_store", store)
+    update = {"update_id": 1, "message": {"from": {"id": 1}, "chat": {"id": 2}}}
+    ctx = telegram.update(update)
+    assert ctx.get_session() is None
+    ctx.set_session({"step": 1})
+    assert ctx.get_session() == ctx.get_session() == {"step": 1}
+    assert store.get("1:2") == {"step": 1}
+    assert Counting.reads == 2
+    ctx = telegram.update(dict(update, update_id=2))
+    assert ctx.get_session() == {"step": 1}
+    assert Counting.reads == 3
+
+
+def test_sqlite_session_roundtrip(tmp_path):
+    session = SQLiteSession(str(tmp_path / "session.db"), flush_interval=0)
+    session.set("1:1", {"count": 1})
+    session.set("1:2", [1, "a"], ttl=0.05)
+    assert session.get("1:1") == {"count": 1}
+    assert session.get_many(["1:1", "1:2", "1:3"], 0) == [{"count": 1}, [1, "a"], 0]
+    time.sleep(0.1)
+    assert session.get("1:2", "expired") == "expired"
+    session.delete("1:1")
+    assert session.get("1:1") is None
+    session.close()
+
+
+def test_sqlite_session_buffers_writes(tmp_path):
+    path = str(tmp_path / "session.db")
+    session = SQLiteSession(path, flush_interval=60, batch_size=3)
+    other = SQLiteSession(path)
+    session.set("1:1", 1)
+    session.set("1:2", 2)
+    # buffered writes are read back by the writer, other processes see them once flushed
+    assert session.get("1:1") == 1
+    assert other.get("1:1") is None
+    session.set("1:3", 3)
+    assert other.get_many(["1:1", "1:2", "1:3"]) == [1, 2, 3]
+    session.delete("1:1")
+    session.flush()
+    assert other.get("1:1", "deleted") == "deleted"
+    session.close()
+    other.close()
+
+
+def test_sqlite_session_flushes_in_background(tmp_path):
+    path = str(tmp_path / "session.db")
+    session = SQLiteSession(path, flush_interval=0.05)
+    other = SQLiteSession(path)
+    session.set("1:1", 1)
+    deadline = time.time() + 5
+    while other.get("1:1") is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert other.get("1:1") == 1
+    session.close()
+    other.close()
+
+
+def test_sqlite_session_purges_expired_rows(tmp_path):
+    path = str(tmp_path / "session.db")
+    session = SQLiteSession(path, flush_interval=0, purge_interval=0)
+    session.set("1:1", 1, ttl=0.01)
+    session.set("1:2", 2)
+    time.sleep(0.05)
+    session.flush()
+    rows = session._db.execute("SELECT key FROM sessions").fetchall()
+    assert rows == [("1:2",)]
+    session.close()
+
+
+def test_sqlite_session_read_cache(tmp_path):
+    path = str(tmp_path / "session.db")
+    session = SQLiteSession(path, cache_size=1, flush_interval=0)
+    other = SQLiteSession(path, flush_interval=0)
+    session.set("1:1", 1)
+    other.set("1:1", 2)
+    # the cached value of this process wins until it is evicted
+    assert session.get("1:1") == 1
+    session.get("1:2")
+    assert session.get("1:1") == 2
+    session.close()
+    other.close()
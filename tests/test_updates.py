@@ -0,0 +1,59 @@
+# -*-coding:utf8;-*-
+from TelegramSDK import telegram
+from TelegramSDK.TelegramSDK import TelegramSDK
+import pytest
+
+
+def update(update_id):
+    return {"update_id": update_id, "message": {"chat": {"id": 1}, "text": "hi"}}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("time.sleep", sleeps.append)
+    return sleeps
+
+
+def test_updates_confirm_the_previous_batch(fake, sleeps):
+    fake.answer(
+        "getUpdates",
+        {"ok": True, "result": [update(1), update(2)]},
+        {"ok": True, "result": [update(3)]},
+    )
+    batches = telegram._updates(timeout=1)
+    assert [i["update_id"] for i in next(batches)] == [1, 2]
+    assert [i["update_id"] for i in next(batches)] == [3]
+    assert [i[1]["offset"] for i in fake.calls] == [None, 3]
+
+
+def test_updates_retry_server_errors_with_backoff(fake, sleeps):
+    bad_gateway = {"ok": False, "error_code": 502, "description": "Bad Gateway"}
+    fake.answer(
+        "getUpdates",
+        bad_gateway,
+        bad_gateway,
+        {"ok": False, "error_code": 429, "parameters": {"retry_after": 5}},
+        bad_gateway,
+        {"ok": True, "result": [update(1)]},
+    )
+    batches = telegram._updates(timeout=1)
+    assert [i["update_id"] for i in next(batches)] == [1]
+    assert sleeps == [1, 2, 5, 4]
+
+
+@pytest.mark.parametrize("code", [401, 409])
+def test_updates_stop_on_unrecoverable_errors(fake, sleeps, code):
+    fake.answer("getUpdates", {"ok": False, "error_code": code})
+    with pytest.raises(ValueError):
+        next(telegram._updates(timeout=1))
+
+
+def test_handlers_do_not_confirm_updates(fake, monkeypatch):
+    monkeypatch.setattr(TelegramSDK, "method", "poll")
+    monkeypatch.setattr(TelegramSDK, "worker", 1)
+    message = {"message_id": 10, "chat": {"id": 1}, "text": "hi"}
+    telegram.update({"update_id": 1, "message": message})
+    telegram.reply_message("hello")
+    # the poller confirms the batch with its next getUpdates
+    assert [i[0] for i in fake.calls] == ["sendMessage"]
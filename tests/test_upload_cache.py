@@ -0,0 +1,93 @@
+# -*-coding:utf8;-*-
+from TelegramSDK import telegram
+from TelegramSDK.TelegramSDK import TelegramSDK
+from TelegramSDK.upload_cache import UploadCache
+from conftest import start
+import json
+import os
+
+
+def files(tmp_path, count, prefix="f"):
+    ret = []
+    for i in range(count):
+        path = tmp_path / ("%s%d" % (prefix, i))
+        path.write_bytes(b"%d" % i)
+        ret.append(str(path))
+    return ret
+
+
+def test_entries_are_invalidated_when_the_file_changes(tmp_path):
+    cache = UploadCache(str(tmp_path / "cache.json"))
+    path = files(tmp_path, 1)[0]
+    cache.set(path, "id0")
+    assert cache.get(path) == "id0"
+    with open(path, "ab") as f:
+        f.write(b"changed")
+    assert cache.get(path) is None
+    content = UploadCache(None, hash_content=True)
+    content.set(path, "id1")
+    assert content.get(files(tmp_path, 1, "copy")[0]) is None
+    os.replace(path, str(tmp_path / "moved"))
+    assert content.get(str(tmp_path / "moved")) == "id1"
+
+
+def test_max_entries_is_enforced_on_load(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = UploadCache(path, max_entries=10)
+    paths = files(tmp_path, 10)
+    for i, local_path in enumerate(paths):
+        cache.set(local_path, "id%d" % i)
+    cache = UploadCache(path, max_entries=3)
+    assert [cache.get(i) for i in paths] == [None] * 7 + ["id7", "id8", "id9"]
+    cache.set(paths[0], "id0")
+    with open(path) as f:
+        assert len(json.load(f)) == 3
+
+
+def test_writers_merge_their_entries(tmp_path):
+    path = str(tmp_path / "cache.json")
+    a, b = UploadCache(path), UploadCache(path)
+    paths = files(tmp_path, 3)
+    a.set(paths[0], "id0")
+    a.set(paths[1], "id1")
+    b.set(paths[2], "id2")
+    b.delete(paths[0])
+    a.set(paths[1], "id1b")
+    cache = UploadCache(path)
+    assert [cache.get(i) for i in paths] == [None, "id1b", "id2"]
+
+
+def test_concurrent_processes_keep_every_entry(tmp_path):
+    path = str(tmp_path / "cache.json")
+    paths = files(tmp_path, 80)
+
+    def writer(offset):
+        cache = UploadCache(path)
+        for i in range(offset, 80, 4):
+            cache.set(paths[i], "id%d" % i)
+
+    processes = [start(writer, i) for i in range(4)]
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+    cache = UploadCache(path)
+    assert [cache.get(i) for i in paths] == ["id%d" % i for i in range(80)]
+    assert not [i for i in os.listdir(str(tmp_path)) if i.endswith(".tmp")]
+
+
+def test_send_document_caches_the_sent_file_id(fake, tmp_path, monkeypatch):
+    monkeypatch.setattr(TelegramSDK, "rate_limiter", None)
+    monkeypatch.setattr(TelegramSDK, "upload_cache", UploadCache(None))
+    path = files(tmp_path, 1)[0]
+    # a reply also carries the files of the replied-to message
+    photo = [{"file_id": "P1", "width": 90, "height": 90}]
+    sent = {
+        "message_id": 2,
+        "reply_to_message": {"message_id": 1, "photo": photo},
+        "document": {"file_id": "F1"},
+    }
+    fake.answer("sendDocument", {"ok": True, "result": sent})
+    telegram.send_document(1, path, reply_to_message_id=1)
+    telegram.send_document(1, path)
+    assert fake.calls[0][2] is not None
+    assert fake.calls[1][1]["document"] == "F1" and fake.calls[1][2] is None
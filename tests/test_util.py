@@ -0,0 +1,82 @@
+# -*-coding:utf8;-*-
+from TelegramSDK.util import objectify, util
+import json
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 2,
+        "from": {"id": 3},
+        "chat": {"id": 4},
+        "text": "/start@my_bot  hello ",
+        "reply_to_message": {"from": {"id": 5}, "chat": {"id": 4}},
+    },
+}
+
+
+def test_from_alias():
+    data = util.parse_response(json.loads(json.dumps(UPDATE)))
+    message = data.message
+    assert message._from.id == message["_from"]["id"] == message["from"]["id"] == 3
+    assert "_from" in message and "from" in message
+    assert message.get("_from") == {"id": 3}
+    assert "_from" not in data and data.get("_from") is None
+    assert message.reply_to_message._from.id == 5
+    assert util.get_chat_id(data) == 4
+
+
+def test_nested_dicts_are_wrapped_on_first_access():
+    raw = json.loads(json.dumps(UPDATE))
+    data = util.parse_response(raw)
+    assert util.parse_response(data) is data
+    assert type(dict.__getitem__(data, "message")) is dict
+    message = data.message
+    assert type(message) is objectify
+    # the wrapped dict replaces the plain one, later reads return the same object
+    assert dict.__getitem__(data, "message") is message is data["message"]
+    assert type(dict.__getitem__(message, "reply_to_message")) is dict
+    assert data == UPDATE
+    assert json.loads(json.dumps(data)) == UPDATE
+
+
+PHOTO = [
+    {"file_id": "s", "file_unique_id": "us", "width": 90, "height": 60},
+    {"file_id": "m", "file_unique_id": "um", "width": 320, "height": 240},
+    {"file_id": "l", "file_unique_id": "ul", "width": 1280, "height": 960},
+]
+
+
+def ids(files):
+    return [i["file_id"] for i in files]
+
+
+def test_select_photo_policies():
+    update = {"update_id": 1, "message": {"photo": PHOTO, "caption": "x"}}
+    assert ids(util.select_files(update)) == ["l"]
+    assert ids(util.select_files(update, photo="smallest")) == ["s"]
+    assert ids(util.select_files(update, photo="all")) == ["s", "m", "l"]
+    assert ids(util.select_files(update, photo=300)) == ["m"]
+    # no size is large enough, the largest one is used
+    assert ids(util.select_files(update, photo=5000)) == ["l"]
+
+
+def test_select_files_of_media_messages():
+    thumb = {"file_id": "t", "file_unique_id": "ut"}
+    video = {"file_id": "v", "file_unique_id": "uv", "thumbnail": thumb}
+    update = {"update_id": 1, "channel_post": {"video": video, "chat": {"id": 1}}}
+    assert ids(util.select_files(update)) == ["v"]
+    assert ids(util.select_files(update, thumbnails=True)) == ["v", "t"]
+    # a sticker that is also its own thumbnail is selected once
+    sticker = {
+        "file_id": "k",
+        "file_unique_id": "uk",
+        "thumbnail": dict(thumb, file_unique_id="uk"),
+    }
+    assert ids(
+        util.select_files({"message": {"sticker": sticker}}, thumbnails=True)
+    ) == ["k"]
+    callback = {
+        "callback_query": {"id": "1", "message": {"document": {"file_id": "d"}}}
+    }
+    assert ids(util.select_files(callback)) == ["d"]
+    assert util.select_files({"update_id": 1, "message": {"text": "hi"}}) == ()
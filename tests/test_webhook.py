@@ -0,0 +1,148 @@
+# -*-coding:utf8;-*-
+from TelegramSDK import telegram
+from TelegramSDK.webhook import WebhookServer
+import asyncio
+import io
+import json
+import threading
+import pytest
+
+
+def update(update_id=1, chat_id=1):
+    body = {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": "hi"}}
+    return json.dumps(body).encode("utf-8")
+
+
+@pytest.fixture
+def handled():
+    handled = []
+    event = threading.Event()
+
+    def callback(data):
+        handled.append(data["update_id"])
+        event.set()
+
+    callback.event = event
+    callback.handled = handled
+    return callback
+
+
+def test_dispatch_checks_path_method_secret_and_body(handled):
+    server = WebhookServer(handled, secret_token="s3cret", path="/hook")
+    assert server.dispatch("POST", "/other", "s3cret", update()) == 404
+    assert server.dispatch("GET", "/hook", "s3cret", update()) == 405
+    assert server.dispatch("POST", "/hook", None, update()) == 403
+    assert server.dispatch("POST", "/hook", "wrong", update()) == 403
+    assert server.dispatch("POST", "/hook", "s3cret", b"not json") == 400
+    assert server.dispatch("POST", "/hook", "s3cret", b'{"ok": true}') == 400
+    assert server.dispatch("POST", "/hook?x=1", "s3cret", update(7)) == 200
+    server.stop()
+    assert handled.handled == [7]
+
+
+def test_full_queue_is_answered_with_503():
+    release = threading.Event()
+    server = WebhookServer(
+        lambda data: release.wait(5), worker=1, queue_size=1, queue_timeout=0.05
+    )
+    # the first update is handled and blocks, the second fills the queue
+    assert server.dispatch("POST", "/", None, update(1)) == 200
+    assert server.dispatch("POST", "/", None, update(2)) in (200, 503)
+    statuses = [server.dispatch("POST", "/", None, update(i)) for i in range(3, 6)]
+    assert 503 in statuses
+    release.set()
+    server.stop()
+
+
+def test_wsgi_app(handled):
+    server = WebhookServer(handled, secret_token="s3cret")
+    responses = []
+    body = update(3)
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/",
+        "CONTENT_LENGTH": str(len(body)),
+        "HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN": "s3cret",
+        "wsgi.input": io.BytesIO(body),
+    }
+    assert server.wsgi(environ, lambda *args: responses.append(args)) == [b""]
+    environ["wsgi.input"] = io.BytesIO(body)
+    del environ["HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN"]
+    server.wsgi(environ, lambda *args: responses.append(args))
+    assert [i[0] for i in responses] == ["200 OK", "403 Forbidden"]
+    assert handled.event.wait(5)
+    server.stop()
+    assert handled.handled == [3]
+
+
+def test_asgi_app(handled):
+    server = WebhookServer(handled, secret_token="s3cret")
+
+    async def call(scope, messages):
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await server.asgi(scope, receive, send)
+        return sent
+
+    async def main():
+        lifespan = await call(
+            {"type": "lifespan"},
+            [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}],
+        )
+        assert [i["type"] for i in lifespan] == [
+            "lifespan.startup.complete",
+            "lifespan.shutdown.complete",
+        ]
+        body = update(4)
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/",
+            "headers": [(b"x-telegram-bot-api-secret-token", b"s3cret")],
+        }
+        ok = await call(
+            scope,
+            [
+                {"type": "http.request", "body": body[:10], "more_body": True},
+                {"type": "http.request", "body": body[10:]},
+            ],
+        )
+        forbidden = await call(
+            dict(scope, headers=[]), [{"type": "http.request", "body": body}]
+        )
+        return ok[0]["status"], forbidden[0]["status"]
+
+    assert asyncio.run(main()) == (200, 403)
+    assert handled.event.wait(5)
+    server.stop()
+    assert handled.handled == [4]
+
+
+@pytest.mark.parametrize("self_signed", [False, True])
+def test_webhook_uploads_only_self_signed_certificates(
+    fake, monkeypatch, tmp_path, self_signed
+):
+    certfile = tmp_path / "cert.pem"
+    certfile.write_bytes(b"-----BEGIN CERTIFICATE-----")
+    served = []
+    monkeypatch.setattr(
+        WebhookServer, "serve", lambda self, *args, **kwargs: served.append(kwargs)
+    )
+    telegram.webhook(
+        print,
+        "https://example.com/hook",
+        certfile=str(certfile),
+        keyfile="key.pem",
+        self_signed=self_signed,
+    )
+    name, data, files = fake.calls[-1]
+    assert name == "setWebHook"
+    assert data["url"] == "https://example.com/hook"
+    assert (files is not None) == self_signed
+    assert served[0]["certfile"] == str(certfile)